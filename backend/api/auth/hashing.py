@@ -0,0 +1,82 @@
+"""
+密码哈希线程池/进程池
+bcrypt 每次校验需 100ms 以上的 CPU，放到独立的有界执行器中运行，避免阻塞事件循环
+"""
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# 模块级函数，保证可以被进程池序列化
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+class PasswordHasher:
+    """有界的密码哈希执行器，饱和时直接返回 503 而不是无限排队"""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_pending: int = 32,
+        use_processes: bool = False,
+        retry_after_seconds: int = 1
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self.retry_after_seconds = retry_after_seconds
+        self._executor: Optional[Executor] = None
+        # 仅在事件循环线程中增减，无需加锁
+        self._in_flight = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                # 进程池绕开 GIL，适合多核机器上的登录高峰
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self._in_flight >= self.max_workers + self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy, please retry later",
+                headers={"Retry-After": str(self.retry_after_seconds)}
+            )
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    def stats(self):
+        return {
+            "in_flight": self._in_flight,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "executor": "process" if self.use_processes else "thread"
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
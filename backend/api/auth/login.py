@@ -4,7 +4,6 @@ from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 from sqlalchemy import create_engine
@@ -47,6 +46,10 @@ class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 60*24 # 1天  
     refresh_token_expire_days: int = 7
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 32
+    password_hash_use_processes: bool = False
+    password_hash_retry_after_seconds: int = 1
     dify_agent_url: str = "-----------"
     api_keys: Dict[str, str] = {
         "9589ca16aa2844de6975809fbac3891ef2a105eadcde6f56e044c60b6b774ec4": "student"
@@ -75,14 +78,20 @@ def get_db():
 Base.metadata.create_all(bind=engine)
 
 # --------------------- 密码哈希 ---------------------
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from api.auth.hashing import PasswordHasher
 
-def verify_password(plain_password, hashed_password):
-    
-    return pwd_context.verify(plain_password, hashed_password)
+password_hasher = PasswordHasher(
+    max_workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+    use_processes=settings.password_hash_use_processes,
+    retry_after_seconds=settings.password_hash_retry_after_seconds
+)
+
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
 # --------------------- 认证模型 ---------------------
 class Token(BaseModel):
@@ -271,7 +280,7 @@ async def login_for_access_token(
         if not user:
             logger.warning(f"Login failed: user not found ({form_data.username})")
             raise HTTPException(status_code=401, detail="Incorrect username or password")
-        if not verify_password(form_data.password, user.password_hash):
+        if not await verify_password(form_data.password, user.password_hash):
             logger.warning(f"Login failed: wrong password for {form_data.username}")
             raise HTTPException(status_code=401, detail="Incorrect username or password")
         if not user.is_active:
@@ -389,7 +398,7 @@ async def register_user(
                 detail="Password must be at least 6 characters long"
             )
         
-        hashed_password = get_password_hash(user_create.password)
+        hashed_password = await get_password_hash(user_create.password)
         db_user = User(
             username=user_create.username,
             email=user_create.email,
@@ -0,0 +1,56 @@
+"""
+访问令牌吊销过滤器
+无状态鉴权模式下，令牌携带 user_id/role/token_version，只需与内存中的吊销表比对即可，无需查询 users 表；
+吊销表首次加载成功前（loaded 为 False）鉴权回退到数据库查询
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import User
+
+class TokenRevocationFilter:
+    """
+    紧凑的内存吊销表：只保存 token_version 大于 0 或已停用/删除的用户
+    user_id -> (当前 token_version, 是否可用)
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, bool]] = {}
+        self._lock = threading.Lock()
+        # 是否已从数据库完整加载过一次；未加载时表为空，不能据此判断令牌未被吊销
+        self.loaded = False
+
+    async def refresh(self, db: AsyncSession):
+        """从数据库全量重建吊销表"""
+        result = await db.execute(
+            select(User.id, User.token_version, User.is_active, User.deleted_at).where(or_(
+                User.token_version > 0,
+                User.is_active == False,
+                User.deleted_at != None
+            ))
+        )
+        entries = {
+            str(user_id): (token_version, bool(is_active) and deleted_at is None)
+            for user_id, token_version, is_active, deleted_at in result.all()
+        }
+        with self._lock:
+            self._entries = entries
+            self.loaded = True
+
+    def update(self, user_id: str, token_version: int, active: bool):
+        """本进程内的变更立即生效，不必等待下一次刷新"""
+        with self._lock:
+            self._entries[str(user_id)] = (token_version, active)
+
+    def is_revoked(self, user_id: str, token_version: Optional[int]) -> bool:
+        entry = self._entries.get(str(user_id))
+        if entry is None:
+            return False
+        current_version, active = entry
+        return not active or (token_version or 0) < current_version
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,44 @@
+"""
+后台周期任务
+统一管理随应用启动/关闭的 asyncio 周期任务
+"""
+import asyncio
+import logging
+import traceback
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger("diftagent")
+
+class PeriodicTask:
+    """按固定间隔执行协程函数，单次失败只记录日志不终止循环"""
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[None]]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name=self.name)
+            logger.info(f"Periodic task started: {self.name} (every {self.interval}s)")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error(f"Periodic task {self.name} failed: {traceback.format_exc()}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info(f"Periodic task stopped: {self.name}")
@@ -0,0 +1,103 @@
+"""
+进程内缓存
+提供有界 LRU + TTL 缓存（按条目数，可选再按估算字节数限制），并统一登记命中/未命中统计，供 /health/cache 查看
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# 所有具名缓存实例，用于统一输出统计信息
+_registry: Dict[str, "TTLCache"] = {}
+
+class TTLCache:
+    """有界 LRU + TTL 缓存（线程安全）"""
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 1024,
+        ttl: float = 60.0,
+        maxbytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        """maxbytes 与 sizeof 同时给出时，条目估算字节数之和也不超过 maxbytes（单个超限的条目不缓存）"""
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes if sizeof is not None else None
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，过期条目视为未命中并被移除"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._bytes -= size
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        size = self.sizeof(value) if self.maxbytes is not None else 0
+        with self._lock:
+            self._pop(key)
+            if self.maxbytes is not None and size > self.maxbytes:
+                return
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                self._bytes -= self._data.popitem(last=False)[1][2]
+
+    def _pop(self, key: Hashable):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def invalidate(self, key: Hashable):
+        """移除单个条目"""
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        """清空缓存（统计计数保留）"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中/未命中统计"""
+        total = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+        if self.maxbytes is not None:
+            stats.update(bytes=self._bytes, maxbytes=self.maxbytes)
+        return stats
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """返回所有具名缓存的统计信息"""
+    return {name: cache.stats() for name, cache in _registry.items()}
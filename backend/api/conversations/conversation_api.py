@@ -2,14 +2,17 @@
 对话日志API接口
 提供对话会话和消息的CRUD操作
 """
-from sqlalchemy.orm import Session
-from datetime import datetime
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from pydantic import BaseModel, Field, validator
 from models.models import User
 from models.conversation import ConversationSession, ConversationMessage
 from api.routers import get_db, get_current_user_from_cookie
+from api.pagination import apply_keyset, finalize_keyset_page
+from api.conversations.message_logger import message_logger
 import uuid
 
 # Pydantic模型
@@ -51,6 +54,12 @@ class ConversationMessageCreate(BaseModel):
             raise ValueError('message_type must be one of: user, assistant, system, tool')
         return v
 
+# 单次批量写入的最大消息数
+MAX_BATCH_MESSAGES = 50
+
+class ConversationMessageBatchCreate(BaseModel):
+    messages: List[ConversationMessageCreate] = Field(..., min_length=1, max_length=MAX_BATCH_MESSAGES)
+
 class ConversationMessageOut(BaseModel):
     id: str
     message_type: str
@@ -79,17 +88,18 @@ conversation_router = APIRouter(prefix="/conversations", tags=["Conversations"])
 @conversation_router.post("/sessions", response_model=ConversationSessionOut)
 async def create_conversation_session(
     session_data: ConversationSessionCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
     """创建新的对话会话"""
     try:
         # 检查会话名称是否已存在
-        existing_session = db.query(ConversationSession).filter(
+        result = await db.execute(select(ConversationSession).where(
             ConversationSession.user_id == current_user.id,
             ConversationSession.session_name == session_data.session_name,
             ConversationSession.deleted_at == None
-        ).first()
+        ))
+        existing_session = result.scalars().first()
         
         if existing_session:
             raise HTTPException(
@@ -106,8 +116,8 @@ async def create_conversation_session(
         )
         
         db.add(session)
-        db.commit()
-        db.refresh(session)
+        await db.commit()
+        await db.refresh(session)
         
         return ConversationSessionOut(
             id=str(session.id),
@@ -122,62 +132,62 @@ async def create_conversation_session(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Create session failed: {str(e)}")
 
 @conversation_router.get("/sessions", response_model=List[ConversationSessionOut])
 async def list_conversation_sessions(
+    response: Response,
     session_type: Optional[str] = Query(None, description="Filter by session type"),
     limit: int = Query(50, ge=1, le=100, description="Number of sessions to return"),
-    offset: int = Query(0, ge=0, description="Number of sessions to skip"),
-    db: Session = Depends(get_db),
+    offset: int = Query(0, ge=0, description="Number of sessions to skip (ignored when cursor is set)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor / X-Prev-Cursor"),
+    direction: str = Query("next", pattern="^(next|prev)$", description="Page direction relative to cursor"),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
-    """获取用户的对话会话列表"""
+    """获取用户的对话会话列表（按 updated_at, id 倒序，支持游标分页）"""
     try:
-        query = db.query(ConversationSession).filter(
+        query = select(ConversationSession).where(
             ConversationSession.user_id == current_user.id,
             ConversationSession.deleted_at == None
         )
         
         if session_type:
-            query = query.filter(ConversationSession.session_type == session_type)
+            query = query.where(ConversationSession.session_type == session_type)
         
-        sessions = query.order_by(ConversationSession.updated_at.desc()).offset(offset).limit(limit).all()
+        query = apply_keyset(
+            query, ConversationSession.updated_at, ConversationSession.id,
+            cursor, direction, descending=True, limit=limit
+        )
+        if not cursor:
+            query = query.offset(offset)
         
-        result = []
-        for session in sessions:
-            # 获取消息数量
-            message_count = db.query(ConversationMessage).filter(
-                ConversationMessage.session_id == session.id,
-                ConversationMessage.deleted_at == None
-            ).count()
-            
-            # 获取最后消息时间
-            last_message = db.query(ConversationMessage).filter(
-                ConversationMessage.session_id == session.id,
-                ConversationMessage.deleted_at == None
-            ).order_by(ConversationMessage.created_at.desc()).first()
-            
-            result.append(ConversationSessionOut(
+        # 消息数量与最后消息时间直接读取会话上的统计列，单次查询完成
+        sessions = (await db.execute(query)).scalars().all()
+        sessions = finalize_keyset_page(sessions, "updated_at", cursor, direction, limit, response)
+        
+        return [
+            ConversationSessionOut(
                 id=str(session.id),
                 session_name=session.session_name,
                 session_type=session.session_type,
                 created_at=session.created_at,
                 updated_at=session.updated_at,
                 session_metadata=session.session_metadata,
-                message_count=message_count,
-                last_message_at=last_message.created_at if last_message else None
-            ))
-        
-        return result
+                message_count=session.message_count,
+                last_message_at=session.last_message_at
+            ) for session in sessions
+        ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"List sessions failed: {str(e)}")
 
 @conversation_router.get("/sessions/{session_id}", response_model=ConversationSessionWithMessages)
 async def get_conversation_session(
     session_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
     """获取对话会话详情和消息"""
@@ -188,20 +198,22 @@ async def get_conversation_session(
         except ValueError:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session = db.query(ConversationSession).filter(
+        result = await db.execute(select(ConversationSession).where(
             ConversationSession.id == session_uuid,
             ConversationSession.user_id == current_user.id,
             ConversationSession.deleted_at == None
-        ).first()
+        ))
+        session = result.scalars().first()
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
         # 获取消息
-        messages = db.query(ConversationMessage).filter(
+        result = await db.execute(select(ConversationMessage).where(
             ConversationMessage.session_id == session.id,
             ConversationMessage.deleted_at == None
-        ).order_by(ConversationMessage.created_at.asc()).all()
+        ).order_by(ConversationMessage.created_at.asc()))
+        messages = result.scalars().all()
         
         # 构建响应
         session_out = ConversationSessionOut(
@@ -242,7 +254,7 @@ async def get_conversation_session(
 async def update_conversation_session(
     session_id: str,
     session_data: ConversationSessionUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
     """更新对话会话"""
@@ -253,11 +265,12 @@ async def update_conversation_session(
         except ValueError:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session = db.query(ConversationSession).filter(
+        result = await db.execute(select(ConversationSession).where(
             ConversationSession.id == session_uuid,
             ConversationSession.user_id == current_user.id,
             ConversationSession.deleted_at == None
-        ).first()
+        ))
+        session = result.scalars().first()
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
@@ -265,12 +278,13 @@ async def update_conversation_session(
         # 更新字段
         if session_data.session_name is not None:
             # 检查新名称是否与其他会话冲突
-            existing_session = db.query(ConversationSession).filter(
+            result = await db.execute(select(ConversationSession).where(
                 ConversationSession.user_id == current_user.id,
                 ConversationSession.session_name == session_data.session_name,
                 ConversationSession.id != session_uuid,
                 ConversationSession.deleted_at == None
-            ).first()
+            ))
+            existing_session = result.scalars().first()
             
             if existing_session:
                 raise HTTPException(
@@ -285,8 +299,8 @@ async def update_conversation_session(
         if session_data.session_metadata is not None:
             session.session_metadata = session_data.session_metadata
         
-        db.commit()
-        db.refresh(session)
+        await db.commit()
+        await db.refresh(session)
         
         return ConversationSessionOut(
             id=str(session.id),
@@ -295,19 +309,19 @@ async def update_conversation_session(
             created_at=session.created_at,
             updated_at=session.updated_at,
             session_metadata=session.session_metadata,
-            message_count=0,
-            last_message_at=None
+            message_count=session.message_count,
+            last_message_at=session.last_message_at
         )
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Update session failed: {str(e)}")
 
 @conversation_router.delete("/sessions/{session_id}")
 async def delete_conversation_session(
     session_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
     """删除对话会话（软删除）"""
@@ -318,34 +332,39 @@ async def delete_conversation_session(
         except ValueError:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session = db.query(ConversationSession).filter(
-            ConversationSession.id == session_uuid,
-            ConversationSession.user_id == current_user.id,
-            ConversationSession.deleted_at == None
-        ).first()
-        
-        if not session:
+        # 软删除会话：校验归属与标记删除一条 UPDATE ... RETURNING 完成
+        result = await db.execute(
+            update(ConversationSession)
+            .where(
+                ConversationSession.id == session_uuid,
+                ConversationSession.user_id == current_user.id,
+                ConversationSession.deleted_at == None
+            )
+            .values(deleted_at=func.now())
+            .returning(ConversationSession.id)
+            .execution_options(synchronize_session=False)
+        )
+        if result.first() is None:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # 软删除会话和所有消息
-        session.deleted_at = datetime.utcnow()
-        
-        # 删除相关消息
-        messages = db.query(ConversationMessage).filter(
-            ConversationMessage.session_id == session.id,
-            ConversationMessage.deleted_at == None
-        ).all()
-        
-        for message in messages:
-            message.deleted_at = datetime.utcnow()
+        # 相关消息按集合一次性软删除，不加载到内存
+        await db.execute(
+            update(ConversationMessage)
+            .where(
+                ConversationMessage.session_id == session_uuid,
+                ConversationMessage.deleted_at == None
+            )
+            .values(deleted_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
         
-        db.commit()
+        await db.commit()
         
         return {"message": "Session deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Delete session failed: {str(e)}")
 
 # 消息管理API
@@ -353,7 +372,7 @@ async def delete_conversation_session(
 async def add_conversation_message(
     session_id: str,
     message_data: ConversationMessageCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
     """添加对话消息"""
@@ -364,15 +383,34 @@ async def add_conversation_message(
         except ValueError:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session = db.query(ConversationSession).filter(
+        result = await db.execute(select(ConversationSession).where(
             ConversationSession.id == session_uuid,
             ConversationSession.user_id == current_user.id,
             ConversationSession.deleted_at == None
-        ).first()
+        ))
+        session = result.scalars().first()
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
+        # 写后缓冲：入队即返回，由后台任务批量落库；队列满时退回同步写入
+        # 不保证读己之写：刷写前（最多 conversation_flush_interval_seconds）消息不出现在消息列表与会话统计中，
+        # 数据库不可用而落盘的消息要等数据库恢复后的下一次重放（conversation_fallback_replay_seconds）才可见
+        if message_logger.running:
+            record = message_logger.build_record(session.id, current_user.id, message_data)
+            if message_logger.try_enqueue(record):
+                return ConversationMessageOut(
+                    id=str(record["id"]),
+                    message_type=record["message_type"],
+                    content=record["content"],
+                    role=record["role"],
+                    tool_name=record["tool_name"],
+                    tool_params=record["tool_params"],
+                    tool_result=record["tool_result"],
+                    tokens_used=record["tokens_used"],
+                    created_at=record["created_at"]
+                )
+        
         # 创建消息
         message = ConversationMessage(
             session_id=session.id,
@@ -387,8 +425,19 @@ async def add_conversation_message(
         )
         
         db.add(message)
-        db.commit()
-        db.refresh(message)
+        await db.flush()
+        
+        # 同一事务内原子更新会话统计
+        await db.execute(
+            update(ConversationSession)
+            .where(ConversationSession.id == session.id)
+            .values(
+                message_count=ConversationSession.message_count + 1,
+                last_message_at=func.now()
+            )
+        )
+        await db.commit()
+        await db.refresh(message)
         
         return ConversationMessageOut(
             id=str(message.id),
@@ -404,18 +453,103 @@ async def add_conversation_message(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Add message failed: {str(e)}")
 
+@conversation_router.post("/sessions/{session_id}/messages:batch", response_model=List[ConversationMessageOut])
+async def add_conversation_messages_batch(
+    session_id: str,
+    batch_data: ConversationMessageBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """批量添加对话消息（一轮对话的 user/assistant/tool 消息一次写入，按提交顺序返回）"""
+    try:
+        # 验证UUID格式
+        try:
+            session_uuid = uuid.UUID(session_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        # 同一批消息的时间戳按顺序递增 1 微秒，保证 (created_at, id) 排序与提交顺序一致
+        base_time = datetime.now(timezone.utc)
+        timestamps = [base_time + timedelta(microseconds=i) for i in range(len(batch_data.messages))]
+        
+        # 校验会话归属并更新统计，一条 UPDATE ... RETURNING 完成
+        result = await db.execute(
+            update(ConversationSession)
+            .where(
+                ConversationSession.id == session_uuid,
+                ConversationSession.user_id == current_user.id,
+                ConversationSession.deleted_at == None
+            )
+            .values(
+                message_count=ConversationSession.message_count + len(batch_data.messages),
+                last_message_at=func.greatest(
+                    func.coalesce(ConversationSession.last_message_at, timestamps[-1]), timestamps[-1]
+                )
+            )
+            .returning(ConversationSession.id)
+            .execution_options(synchronize_session=False)
+        )
+        if result.first() is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        
+        # 单条多行 INSERT ... RETURNING，返回顺序与参数顺序一致
+        result = await db.execute(
+            insert(ConversationMessage.__table__).returning(
+                *ConversationMessage.__table__.columns, sort_by_parameter_order=True
+            ),
+            [
+                {
+                    "id": uuid.uuid4(),
+                    "session_id": session_uuid,
+                    "user_id": current_user.id,
+                    "message_type": message_data.message_type,
+                    "content": message_data.content,
+                    "role": message_data.role,
+                    "tool_name": message_data.tool_name,
+                    "tool_params": message_data.tool_params,
+                    "tool_result": message_data.tool_result,
+                    "tokens_used": message_data.tokens_used,
+                    "created_at": created_at
+                } for message_data, created_at in zip(batch_data.messages, timestamps)
+            ]
+        )
+        messages = result.all()
+        await db.commit()
+        
+        return [
+            ConversationMessageOut(
+                id=str(msg.id),
+                message_type=msg.message_type,
+                content=msg.content,
+                role=msg.role,
+                tool_name=msg.tool_name,
+                tool_params=msg.tool_params,
+                tool_result=msg.tool_result,
+                tokens_used=msg.tokens_used,
+                created_at=msg.created_at
+            ) for msg in messages
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Add messages failed: {str(e)}")
+
 @conversation_router.get("/sessions/{session_id}/messages", response_model=List[ConversationMessageOut])
 async def list_conversation_messages(
     session_id: str,
+    response: Response,
     limit: int = Query(100, ge=1, le=500, description="Number of messages to return"),
-    offset: int = Query(0, ge=0, description="Number of messages to skip"),
-    db: Session = Depends(get_db),
+    offset: int = Query(0, ge=0, description="Number of messages to skip (ignored when cursor is set)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor / X-Prev-Cursor"),
+    direction: str = Query("next", pattern="^(next|prev)$", description="Page direction relative to cursor"),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
-    """获取对话消息列表"""
+    """获取对话消息列表（按 created_at, id 正序，支持游标分页）"""
     try:
         # 验证UUID格式
         try:
@@ -424,20 +558,29 @@ async def list_conversation_messages(
             raise HTTPException(status_code=404, detail="Session not found")
         
         # 验证会话存在且属于当前用户
-        session = db.query(ConversationSession).filter(
+        result = await db.execute(select(ConversationSession).where(
             ConversationSession.id == session_uuid,
             ConversationSession.user_id == current_user.id,
             ConversationSession.deleted_at == None
-        ).first()
+        ))
+        session = result.scalars().first()
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
         # 获取消息
-        messages = db.query(ConversationMessage).filter(
-            ConversationMessage.session_id == session.id,
-            ConversationMessage.deleted_at == None
-        ).order_by(ConversationMessage.created_at.asc()).offset(offset).limit(limit).all()
+        query = apply_keyset(
+            select(ConversationMessage).where(
+                ConversationMessage.session_id == session.id,
+                ConversationMessage.deleted_at == None
+            ),
+            ConversationMessage.created_at, ConversationMessage.id,
+            cursor, direction, descending=False, limit=limit
+        )
+        if not cursor:
+            query = query.offset(offset)
+        result = await db.execute(query)
+        messages = finalize_keyset_page(result.scalars().all(), "created_at", cursor, direction, limit, response)
         
         return [
             ConversationMessageOut(
@@ -460,7 +603,7 @@ async def list_conversation_messages(
 @conversation_router.delete("/messages/{message_id}")
 async def delete_conversation_message(
     message_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
     """删除对话消息（软删除）"""
@@ -471,22 +614,37 @@ async def delete_conversation_message(
         except ValueError:
             raise HTTPException(status_code=404, detail="Message not found")
         
-        message = db.query(ConversationMessage).filter(
+        result = await db.execute(select(ConversationMessage).where(
             ConversationMessage.id == message_uuid,
             ConversationMessage.user_id == current_user.id,
             ConversationMessage.deleted_at == None
-        ).first()
+        ))
+        message = result.scalars().first()
         
         if not message:
             raise HTTPException(status_code=404, detail="Message not found")
         
         # 软删除消息
         message.deleted_at = datetime.utcnow()
-        db.commit()
+        await db.flush()
+        
+        # 同一事务内原子更新会话统计，最后消息时间按剩余消息重新计算
+        await db.execute(
+            update(ConversationSession)
+            .where(ConversationSession.id == message.session_id)
+            .values(
+                message_count=func.greatest(ConversationSession.message_count - 1, 0),
+                last_message_at=select(func.max(ConversationMessage.created_at)).where(
+                    ConversationMessage.session_id == message.session_id,
+                    ConversationMessage.deleted_at == None
+                ).scalar_subquery()
+            )
+        )
+        await db.commit()
         
         return {"message": "Message deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Delete message failed: {str(e)}") 
\ No newline at end of file
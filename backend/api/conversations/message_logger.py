@@ -0,0 +1,352 @@
+"""
+对话消息写后缓冲（write-behind）
+消息进入进程内有界队列即确认，由后台任务按数量/时间阈值批量写入数据库；
+数据库不可用时批次落盘到本地回退文件，启动时及运行期间数据库恢复后定期重放。批次写入失败而数据库可用时逐条重试，
+本身无法写入的记录移入隔离文件（.quarantine），不再反复重放
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import traceback
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from api.background import PeriodicTask
+from models.conversation import ConversationSession, ConversationMessage
+
+logger = logging.getLogger("diftagent")
+
+# 回退文件中需要还原类型的字段
+_UUID_FIELDS = ("id", "session_id", "user_id")
+
+def _serialize(record: Dict[str, Any]) -> str:
+    data = dict(record)
+    for field in _UUID_FIELDS:
+        data[field] = str(data[field])
+    data["created_at"] = data["created_at"].isoformat()
+    return json.dumps(data, ensure_ascii=False)
+
+def _deserialize(line: str) -> Dict[str, Any]:
+    data = json.loads(line)
+    for field in _UUID_FIELDS:
+        data[field] = uuid.UUID(data[field])
+    data["created_at"] = datetime.fromisoformat(data["created_at"])
+    return data
+
+class BufferedMessageLogger:
+    """有界队列 + 后台批量刷写的消息记录器"""
+
+    def __init__(
+        self,
+        session_factory,
+        max_queue_size: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        fallback_path: str = "logs/conversation_messages.fallback.ndjson",
+        replay_interval: float = 30
+    ):
+        self.session_factory = session_factory
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fallback_path = fallback_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._accepting = False
+        self._replay_task = PeriodicTask("conversation-fallback-replay", replay_interval, self._replay_when_available)
+        self.flushed = 0
+        self.spilled = 0
+        self.quarantined = 0
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    def build_record(self, session_id, user_id, message_data) -> Dict[str, Any]:
+        """在应用侧生成 id 与时间戳，入队即可返回给调用方"""
+        return {
+            "id": uuid.uuid4(),
+            "session_id": session_id,
+            "user_id": user_id,
+            "message_type": message_data.message_type,
+            "content": message_data.content,
+            "role": message_data.role,
+            "tool_name": message_data.tool_name,
+            "tool_params": message_data.tool_params,
+            "tool_result": message_data.tool_result,
+            "tokens_used": message_data.tokens_used,
+            "created_at": datetime.now(timezone.utc)
+        }
+
+    def try_enqueue(self, record: Dict[str, Any]) -> bool:
+        """放入队列；未启动或队列已满时返回 False，由调用方改为同步写入"""
+        if not self._accepting:
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        await self.replay_fallback()
+        self._accepting = True
+        self._task = asyncio.create_task(self._run(), name="conversation-message-logger")
+        self._replay_task.start()
+        logger.info("Conversation write-behind logger started")
+
+    async def stop(self):
+        """停止接收新消息并刷写队列中剩余的全部消息"""
+        if self._task is None:
+            return
+        self._accepting = False
+        await self._replay_task.stop()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        remaining = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+        logger.info(f"Conversation write-behind logger stopped, flushed {len(remaining)} pending messages")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                # 达到批量大小或距第一条消息超过 flush_interval 即刷写
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                # 关闭时尚未落库的批次放回队列，由 stop() 统一刷写
+                for record in batch:
+                    self._queue.put_nowait(record)
+                raise
+
+    async def _write(self, records: List[Dict[str, Any]]):
+        """多行 INSERT 写入消息，并按实际插入的行数更新会话统计（重放时可重复执行）"""
+        table = ConversationMessage.__table__
+        async with self.session_factory() as db:
+            result = await db.execute(
+                pg_insert(table)
+                .on_conflict_do_nothing(index_elements=[table.c.id])
+                .returning(table.c.session_id, table.c.created_at),
+                records
+            )
+            stats = defaultdict(lambda: [0, None])
+            for session_id, created_at in result.all():
+                entry = stats[session_id]
+                entry[0] += 1
+                entry[1] = created_at if entry[1] is None else max(entry[1], created_at)
+            for session_id, (count, last_message_at) in stats.items():
+                await db.execute(
+                    update(ConversationSession)
+                    .where(ConversationSession.id == session_id)
+                    .values(
+                        message_count=ConversationSession.message_count + count,
+                        last_message_at=func.greatest(
+                            func.coalesce(ConversationSession.last_message_at, last_message_at), last_message_at
+                        )
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+
+    async def _database_available(self) -> bool:
+        try:
+            async with self.session_factory() as db:
+                await db.execute(select(1))
+            return True
+        except Exception:
+            return False
+
+    async def _write_isolating(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        写入批次，返回需要稍后重试的记录
+        批次失败而数据库仍可用时逐条重试，单独写入也失败的记录移入隔离文件；数据库不可用时剩余记录全部返回
+        """
+        try:
+            await self._write(batch)
+            self.flushed += len(batch)
+            return []
+        except Exception:
+            logger.error(f"Write-behind flush of {len(batch)} messages failed: {traceback.format_exc()}")
+        if not await self._database_available():
+            return batch
+        for index, record in enumerate(batch):
+            try:
+                await self._write([record])
+                self.flushed += 1
+            except Exception:
+                if not await self._database_available():
+                    return batch[index:]
+                logger.error(f"Quarantining message {record['id']} to {self.quarantine_path}: {traceback.format_exc()}")
+                await asyncio.to_thread(self._append_lines, self.quarantine_path, [_serialize(record)])
+                self.quarantined += 1
+        return []
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        retry = await self._write_isolating(batch)
+        if retry:
+            logger.error(f"Spilling {len(retry)} messages to {self.fallback_path}")
+            await asyncio.to_thread(self._spill_lines, [_serialize(record) for record in retry])
+            self.spilled += len(retry)
+
+    @property
+    def replaying_path(self) -> str:
+        return self.fallback_path + ".replaying"
+
+    @property
+    def quarantine_path(self) -> str:
+        return self.fallback_path + ".quarantine"
+
+    def _append_lines(self, path: str, lines: List[str]):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _lock_replay(self) -> Optional[int]:
+        """获取重放锁（flock，进程退出时自动释放）；其他进程正在重放时返回 None"""
+        fd = os.open(self.fallback_path + ".lock", os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _with_append_lock(self, func):
+        """持有追加锁执行：追加回退文件与将其改名为 .replaying 互斥，改名后不会再有写入落到待重放文件中"""
+        directory = os.path.dirname(self.fallback_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.fallback_path + ".append.lock", os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return func()
+        finally:
+            os.close(fd)
+
+    def _spill_lines(self, lines: List[str]):
+        self._with_append_lock(lambda: self._append_lines(self.fallback_path, lines))
+
+    def _take_fallback(self) -> bool:
+        """将回退文件改名为 .replaying，回退文件不存在时返回 False"""
+        def rename():
+            try:
+                os.replace(self.fallback_path, self.replaying_path)
+                return True
+            except FileNotFoundError:
+                return False
+        return self._with_append_lock(rename)
+
+    def _read_replaying(self) -> List[Dict[str, Any]]:
+        """读取待重放记录，无法解析的行直接移入隔离文件"""
+        records = []
+        broken = []
+        with open(self.replaying_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(_deserialize(line))
+                except (ValueError, KeyError, TypeError):
+                    broken.append(line.rstrip("\n"))
+        if broken:
+            logger.error(f"Quarantining {len(broken)} unreadable lines from write-behind fallback file")
+            self._append_lines(self.quarantine_path, broken)
+            self.quarantined += len(broken)
+        return records
+
+    async def _replay_file(self) -> int:
+        """重放 .replaying 文件后删除，未写入的记录追加回回退文件，返回未写入的记录数"""
+        records = await asyncio.to_thread(self._read_replaying)
+        retry = []
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            # 数据库不可用后剩余批次不再尝试
+            retry.extend(batch if retry else await self._write_isolating(batch))
+        if retry:
+            logger.error(f"Replaying write-behind fallback file left {len(retry)} messages for the next replay")
+            await asyncio.to_thread(self._spill_lines, [_serialize(record) for record in retry])
+        logger.info(f"Replayed {len(records) - len(retry)} of {len(records)} messages from write-behind fallback file")
+        os.remove(self.replaying_path)
+        return len(retry)
+
+    async def replay_fallback(self):
+        """
+        重放回退文件中的消息（多进程同时启动时只有持有重放锁的进程重放）
+        上次重放中途退出遗留的 .replaying 文件优先重放；已提交的批次不再写回，只有未写入的记录追加回回退文件。
+        写入按消息 id 幂等，中途退出后重复重放不会产生重复消息
+        """
+        if not os.path.exists(self.fallback_path) and not os.path.exists(self.replaying_path):
+            return
+        lock = await asyncio.to_thread(self._lock_replay)
+        if lock is None:
+            logger.info("Write-behind fallback file is being replayed by another process")
+            return
+        try:
+            # 先重放遗留的 .replaying 文件；数据库可用时再接着重放回退文件
+            if os.path.exists(self.replaying_path) and await self._replay_file():
+                return
+            if await asyncio.to_thread(self._take_fallback):
+                await self._replay_file()
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+            os.close(lock)
+
+    async def _replay_when_available(self):
+        """运行期间的定期重放：有回退文件且数据库已恢复时重放，不必等到下次重启"""
+        if not os.path.exists(self.fallback_path) and not os.path.exists(self.replaying_path):
+            return
+        if await self._database_available():
+            await self.replay_fallback()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "flushed": self.flushed,
+            "spilled": self.spilled,
+            "quarantined": self.quarantined
+        }
+
+from api.routers import SessionLocal, settings
+
+message_logger = BufferedMessageLogger(
+    SessionLocal,
+    max_queue_size=settings.conversation_queue_size,
+    batch_size=settings.conversation_flush_batch_size,
+    flush_interval=settings.conversation_flush_interval_seconds,
+    fallback_path=settings.conversation_fallback_path,
+    replay_interval=settings.conversation_fallback_replay_seconds
+)
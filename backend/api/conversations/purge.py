@@ -0,0 +1,47 @@
+"""
+对话数据清理
+分批物理删除软删除超过保留期的消息和会话，避免表与部分索引膨胀
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete
+
+from models.conversation import ConversationSession, ConversationMessage
+
+logger = logging.getLogger("diftagent")
+
+async def _purge_table(session_factory, model, cutoff: datetime, batch_size: int) -> int:
+    """按批删除 deleted_at 早于 cutoff 的行，每批一个短事务；返回删除总数"""
+    total = 0
+    while True:
+        # SKIP LOCKED：多实例同时清理时互不等待
+        batch = (
+            select(model.id)
+            .where(model.deleted_at < cutoff)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with session_factory() as db:
+            result = await db.execute(
+                delete(model)
+                .where(model.id.in_(batch))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+
+async def purge_deleted_conversations(session_factory, retention_days: int, batch_size: int) -> dict:
+    """
+    清理软删除超过 retention_days 天的对话数据
+    先删消息再删会话，删除会话时不会再级联大量消息
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    messages = await _purge_table(session_factory, ConversationMessage, cutoff, batch_size)
+    sessions = await _purge_table(session_factory, ConversationSession, cutoff, batch_size)
+    if messages or sessions:
+        logger.info(f"Purged {messages} conversation messages and {sessions} sessions deleted before {cutoff.isoformat()}")
+    return {"messages": messages, "sessions": sessions}
@@ -0,0 +1,320 @@
+"""
+文档批量导入
+接受与 GET /documents/export 相同格式的 NDJSON 或 zip 归档，逐行校验，按 document_import_batch_size 个文档一批用 COPY 写入：
+blob 先 COPY 到临时表再 INSERT ... ON CONFLICT DO NOTHING 去重；文档 COPY 到临时表后 INSERT ... SELECT 写入并同时计算检索向量
+（只插入不更新，updated_at 触发器不会覆盖归档中的时间戳），版本直接 COPY 到 {type}_document_versions。
+文档行带着尚不存在的 current_version_id 先写入，依赖 DEFERRABLE INITIALLY DEFERRED 外键在提交时检查；
+出错的行记录在 errors 中并跳过，不影响同批其他文档
+"""
+import json
+import re
+import uuid
+import zipfile
+import zlib
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from api.routers import settings
+from api.documents.compression import compression_enabled, compress
+from api.documents.export import FORMAT_EXTENSIONS
+from api.documents.version_store import calculate_checksum, CONTENT_MAX_CHARS
+
+# 归档中的记录：(kind, location, fields)，kind 为 document / version / error
+Record = Tuple[str, str, object]
+
+VERSION_FILE = re.compile(r"^v(\d+)\.\w+$")
+
+# 单个 zip 条目损坏（CRC 校验失败、压缩流错误等）时的异常，按行记录错误
+ZIP_ENTRY_ERRORS = (zipfile.BadZipFile, zlib.error, OSError)
+
+# 解压前按未压缩大小拒绝的上限：版本文件按 UTF-8 最多 4 字节/字符估算；document.json 含全部版本的元数据（约 200 字节/版本）
+VERSION_FILE_MAX_BYTES = CONTENT_MAX_CHARS * 4
+DOCUMENT_JSON_MAX_BYTES = 1024 * 1024
+
+class ImportRowError(ValueError):
+    """单行校验失败，记录到 errors 后跳过"""
+
+class PendingDocument:
+    """已通过校验、等待写入的文档及其版本"""
+
+    def __init__(self, location: str, doc_type: str, title: str, source_id, source_current_version_id, created_at, updated_at):
+        self.location = location
+        self.doc_type = doc_type
+        self.title = title
+        self.source_id = source_id
+        self.source_current_version_id = source_current_version_id
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.versions: List[dict] = []
+
+def read_ndjson(stream) -> Iterator[Record]:
+    """逐行读取 NDJSON（record=document 后跟其 record=version 行）"""
+    for line_number, line in enumerate(stream, start=1):
+        location = f"line {line_number}"
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except (ValueError, UnicodeDecodeError) as e:
+            yield "error", location, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict) or record.get("record") not in ("document", "version"):
+            yield "error", location, "record must be document or version"
+            continue
+        yield record["record"], location, record
+
+def read_zip(archive: zipfile.ZipFile) -> Iterator[Record]:
+    """读取 zip：每个 {type}/{document_id}/ 目录一个文档，document.json 为元数据，v{n}.{ext} 为版本内容"""
+    directories: Dict[str, Dict[int, zipfile.ZipInfo]] = {}
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        directory, _, name = info.filename.rpartition("/")
+        versions = directories.setdefault(directory, {})
+        match = VERSION_FILE.match(name)
+        if match:
+            versions[int(match.group(1))] = info
+        elif name != "document.json":
+            yield "error", info.filename, "Unexpected file in archive"
+
+    for directory, files in directories.items():
+        location = f"{directory}/document.json"
+        try:
+            info = archive.getinfo(location)
+        except KeyError:
+            yield "error", location, "Missing document.json"
+            continue
+        if info.file_size > DOCUMENT_JSON_MAX_BYTES:
+            yield "error", location, f"document.json exceeds {DOCUMENT_JSON_MAX_BYTES} bytes"
+            continue
+        try:
+            metadata = json.loads(archive.read(info))
+        except ZIP_ENTRY_ERRORS as e:
+            yield "error", location, f"Corrupt archive entry: {e}"
+            continue
+        except ValueError as e:
+            yield "error", location, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(metadata, dict):
+            yield "error", location, "document.json must be an object"
+            continue
+        yield "document", location, {"type": directory.partition("/")[0], **metadata}
+        versions = {
+            version.get("version_number"): version
+            for version in metadata.get("versions") or [] if isinstance(version, dict)
+        }
+        for version_number in sorted(files):
+            info = files[version_number]
+            extension = info.filename.rpartition(".")[2]
+            fields = {
+                "content_format": next((name for name, ext in FORMAT_EXTENSIONS.items() if ext == extension), "markdown"),
+                **versions.get(version_number, {}),
+                "version_number": version_number
+            }
+            # 按未压缩大小先行拒绝，不解压超长内容
+            if info.file_size > VERSION_FILE_MAX_BYTES:
+                yield "error", info.filename, f"Content exceeds {CONTENT_MAX_CHARS} characters"
+                continue
+            try:
+                fields["content"] = archive.read(info).decode("utf-8")
+            except ZIP_ENTRY_ERRORS as e:
+                yield "error", info.filename, f"Corrupt archive entry: {e}"
+                continue
+            except UnicodeDecodeError:
+                yield "error", info.filename, "Content must be UTF-8 text"
+                continue
+            yield "version", info.filename, fields
+
+def parse_timestamp(value, default: datetime) -> datetime:
+    """ISO 8601 时间戳转为 UTC naive datetime（与库中 DateTime 列一致），为空时返回默认值"""
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise ImportRowError("Timestamps must be ISO 8601 strings")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ImportRowError(f"Invalid timestamp: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def validate_document(location: str, fields: dict, now: datetime, get_document_model: Callable) -> PendingDocument:
+    doc_type = fields.get("type")
+    if not isinstance(doc_type, str) or not get_document_model(doc_type):
+        raise ImportRowError(f"Invalid document type: {doc_type}. Must be one of: resume, letter, sop")
+    title = fields.get("title")
+    if not isinstance(title, str) or not title.strip():
+        raise ImportRowError("title is required")
+    created_at = parse_timestamp(fields.get("created_at"), now)
+    return PendingDocument(
+        location, doc_type, title, fields.get("id"), fields.get("current_version_id"),
+        created_at, parse_timestamp(fields.get("updated_at"), created_at)
+    )
+
+def validate_version(fields: dict, now: datetime) -> dict:
+    content = fields.get("content")
+    if not isinstance(content, str):
+        raise ImportRowError("content is required")
+    if len(content) > CONTENT_MAX_CHARS:
+        raise ImportRowError(f"Content exceeds {CONTENT_MAX_CHARS} characters")
+    content_format = fields.get("content_format", "markdown")
+    if content_format not in FORMAT_EXTENSIONS:
+        raise ImportRowError("content_format must be one of: markdown, html, plain")
+    version_number = fields.get("version_number")
+    if version_number is not None and (not isinstance(version_number, int) or isinstance(version_number, bool) or version_number < 1):
+        raise ImportRowError("version_number must be a positive integer")
+    checksum = calculate_checksum(content)
+    # 归档中带校验和时核对内容完整性
+    if fields.get("checksum_sha256") not in (None, checksum):
+        raise ImportRowError("checksum_sha256 does not match content")
+    return {
+        "source_id": fields.get("id"),
+        "version_number": version_number,
+        "content": content,
+        "content_format": content_format,
+        "checksum": checksum,
+        "created_at": parse_timestamp(fields.get("created_at"), now)
+    }
+
+async def _copy(db, table: str, columns: List[str], records: List[tuple]):
+    """在当前事务中用 asyncpg COPY 写入"""
+    connection = await (await db.connection()).get_raw_connection()
+    await connection.driver_connection.copy_records_to_table(table, columns=columns, records=records)
+
+async def load_batch(db, user_id, batch: List[PendingDocument], get_document_model: Callable) -> List[dict]:
+    """一个事务写入一批文档（不提交），返回导入结果"""
+    blobs = {}
+    documents: List[tuple] = []
+    versions: Dict[str, List[tuple]] = {}
+    imported = []
+    for document in batch:
+        document_id = uuid.uuid4()
+        ordered = sorted(document.versions, key=lambda v: v["version_number"] if v["version_number"] is not None else float("inf"))
+        current = ordered[-1]
+        version_rows = []
+        for version_number, version in enumerate(ordered, start=1):
+            version["id"] = uuid.uuid4()
+            if document.source_current_version_id is not None and version["source_id"] == document.source_current_version_id:
+                current = version
+            byte_length = len(version["content"].encode("utf-8"))
+            blobs.setdefault(version["checksum"], (version["content"], byte_length))
+            version_rows.append((
+                version["id"], document_id, version_number, version["content_format"], version["checksum"], byte_length,
+                0, user_id, version["created_at"], version["created_at"]
+            ))
+        documents.append((
+            document.doc_type, document_id, user_id, document.title, current["id"], len(ordered) + 1,
+            document.created_at, document.updated_at, current["content"]
+        ))
+        versions.setdefault(document.doc_type, []).extend(version_rows)
+        imported.append({
+            "id": str(document_id),
+            "source_id": str(document.source_id) if document.source_id is not None else None,
+            "type": document.doc_type,
+            "title": document.title,
+            "version_count": len(ordered)
+        })
+
+    # blob 只存完整快照；已存在的内容不重复写入
+    compressed = compression_enabled()
+    blob_rows = []
+    for checksum, (content, byte_length) in blobs.items():
+        content_zstd, dictionary_id = await compress(db, content) if compressed else (None, None)
+        blob_rows.append((checksum, None if compressed else content, content_zstd, dictionary_id, byte_length))
+    blob_columns = ["checksum_sha256", "content", "content_zstd", "dictionary_id", "byte_length"]
+    await db.execute(text(
+        "CREATE TEMP TABLE import_blobs (checksum_sha256 TEXT, content TEXT, content_zstd BYTEA, dictionary_id INTEGER, byte_length INTEGER) ON COMMIT DROP"
+    ))
+    await _copy(db, "import_blobs", blob_columns, blob_rows)
+    await db.execute(text(f"""
+        INSERT INTO document_blobs ({", ".join(blob_columns)}, chain_depth, created_at)
+        SELECT {", ".join(blob_columns)}, 0, now() AT TIME ZONE 'utc' FROM import_blobs
+        ON CONFLICT (checksum_sha256) DO NOTHING
+    """))
+
+    # COPY 无法计算表达式：文档先进临时表，再 INSERT ... SELECT 时计算当前版本的检索向量
+    document_columns = ["id", "user_id", "title", "current_version_id", "next_version_number", "created_at", "updated_at"]
+    await db.execute(text(
+        "CREATE TEMP TABLE import_documents (doc_type TEXT, id UUID, user_id UUID, title TEXT, current_version_id UUID, "
+        "next_version_number INTEGER, created_at TIMESTAMP, updated_at TIMESTAMP, content TEXT) ON COMMIT DROP"
+    ))
+    await _copy(db, "import_documents", ["doc_type", *document_columns, "content"], documents)
+    for doc_type, rows in versions.items():
+        doc_model, version_model = get_document_model(doc_type)
+        await db.execute(text(f"""
+            INSERT INTO {doc_model.__tablename__} ({", ".join(document_columns)}, content_tsv)
+            SELECT {", ".join(document_columns)}, to_tsvector(CAST(:config AS regconfig), content)
+            FROM import_documents WHERE doc_type = :doc_type
+        """), {"config": settings.document_search_config, "doc_type": doc_type})
+        await _copy(db, version_model.__tablename__, [
+            "id", "document_id", "version_number", "content_format", "checksum_sha256", "byte_length",
+            "chain_depth", "created_by", "created_at", "updated_at"
+        ], rows)
+    return imported
+
+async def import_documents(db, records: Iterator[Record], user_id, get_document_model: Callable) -> dict:
+    """
+    逐条校验归档记录并分批写入，返回 {documents, imported_versions, errors}
+    无效的文档行连同其版本一起跳过；没有有效版本的文档不导入；某一批写入失败时该批文档全部记为错误，后续批次继续
+    """
+    result = {"documents": [], "imported_versions": 0, "errors": []}
+    now = datetime.utcnow()
+    batch: List[PendingDocument] = []
+    current: Optional[PendingDocument] = None
+    rejected = False
+
+    def error(location: str, message: str):
+        result["errors"].append({"location": location, "error": message})
+
+    async def flush():
+        if not batch:
+            return
+        try:
+            imported = await load_batch(db, user_id, batch, get_document_model)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            for document in batch:
+                error(document.location, f"Import failed: {str(e)}")
+        else:
+            result["documents"].extend(imported)
+            result["imported_versions"] += sum(document["version_count"] for document in imported)
+        batch.clear()
+
+    def finish():
+        if current is None:
+            return
+        if current.versions:
+            batch.append(current)
+        else:
+            error(current.location, "Document has no valid versions")
+
+    for kind, location, fields in records:
+        if kind == "error":
+            error(location, fields)
+        elif kind == "document":
+            finish()
+            if len(batch) >= settings.document_import_batch_size:
+                await flush()
+            try:
+                current, rejected = validate_document(location, fields, now, get_document_model), False
+            except ImportRowError as e:
+                current, rejected = None, True
+                error(location, str(e))
+        elif current is None:
+            error(location, "Document row was rejected" if rejected else "Version row must follow its document row")
+        elif fields.get("document_id") is not None and fields["document_id"] != current.source_id:
+            error(location, "document_id does not match the preceding document row")
+        else:
+            try:
+                current.versions.append(validate_version(fields, now))
+            except ImportRowError as e:
+                error(location, str(e))
+    finish()
+    current = None
+    await flush()
+    return result
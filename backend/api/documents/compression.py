@@ -0,0 +1,84 @@
+"""
+文档内容 blob 的 zstd 压缩（可选）
+document_blob_compression=zstd 时新写入的 blob 以 zstd 压缩后存入 content_zstd（bytea），
+优先使用 document_compression_dictionaries 中最新训练的共享字典；压缩与解压都在 API 层完成，
+校验和始终按明文计算。未安装 zstandard 时压缩关闭，已压缩的 blob 无法读取
+"""
+import logging
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+
+from api.cache import TTLCache
+from api.routers import settings
+from models.models import DocumentCompressionDictionary
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+logger = logging.getLogger("diftagent")
+
+# 字典不可变，按 id 永久缓存
+_dictionaries: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+
+# 写入使用的字典 id（最新训练的字典），定期刷新以便使用新训练的字典
+_current_dictionary = TTLCache("document_compression_dictionary", maxsize=1, ttl=300)
+
+# 配置了 zstd 但未安装 zstandard 时只告警一次
+_missing_warned = False
+
+def compression_enabled() -> bool:
+    """是否压缩新写入的 blob"""
+    global _missing_warned
+    if settings.document_blob_compression != "zstd":
+        return False
+    if zstandard is None:
+        if not _missing_warned:
+            logger.warning("document_blob_compression=zstd but zstandard is not installed; storing blobs uncompressed")
+            _missing_warned = True
+        return False
+    return True
+
+async def _load_dictionary(db, dictionary_id: int):
+    if dictionary_id not in _dictionaries:
+        result = await db.execute(
+            select(DocumentCompressionDictionary.dictionary)
+            .where(DocumentCompressionDictionary.id == dictionary_id)
+        )
+        _dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(result.scalar_one())
+    return _dictionaries[dictionary_id]
+
+async def _current_dictionary_id(db) -> Optional[int]:
+    cached = _current_dictionary.get("current")
+    if cached is not None:
+        return cached[0]
+    result = await db.execute(
+        select(DocumentCompressionDictionary.id)
+        .order_by(DocumentCompressionDictionary.id.desc())
+        .limit(1)
+    )
+    dictionary_id = result.scalar()
+    _current_dictionary.set("current", (dictionary_id,))
+    return dictionary_id
+
+async def compress(db, text: str) -> Tuple[bytes, Optional[int]]:
+    """压缩内容，返回 (压缩数据, 字典 id)"""
+    dictionary_id = await _current_dictionary_id(db)
+    if dictionary_id is not None:
+        dictionary = await _load_dictionary(db, dictionary_id)
+        compressor = zstandard.ZstdCompressor(level=settings.document_blob_compression_level, dict_data=dictionary)
+    else:
+        compressor = zstandard.ZstdCompressor(level=settings.document_blob_compression_level)
+    return compressor.compress(text.encode("utf-8")), dictionary_id
+
+async def decompress(db, data: bytes, dictionary_id: Optional[int]) -> str:
+    """解压 content_zstd"""
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to read compressed document blobs")
+    if dictionary_id is not None:
+        decompressor = zstandard.ZstdDecompressor(dict_data=await _load_dictionary(db, dictionary_id))
+    else:
+        decompressor = zstandard.ZstdDecompressor()
+    return decompressor.decompress(data).decode("utf-8")
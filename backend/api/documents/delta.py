@@ -0,0 +1,69 @@
+"""
+文档版本行级差分编码
+差分为紧凑 JSON 数组：正整数 n 复制基准版本的 n 行，负整数 -n 跳过基准版本的 n 行，字符串为插入的整行（含换行符）
+客户端提交的补丁（POST /documents/{doc_type}/{doc_id}/versions/patch）使用同一格式
+"""
+import json
+from difflib import SequenceMatcher
+from typing import List, Optional, Union
+
+def encode_delta(base: str, target: str) -> str:
+    """计算 target 相对 base 的行级差分"""
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    ops = []
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(-(i2 - i1))
+        ops.extend(target_lines[j1:j2])
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+def apply_delta(base: str, delta: str) -> str:
+    """将差分应用到 base，还原目标内容"""
+    base_lines = base.splitlines(keepends=True)
+    result = []
+    pos = 0
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            result.append(op)
+        elif op > 0:
+            result.extend(base_lines[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(result)
+
+def apply_patch(base: str, ops: List[Union[int, str]]) -> str:
+    """应用客户端补丁；补丁须恰好覆盖基准内容的全部行（复制或跳过），否则抛出 ValueError"""
+    base_lines = base.splitlines(keepends=True)
+    result = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, str):
+            result.append(op)
+            continue
+        if op == 0:
+            raise ValueError("line count must not be 0")
+        if pos + abs(op) > len(base_lines):
+            raise ValueError(f"patch references line {pos + abs(op)} but base has {len(base_lines)} lines")
+        if op > 0:
+            result.extend(base_lines[pos:pos + op])
+        pos += abs(op)
+    if pos != len(base_lines):
+        raise ValueError(f"patch covers {pos} of {len(base_lines)} base lines")
+    return "".join(result)
+
+def appended_text(base: str, ops: List[Union[int, str]]) -> Optional[str]:
+    """补丁只在末尾追加内容时返回追加的文本，否则返回 None"""
+    copied = 0
+    index = 0
+    while index < len(ops) and not isinstance(ops[index], str) and ops[index] > 0:
+        copied += ops[index]
+        index += 1
+    if copied != len(base.splitlines(keepends=True)) or not all(isinstance(op, str) for op in ops[index:]):
+        return None
+    return "".join(ops[index:])
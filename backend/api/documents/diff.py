@@ -0,0 +1,59 @@
+"""
+版本对比（GET /documents/{doc_type}/{doc_id}/diff）
+按行分组为带上下文的块（与 unified diff 相同的分组方式），块内相邻同类片段合并为 [标记, 文本]：
+" " 为未变化，"-" 为删除，"+" 为插入；granularity=word 时被替换的行再按词对比
+"""
+import re
+from difflib import SequenceMatcher
+from typing import List
+
+# 词、连续空白、单个标点各为一个记号，拼接后与原文完全一致
+WORD_TOKEN = re.compile(r"\s+|\w+|[^\w\s]")
+
+def _append(ops: List[list], tag: str, text: str):
+    if not text:
+        return
+    if ops and ops[-1][0] == tag:
+        ops[-1][1] += text
+    else:
+        ops.append([tag, text])
+
+def _word_ops(ops: List[list], base: str, target: str):
+    base_tokens = WORD_TOKEN.findall(base)
+    target_tokens = WORD_TOKEN.findall(target)
+    matcher = SequenceMatcher(None, base_tokens, target_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            _append(ops, " ", "".join(base_tokens[i1:i2]))
+            continue
+        _append(ops, "-", "".join(base_tokens[i1:i2]))
+        _append(ops, "+", "".join(target_tokens[j1:j2]))
+
+def diff_hunks(base: str, target: str, granularity: str = "line", context: int = 3) -> List[dict]:
+    """
+    返回 target 相对 base 的差异块；from_start / to_start 从 1 开始，count 为块覆盖的行数（含上下文）
+    内容相同时返回空列表
+    """
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    hunks = []
+    for group in matcher.get_grouped_opcodes(context):
+        ops = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                _append(ops, " ", "".join(base_lines[i1:i2]))
+            elif tag == "replace" and granularity == "word":
+                _word_ops(ops, "".join(base_lines[i1:i2]), "".join(target_lines[j1:j2]))
+            else:
+                _append(ops, "-", "".join(base_lines[i1:i2]))
+                _append(ops, "+", "".join(target_lines[j1:j2]))
+        from_start, to_start = group[0][1], group[0][3]
+        hunks.append({
+            "from_start": from_start + 1,
+            "from_count": group[-1][2] - from_start,
+            "to_start": to_start + 1,
+            "to_count": group[-1][4] - to_start,
+            "ops": ops
+        })
+    return hunks
@@ -1,19 +1,34 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, func, literal, union_all, case, and_, String, Text
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from models.models import (
     Base, User, DocType,
     ResumeDocument, ResumeDocumentVersion,
     LetterDocument, LetterDocumentVersion,
-    SopDocument, SopDocumentVersion
+    SopDocument, SopDocumentVersion,
+    DocumentVersionJob, DocumentBlob
 )
-from api.routers import get_db, get_current_user_from_cookie
-from pydantic import BaseModel, Field, validator
-from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from api.cache import TTLCache
+from api.routers import get_db, get_current_user_from_cookie, SessionLocal, settings
+from api.documents.version_store import (
+    calculate_checksum, patch_checksum, load_contents, load_blob_contents, append_version, clone_version,
+    search_config, search_vector, CONTENT_MAX_CHARS
+)
+from api.documents.delta import apply_patch, appended_text
+from api.documents.diff import diff_hunks
+from api.pagination import apply_keyset, finalize_keyset_page
+from api.documents.version_jobs import AsyncQueueService
+from api.documents.export import export_ndjson, export_zip, export_filename
+from api.documents.bulk_import import read_ndjson, read_zip, import_documents
+from pydantic import BaseModel, Field, validator, StrictInt, StrictStr
+from typing import Dict, Optional, List, Union
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Response, Query, Header
+from fastapi.responses import StreamingResponse
 from typing import List
-import hashlib
-
+import html
+import sys
+import uuid
+import zipfile
 
 
 # Pydantic模型
@@ -24,10 +39,29 @@ class DocumentVersionOut(BaseModel):
     content_format: str
     created_at: datetime
     checksum_sha256: Optional[str]
+    byte_length: Optional[int] = None
 
     class Config:
         from_attributes = True
 
+class DocumentVersionSummaryOut(BaseModel):
+    """版本元数据（fields=summary），内容通过 get_version 按需获取"""
+    id: str
+    version_number: int
+    content_format: str
+    created_at: datetime
+    checksum_sha256: Optional[str]
+    byte_length: Optional[int] = None
+
+class CurrentVersionPreviewOut(BaseModel):
+    """当前版本预览（include=current_version_preview）"""
+    version_number: int
+    content_format: str
+    checksum_sha256: Optional[str]
+    byte_length: Optional[int] = None
+    preview: str  # 内容的前 document_preview_chars 个字符
+    truncated: bool
+
 class DocumentOut(BaseModel):
     id: str
     user_id: str
@@ -36,11 +70,37 @@ class DocumentOut(BaseModel):
     current_version_id: Optional[str]
     created_at: datetime
     updated_at: datetime
-    versions: List[DocumentVersionOut] = []
+    versions: List[Union[DocumentVersionOut, DocumentVersionSummaryOut]] = []
+    current_version_preview: Optional[CurrentVersionPreviewOut] = None
 
     class Config:
         from_attributes = True
 
+class DocumentSearchResultOut(BaseModel):
+    id: str
+    type: str
+    title: str
+    current_version_id: Optional[str]
+    version_number: Optional[int] = None
+    updated_at: datetime
+    rank: float
+    snippet: str  # 命中片段（已做 HTML 转义），关键词以 <mark></mark> 标记
+
+class DiffHunkOut(BaseModel):
+    from_start: int  # 块在 from 版本中的起始行（从 1 开始）
+    from_count: int
+    to_start: int
+    to_count: int
+    ops: List[List[str]]  # [标记, 文本]：" " 未变化，"-" 删除，"+" 插入
+
+class DocumentDiffOut(BaseModel):
+    from_version: int
+    to_version: int
+    from_checksum: Optional[str]
+    to_checksum: Optional[str]
+    granularity: str
+    hunks: List[DiffHunkOut]
+
 class DocumentCreate(BaseModel):
     type: str
     title: str
@@ -60,6 +120,45 @@ class DocumentUpdate(BaseModel):
 class VersionRevertRequest(BaseModel):
     version_number: int
 
+class DocumentCloneRequest(BaseModel):
+    title: Optional[str] = None  # 为空时沿用源文档标题
+    version_number: Optional[int] = None  # 为空时复制当前版本
+
+class DocumentPatchRequest(BaseModel):
+    base_version_number: int
+    # 行级补丁：正整数 n 保留基准版本的 n 行，负整数 -n 删除 n 行，字符串为插入的整行（含换行符）
+    patch: List[Union[StrictInt, StrictStr]]
+    content_format: Optional[str] = None  # 为空时沿用基准版本的格式
+
+class ImportedDocumentOut(BaseModel):
+    id: str
+    source_id: Optional[str] = None  # 归档中的原文档 id
+    type: str
+    title: str
+    version_count: int
+
+class DocumentImportErrorOut(BaseModel):
+    location: str  # NDJSON 行号或 zip 条目路径
+    error: str
+
+class DocumentImportOut(BaseModel):
+    imported_documents: int
+    imported_versions: int
+    documents: List[ImportedDocumentOut]
+    errors: List[DocumentImportErrorOut]
+
+class DocumentVersionJobOut(BaseModel):
+    id: str
+    doc_type: str
+    document_id: str
+    status: str  # queued, running, succeeded, failed, superseded
+    version_id: Optional[str] = None
+    version_number: Optional[int] = None
+    superseded_by: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
 # 工具函数
 def get_document_model(doc_type: str):
     """根据文档类型返回对应的模型类"""
@@ -70,35 +169,425 @@ def get_document_model(doc_type: str):
     }
     return models.get(doc_type)
 
-def calculate_checksum(content: str) -> str:
-    """计算内容的SHA256校验和"""
-    return hashlib.sha256(content.encode('utf-8')).hexdigest()
-
-# 异步队列接口（预留）
-class AsyncQueueService:
-    """异步队列服务接口（预留实现）"""
-    
-    @staticmethod
-    async def enqueue_version_creation(doc_type: str, doc_id: str, content: str, user_id: str):
-        """将版本创建任务加入队列"""
-        # TODO: 实现异步队列
-        pass
-    
-    @staticmethod
-    async def process_version_creation(doc_type: str, doc_id: str, content: str, user_id: str):
-        """处理版本创建任务"""
-        # TODO: 实现异步处理
-        pass
+DOC_TYPES = ['resume', 'letter', 'sop']
+
+# ts_headline 片段参数：命中词先用私用区字符标记，片段做 HTML 转义后再替换为 <mark></mark>
+SEARCH_MARK_START = "\ue000"
+SEARCH_MARK_STOP = "\ue001"
+SEARCH_HEADLINE_OPTIONS = f"StartSel={SEARCH_MARK_START}, StopSel={SEARCH_MARK_STOP}, MaxWords=35, MinWords=15, MaxFragments=2"
+
+def render_snippet(headline: str) -> str:
+    """转义 ts_headline 片段并把标记字符替换为 <mark></mark>"""
+    return html.escape(headline).replace(SEARCH_MARK_START, "<mark>").replace(SEARCH_MARK_STOP, "</mark>")
+
+def select_doc_types(doc_types: Optional[List[str]]) -> List[str]:
+    """校验 type 查询参数，返回要查询的文档类型（为空时全部类型）"""
+    if doc_types:
+        invalid = [doc_type for doc_type in doc_types if doc_type not in DOC_TYPES]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid document type: {invalid[0]}. Must be one of: resume, letter, sop")
+    return [doc_type for doc_type in DOC_TYPES if not doc_types or doc_type in doc_types]
+
+def with_current_version_preview(query, doc_model, version_model, chars: int):
+    """
+    在文档查询上外连接当前版本（及其 blob），追加预览所需的列
+    完整快照直接在 SQL 中截取前 chars 个字符；差分存储的内容 preview 为空，由 load_current_version_previews 还原
+    """
+    source = case(
+        (and_(version_model.content.isnot(None), version_model.diff_from.is_(None)), version_model.content),
+        (and_(version_model.content.is_(None), DocumentBlob.diff_from.is_(None)), DocumentBlob.content)
+    )
+    return query.outerjoin(
+        version_model, version_model.id == doc_model.current_version_id
+    ).outerjoin(
+        DocumentBlob, and_(DocumentBlob.checksum_sha256 == version_model.checksum_sha256, version_model.content.is_(None))
+    ).add_columns(
+        version_model.id.label("preview_version_id"),
+        version_model.version_number.label("preview_version_number"),
+        version_model.content_format.label("preview_content_format"),
+        version_model.checksum_sha256.label("preview_checksum_sha256"),
+        version_model.byte_length.label("preview_byte_length"),
+        func.left(source, chars).label("preview"),
+        # 旧格式版本级差分，需按版本还原
+        and_(version_model.content.isnot(None), version_model.diff_from.isnot(None)).label("preview_legacy_delta")
+    )
+
+async def load_current_version_previews(db: AsyncSession, items, chars: int) -> Dict:
+    """
+    items 为 (doc_type, row)，row 带有 with_current_version_preview 追加的列，返回 {当前版本 id: 预览}
+    差分存储的内容按类型批量还原（与读取接口共用内容缓存）
+    """
+    texts = {}
+    blob_checksums = {}
+    legacy_ids = {}
+    for doc_type, row in items:
+        if row.preview_version_id is None:
+            continue
+        if row.preview is not None:
+            texts[row.preview_version_id] = row.preview
+        elif row.preview_legacy_delta:
+            legacy_ids.setdefault(doc_type, []).append(row.preview_version_id)
+        else:
+            blob_checksums[row.preview_version_id] = row.preview_checksum_sha256
+    if blob_checksums:
+        blobs = await load_blob_contents(db, blob_checksums.values())
+        texts.update({version_id: blobs[checksum][:chars] for version_id, checksum in blob_checksums.items()})
+    for doc_type, version_ids in legacy_ids.items():
+        _, version_model = get_document_model(doc_type)
+        result = await db.execute(select(version_model).where(version_model.id.in_(version_ids)))
+        contents = await load_contents(db, version_model, result.scalars().all())
+        texts.update({version_id: content[:chars] for version_id, content in contents.items()})
+
+    previews = {}
+    for _, row in items:
+        if row.preview_version_id is None:
+            continue
+        text = texts[row.preview_version_id]
+        byte_length = row.preview_byte_length
+        previews[row.preview_version_id] = CurrentVersionPreviewOut(
+            version_number=row.preview_version_number,
+            content_format=row.preview_content_format,
+            checksum_sha256=row.preview_checksum_sha256,
+            byte_length=byte_length,
+            preview=text,
+            truncated=len(text) == chars if byte_length is None else len(text.encode("utf-8")) < byte_length
+        )
+    return previews
+
+def document_listing_query(user_id, doc_types: List[str], cursor: Optional[str], direction: str, limit: int, preview_chars: Optional[int] = None):
+    """
+    跨类型文档列表：三张文档表 UNION ALL 后按 (updated_at, id) 倒序游标分页
+    每个分支先各自带游标条件取 limit + 1 行（走 *_documents_user_keyset 索引），外层再合并截取
+    preview_chars 不为空时每个分支连接当前版本，返回预览列
+    """
+    branches = []
+    for doc_type in doc_types:
+        doc_model, version_model = get_document_model(doc_type)
+        branch = select(
+            literal(doc_type, String).label("type"),
+            doc_model.id,
+            doc_model.user_id,
+            doc_model.title,
+            doc_model.current_version_id,
+            doc_model.created_at,
+            doc_model.updated_at
+        ).where(
+            doc_model.user_id == user_id,
+            doc_model.deleted_at == None
+        )
+        if preview_chars is not None:
+            branch = with_current_version_preview(branch, doc_model, version_model, preview_chars)
+        branches.append(apply_keyset(branch, doc_model.updated_at, doc_model.id, cursor, direction, descending=True, limit=limit))
+    listing = union_all(*branches).subquery("documents")
+    return apply_keyset(select(listing), listing.c.updated_at, listing.c.id, cursor, direction, descending=True, limit=limit)
+
+def document_search_query(user_id, doc_types: List[str], q: str, limit: int):
+    """
+    当前版本全文检索：每种类型按 content_tsv @@ websearch_to_tsquery 走 GIN 索引取前 limit 条，
+    UNION ALL 后按 ts_rank_cd 排序
+    """
+    ts_query = func.websearch_to_tsquery(search_config(), q)
+    branches = []
+    for doc_type in doc_types:
+        doc_model, version_model = get_document_model(doc_type)
+        rank = func.ts_rank_cd(doc_model.content_tsv, ts_query)
+        branches.append(select(
+            literal(doc_type, String).label("type"),
+            doc_model.id,
+            doc_model.title,
+            doc_model.current_version_id,
+            doc_model.updated_at,
+            rank.label("rank")
+        ).where(
+            doc_model.user_id == user_id,
+            doc_model.deleted_at == None,
+            doc_model.content_tsv.bool_op("@@")(ts_query)
+        ).order_by(rank.desc()).limit(limit))
+    results = union_all(*branches).subquery("results")
+    return select(results).order_by(results.c.rank.desc(), results.c.updated_at.desc()).limit(limit)
+
+async def load_search_snippets(db: AsyncSession, rows, q: str) -> Dict:
+    """只为返回的结果还原当前版本内容并生成命中片段，返回 {当前版本 id: (版本号, 片段)}"""
+    versions = {}
+    for doc_type in DOC_TYPES:
+        version_ids = [row.current_version_id for row in rows if row.type == doc_type and row.current_version_id]
+        if not version_ids:
+            continue
+        _, version_model = get_document_model(doc_type)
+        result = await db.execute(select(version_model).where(version_model.id.in_(version_ids)))
+        type_versions = result.scalars().all()
+        contents = await load_contents(db, version_model, type_versions)
+        # 去掉内容中本身出现的标记字符，避免伪造 <mark>
+        versions.update({
+            version.id: (version.version_number, contents[version.id].replace(SEARCH_MARK_START, "").replace(SEARCH_MARK_STOP, ""))
+            for version in type_versions
+        })
+    if not versions:
+        return {}
+
+    # 所有片段在一条语句中生成
+    ts_query = func.websearch_to_tsquery(search_config(), q)
+    version_ids = list(versions)
+    result = await db.execute(select(*[
+        func.ts_headline(search_config(), literal(versions[version_id][1], Text), ts_query, SEARCH_HEADLINE_OPTIONS)
+        for version_id in version_ids
+    ]))
+    snippets = result.first()
+    return {version_id: (versions[version_id][0], render_snippet(snippet)) for version_id, snippet in zip(version_ids, snippets)}
+
+async def load_version_summaries(db: AsyncSession, version_model, doc_id) -> List[DocumentVersionSummaryOut]:
+    """只查询历史索引覆盖的列，不读取堆表中的内容和 TOAST"""
+    result = await db.execute(select(
+        version_model.id,
+        version_model.version_number,
+        version_model.content_format,
+        version_model.created_at,
+        version_model.checksum_sha256,
+        version_model.byte_length
+    ).where(
+        version_model.document_id == doc_id,
+        version_model.deleted_at == None
+    ).order_by(version_model.created_at.desc()))
+    return [DocumentVersionSummaryOut(
+        id=str(row.id),
+        version_number=row.version_number,
+        content_format=row.content_format,
+        created_at=row.created_at,
+        checksum_sha256=row.checksum_sha256,
+        byte_length=row.byte_length
+    ) for row in result.all()]
+
+# 条件请求
+# 文档与版本列表可变，需每次校验；ETag 由当前版本与版本号计数器生成，新增版本、回退都会改变
+DOCUMENT_CACHE_CONTROL = "private, no-cache"
+
+def document_etag(document, fields: str) -> str:
+    """文档详情 / 版本列表的强 ETag"""
+    state = f"{document.id}:{document.current_version_id}:{document.next_version_number}:{document.updated_at.isoformat()}:{fields}"
+    return f'"{calculate_checksum(state)[:32]}"'
+
+def version_etag(version) -> str:
+    """版本详情的强 ETag：版本不可变，直接使用内容校验和"""
+    return f'"{version.checksum_sha256 or version.id}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中（弱比较，支持列表与 *）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def cached_document_bytes(value) -> int:
+    """文档缓存条目的估算内存占用：版本内容为主，元数据按每个版本固定开销估算"""
+    if isinstance(value, DocumentOut):
+        return 512 + sum(sys.getsizeof(getattr(version, "content", "")) + 256 for version in value.versions)
+    return 256 + sys.getsizeof(value.get("content") or "")
+
+# 文档详情读取缓存，只在归属校验通过后读取（条目数与估算总字节数双重限制）：
+# - 响应体：键为 (doc_type, doc_id, ETag)，与 ETag 取自同一组字段（当前版本、版本号计数器、updated_at、fields），文档任何变化都会换键
+# - 当前版本内容（补丁基准）：键为 (doc_type, doc_id, version_id)，值为 {"content": 内容}；新增版本、回退、删除时显式失效
+document_cache = TTLCache(
+    "documents",
+    maxsize=settings.document_cache_size,
+    ttl=settings.document_cache_ttl_seconds,
+    maxbytes=settings.document_cache_max_bytes,
+    sizeof=cached_document_bytes
+)
+
+# 版本对比结果：键为 (from 校验和, to 校验和, granularity, context)，版本不可变，无需失效
+diff_cache = TTLCache(
+    "document_diffs",
+    maxsize=settings.document_diff_cache_size,
+    ttl=settings.document_diff_cache_ttl_seconds
+)
+
+def invalidate_document_cache(doc_type: str, doc_id, *version_ids):
+    """失效文档在指定当前版本下的缓存条目"""
+    for version_id in version_ids:
+        if version_id is not None:
+            document_cache.invalidate((doc_type, str(doc_id), str(version_id)))
+
+# 异步版本创建队列（由 main.py 在启动/关闭时 start/stop）
+version_queue = AsyncQueueService(
+    SessionLocal,
+    get_document_model,
+    workers=settings.document_job_workers,
+    coalesce_window=settings.document_job_coalesce_seconds,
+    lease_seconds=settings.document_job_lease_seconds
+)
 
 doc_router = APIRouter(prefix="/documents", tags=["Documents"])
 
+# 注意：固定路径的路由需注册在 /{doc_type}/{doc_id} 之前
+@doc_router.get("/jobs/{job_id}", response_model=DocumentVersionJobOut)
+async def get_version_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """查询异步版本创建任务状态"""
+    try:
+        try:
+            job_uuid = uuid.UUID(job_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        result = await db.execute(select(DocumentVersionJob).where(
+            DocumentVersionJob.id == job_uuid,
+            DocumentVersionJob.user_id == current_user.id
+        ))
+        job = result.scalars().first()
+        
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        return DocumentVersionJobOut(
+            id=str(job.id),
+            doc_type=job.doc_type,
+            document_id=str(job.document_id),
+            status=job.status,
+            version_id=str(job.version_id) if job.version_id else None,
+            version_number=job.version_number,
+            superseded_by=str(job.superseded_by) if job.superseded_by else None,
+            error=job.error,
+            created_at=job.created_at,
+            updated_at=job.updated_at
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Get job failed: {str(e)}")
+
+@doc_router.get("/", response_model=List[DocumentOut])
+async def list_all_documents(
+    response: Response,
+    doc_types: Optional[List[str]] = Query(None, alias="type", description="Filter by document type (repeatable)"),
+    limit: int = Query(50, ge=1, le=100, description="Number of documents to return"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor / X-Prev-Cursor"),
+    direction: str = Query("next", pattern="^(next|prev)$", description="Page direction relative to cursor"),
+    include: Optional[str] = Query(None, pattern="^current_version_preview$", description="current_version_preview: join each document's current version preview"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """获取用户的全部类型文档（按 updated_at, id 倒序，支持游标分页），单次查询完成"""
+    try:
+        selected = select_doc_types(doc_types)
+        preview_chars = settings.document_preview_chars if include else None
+        query = document_listing_query(current_user.id, selected, cursor, direction, limit, preview_chars)
+        rows = (await db.execute(query)).all()
+        rows = finalize_keyset_page(rows, "updated_at", cursor, direction, limit, response)
+        previews = await load_current_version_previews(db, [(row.type, row) for row in rows], preview_chars) if include else {}
+        
+        return [DocumentOut(
+            id=str(row.id),
+            user_id=str(row.user_id),
+            type=row.type,
+            title=row.title,
+            current_version_id=str(row.current_version_id) if row.current_version_id else None,
+            created_at=row.created_at,
+            updated_at=row.updated_at,
+            versions=[],
+            current_version_preview=previews.get(row.current_version_id)
+        ) for row in rows]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"List documents failed: {str(e)}")
+
+@doc_router.get("/search", response_model=List[DocumentSearchResultOut])
+async def search_documents(
+    q: str = Query(..., min_length=1, max_length=200, description="Search terms (web search syntax: quotes, OR, -)"),
+    doc_types: Optional[List[str]] = Query(None, alias="type", description="Filter by document type (repeatable)"),
+    limit: int = Query(20, ge=1, le=50, description="Number of results to return"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """全文检索用户全部类型文档的当前版本，按相关度排序并返回高亮片段"""
+    try:
+        selected = select_doc_types(doc_types)
+        rows = (await db.execute(document_search_query(current_user.id, selected, q, limit))).all()
+        snippets = await load_search_snippets(db, rows, q)
+        
+        return [DocumentSearchResultOut(
+            id=str(row.id),
+            type=row.type,
+            title=row.title,
+            current_version_id=str(row.current_version_id) if row.current_version_id else None,
+            version_number=snippets[row.current_version_id][0] if row.current_version_id in snippets else None,
+            updated_at=row.updated_at,
+            rank=row.rank,
+            snippet=snippets[row.current_version_id][1] if row.current_version_id in snippets else ""
+        ) for row in rows]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search documents failed: {str(e)}")
+
+@doc_router.get("/export")
+async def export_documents(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|zip)$", description="Archive format"),
+    versions: str = Query("current", pattern="^(current|all)$", description="current: current version only; all: every version"),
+    doc_types: Optional[List[str]] = Query(None, alias="type", description="Filter by document type (repeatable)"),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """流式导出用户的全部文档（NDJSON 或 zip），服务端游标分批读取，内存占用与归档大小无关"""
+    try:
+        models = [(doc_type, *get_document_model(doc_type)) for doc_type in select_doc_types(doc_types)]
+        writer = export_zip if export_format == "zip" else export_ndjson
+        return StreamingResponse(
+            writer(current_user.id, models, versions),
+            media_type="application/zip" if export_format == "zip" else "application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{export_filename(export_format)}"'}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Export documents failed: {str(e)}")
+
+@doc_router.post("/import", response_model=DocumentImportOut)
+async def import_archive(
+    file: UploadFile = File(..., description="NDJSON or zip archive in the GET /documents/export format"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """批量导入 NDJSON 或 zip 归档（格式与导出相同），逐行校验并用 COPY 分批写入，出错的行在 errors 中返回"""
+    try:
+        if zipfile.is_zipfile(file.file):
+            file.file.seek(0)
+            try:
+                archive = zipfile.ZipFile(file.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail="Invalid zip archive")
+            records = read_zip(archive)
+        else:
+            file.file.seek(0)
+            records = read_ndjson(file.file)
+        result = await import_documents(db, records, current_user.id, get_document_model)
+        
+        return DocumentImportOut(
+            imported_documents=len(result["documents"]),
+            imported_versions=result["imported_versions"],
+            documents=[ImportedDocumentOut(**document) for document in result["documents"]],
+            errors=[DocumentImportErrorOut(**error) for error in result["errors"]]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Import documents failed: {str(e)}")
+
 @doc_router.post("/upload", response_model=DocumentOut)
 async def upload_document(
     doc_type: str = Form(...),
     title: str = Form(...),
     content: str = Form(...),
     content_format: str = Form("markdown"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
     """上传新文档"""
@@ -114,25 +603,12 @@ async def upload_document(
             title=title
         )
         db.add(document)
-        db.flush()
+        await db.flush()
         
-        # 创建第一个版本
-        checksum = calculate_checksum(content)
-        version = version_model(
-            document_id=document.id,
-            version_number=1,
-            content=content,
-            content_format=content_format,
-            created_by=current_user.id,
-            checksum_sha256=checksum
-        )
-        db.add(version)
-        db.flush()
-        
-        # 设置当前版本
-        document.current_version_id = version.id
-        db.commit()
-        db.refresh(document)
+        # 创建第一个版本并设置为当前版本
+        version, _ = await append_version(db, doc_model, version_model, document, content, content_format, current_user.id)
+        await db.commit()
+        await db.refresh(document)
         
         return DocumentOut(
             id=str(document.id),
@@ -145,18 +621,20 @@ async def upload_document(
             versions=[DocumentVersionOut(
                 id=str(version.id),
                 version_number=version.version_number,
-                content=version.content,
+                content=content,
                 content_format=version.content_format,
                 created_at=version.created_at,
-                checksum_sha256=version.checksum_sha256
+                checksum_sha256=version.checksum_sha256,
+                byte_length=version.byte_length
             )]
         )
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # 检查是否是UUID格式错误
-        if "invalid input syntax for type uuid" in str(e).lower():
+        error_str = str(e).lower()
+        if "invalid input syntax for type uuid" in error_str or "invalid uuid" in error_str:
             raise HTTPException(status_code=404, detail="Document not found")
         else:
             raise HTTPException(status_code=500, detail="Internal server error")
@@ -165,52 +643,58 @@ async def upload_document(
 async def add_version(
     doc_type: str,
     doc_id: str,
+    response: Response,
     content: str = Form(...),
     content_format: str = Form("markdown"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
-    """添加新版本"""
+    """添加新版本（内容与当前版本相同时不新建版本）"""
     try:
         doc_model, version_model = get_document_model(doc_type)
         if not doc_model:
             raise HTTPException(status_code=400, detail="Invalid document type")
         
         # 查找文档
-        document = db.query(doc_model).filter(
+        result = await db.execute(select(doc_model).where(
             doc_model.id == doc_id,
             doc_model.user_id == current_user.id,
             doc_model.deleted_at == None
-        ).first()
+        ))
+        document = result.scalars().first()
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # 获取最新版本号
-        last_version = db.query(version_model).filter(
-            version_model.document_id == doc_id,
-            version_model.deleted_at == None
-        ).order_by(version_model.version_number.desc()).first()
-        
-        new_version_number = (last_version.version_number if last_version else 0) + 1
+        # 创建新版本（内容按校验和去重存储，版本号与插入在同一语句中分配）
+        previous_version_id = document.current_version_id
+        version, created = await append_version(db, doc_model, version_model, document, content, content_format, current_user.id)
         
-        # 创建新版本
-        checksum = calculate_checksum(content)
-        version = version_model(
-            document_id=doc_id,
-            version_number=new_version_number,
-            content=content,
-            content_format=content_format,
-            created_by=current_user.id,
-            checksum_sha256=checksum
-        )
-        db.add(version)
-        db.flush()
+        if not created:
+            # 内容未变化（如自动保存）：不新建版本，返回当前版本号
+            response.headers["X-Version-Unchanged"] = str(version.version_number)
+            return DocumentOut(
+                id=str(document.id),
+                user_id=str(document.user_id),
+                type=doc_type,
+                title=document.title,
+                current_version_id=str(document.current_version_id),
+                created_at=document.created_at,
+                updated_at=document.updated_at,
+                versions=[DocumentVersionOut(
+                    id=str(version.id),
+                    version_number=version.version_number,
+                    content=content,
+                    content_format=version.content_format,
+                    created_at=version.created_at,
+                    checksum_sha256=version.checksum_sha256,
+                    byte_length=version.byte_length
+                )]
+            )
         
-        # 更新当前版本
-        document.current_version_id = version.id
-        db.commit()
-        db.refresh(document)
+        await db.commit()
+        invalidate_document_cache(doc_type, document.id, previous_version_id)
+        await db.refresh(document)
         
         return DocumentOut(
             id=str(document.id),
@@ -225,38 +709,163 @@ async def add_version(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Add version failed: {str(e)}")
 
+@doc_router.post("/{doc_type}/{doc_id}/versions/patch", response_model=DocumentOut)
+async def patch_version(
+    doc_type: str,
+    doc_id: str,
+    patch_request: DocumentPatchRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """以补丁方式添加新版本：补丁相对 base_version_number 应用，基准不是当前版本时返回 409"""
+    try:
+        models = get_document_model(doc_type)
+        if not models:
+            raise HTTPException(status_code=400, detail="Invalid document type")
+        doc_model, version_model = models
+        
+        # 锁定文档行，并发补丁按顺序校验基准版本
+        result = await db.execute(select(doc_model).where(
+            doc_model.id == doc_id,
+            doc_model.user_id == current_user.id,
+            doc_model.deleted_at == None
+        ).with_for_update())
+        document = result.scalars().first()
+        
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        result = await db.execute(select(version_model).where(version_model.id == document.current_version_id))
+        base = result.scalars().first()
+        
+        if base is None or base.version_number != patch_request.base_version_number:
+            current_number = str(base.version_number) if base is not None else ""
+            raise HTTPException(
+                status_code=409,
+                detail="Base version is not the current version",
+                headers={"X-Current-Version": current_number}
+            )
+        
+        # 基准内容优先取读取缓存
+        cache_key = (doc_type, str(document.id), str(document.current_version_id))
+        cached = document_cache.get(cache_key)
+        base_content = cached.get("content") if cached else None
+        if base_content is None:
+            base_content = (await load_contents(db, version_model, [base]))[base.id]
+        
+        try:
+            content = apply_patch(base_content, patch_request.patch)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid patch: {str(e)}")
+        
+        checksum = patch_checksum(content, base.checksum_sha256, appended_text(base_content, patch_request.patch))
+        version, created = await append_version(
+            db, doc_model, version_model, document, content,
+            patch_request.content_format or base.content_format, current_user.id, checksum
+        )
+        
+        await db.commit()
+        if not created:
+            response.headers["X-Version-Unchanged"] = str(version.version_number)
+        else:
+            invalidate_document_cache(doc_type, document.id, base.id)
+            # 缓存新版本内容，作为下一次补丁的基准
+            document_cache.set((doc_type, str(document.id), str(version.id)), {"content": content})
+        await db.refresh(document)
+        
+        return DocumentOut(
+            id=str(document.id),
+            user_id=str(document.user_id),
+            type=doc_type,
+            title=document.title,
+            current_version_id=str(document.current_version_id),
+            created_at=document.created_at,
+            updated_at=document.updated_at,
+            versions=[DocumentVersionSummaryOut(
+                id=str(version.id),
+                version_number=version.version_number,
+                content_format=version.content_format,
+                created_at=version.created_at,
+                checksum_sha256=version.checksum_sha256,
+                byte_length=version.byte_length
+            )]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        error_str = str(e).lower()
+        if "invalid input syntax for type uuid" in error_str or "invalid uuid" in error_str:
+            raise HTTPException(status_code=404, detail="Document not found")
+        raise HTTPException(status_code=500, detail=f"Patch version failed: {str(e)}")
+
 @doc_router.get("/{doc_type}/{doc_id}", response_model=DocumentOut)
 async def get_document(
     doc_type: str,
     doc_id: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    fields: str = Query("full", pattern="^(full|summary)$", description="summary: version metadata only, without content"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
-    """获取文档详情"""
+    """获取文档详情（支持 If-None-Match 条件请求）"""
     try:
         doc_model, version_model = get_document_model(doc_type)
         if not doc_model:
             raise HTTPException(status_code=400, detail="Invalid document type")
         
-        document = db.query(doc_model).filter(
+        result = await db.execute(select(doc_model).where(
             doc_model.id == doc_id,
             doc_model.user_id == current_user.id,
             doc_model.deleted_at == None
-        ).first()
+        ))
+        document = result.scalars().first()
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
+        # 客户端已有最新结果时直接返回 304，不加载版本
+        etag = document_etag(document, fields)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, DOCUMENT_CACHE_CONTROL)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = DOCUMENT_CACHE_CONTROL
+        
+        # ETag 未变化时直接返回缓存的结果，不再扫描版本
+        cache_key = (doc_type, str(document.id), etag)
+        cached = document_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # fields=summary：只返回版本元数据
+        if fields == "summary":
+            document_out = DocumentOut(
+                id=str(document.id),
+                user_id=str(document.user_id),
+                type=doc_type,
+                title=document.title,
+                current_version_id=str(document.current_version_id) if document.current_version_id else None,
+                created_at=document.created_at,
+                updated_at=document.updated_at,
+                versions=await load_version_summaries(db, version_model, document.id)
+            )
+            document_cache.set(cache_key, document_out)
+            return document_out
+        
         # 获取所有版本
-        versions = db.query(version_model).filter(
+        result = await db.execute(select(version_model).where(
             version_model.document_id == doc_id,
             version_model.deleted_at == None
-        ).order_by(version_model.created_at.desc()).all()
+        ).order_by(version_model.created_at.desc()))
+        versions = result.scalars().all()
+        contents = await load_contents(db, version_model, versions)
         
-        return DocumentOut(
+        document_out = DocumentOut(
             id=str(document.id),
             user_id=str(document.user_id),
             type=doc_type,
@@ -267,17 +876,26 @@ async def get_document(
             versions=[DocumentVersionOut(
                 id=str(v.id),
                 version_number=v.version_number,
-                content=v.content,
+                content=contents[v.id],
                 content_format=v.content_format,
                 created_at=v.created_at,
-                checksum_sha256=v.checksum_sha256
+                checksum_sha256=v.checksum_sha256,
+                byte_length=v.byte_length
             ) for v in versions]
         )
+        document_cache.set(cache_key, document_out)
+        if document.current_version_id in contents:
+            document_cache.set(
+                (doc_type, str(document.id), str(document.current_version_id)),
+                {"content": contents[document.current_version_id]}
+            )
+        return document_out
     except HTTPException:
         raise
     except Exception as e:
         # 检查是否是UUID格式错误
-        if "invalid input syntax for type uuid" in str(e).lower():
+        error_str = str(e).lower()
+        if "invalid input syntax for type uuid" in error_str or "invalid uuid" in error_str:
             raise HTTPException(status_code=404, detail="Document not found")
         else:
             raise HTTPException(status_code=500, detail="Internal server error")
@@ -287,7 +905,7 @@ async def revert_document(
     doc_type: str,
     doc_id: str,
     revert_request: VersionRevertRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
     """回退到指定版本"""
@@ -297,29 +915,35 @@ async def revert_document(
             raise HTTPException(status_code=400, detail="Invalid document type")
         
         # 查找文档
-        document = db.query(doc_model).filter(
+        result = await db.execute(select(doc_model).where(
             doc_model.id == doc_id,
             doc_model.user_id == current_user.id,
             doc_model.deleted_at == None
-        ).first()
+        ))
+        document = result.scalars().first()
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
         # 查找指定版本
-        version = db.query(version_model).filter(
+        result = await db.execute(select(version_model).where(
             version_model.document_id == doc_id,
             version_model.version_number == revert_request.version_number,
             version_model.deleted_at == None
-        ).first()
+        ))
+        version = result.scalars().first()
         
         if not version:
             raise HTTPException(status_code=404, detail="Version not found")
         
-        # 回退到指定版本
+        # 回退到指定版本并更新检索向量；目标版本此前作为当前版本时缓存的结果不含之后的版本，一并失效
+        contents = await load_contents(db, version_model, [version])
+        previous_version_id = document.current_version_id
         document.current_version_id = version.id
-        db.commit()
-        db.refresh(document)
+        document.content_tsv = search_vector(contents[version.id])
+        await db.commit()
+        invalidate_document_cache(doc_type, document.id, previous_version_id, version.id)
+        await db.refresh(document)
         
         return DocumentOut(
             id=str(document.id),
@@ -334,45 +958,184 @@ async def revert_document(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Revert document failed: {str(e)}")
 
-@doc_router.get("/{doc_type}/{doc_id}/versions", response_model=List[DocumentVersionOut])
+@doc_router.post("/{doc_type}/{doc_id}/clone", response_model=DocumentOut)
+async def clone_document(
+    doc_type: str,
+    doc_id: str,
+    clone_request: Optional[DocumentCloneRequest] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """复制文档：新文档的第一个版本与源版本共享内容 blob，不复制内容"""
+    try:
+        models = get_document_model(doc_type)
+        if not models:
+            raise HTTPException(status_code=400, detail="Invalid document type")
+        doc_model, version_model = models
+        clone_request = clone_request or DocumentCloneRequest()
+        
+        # 查找源文档
+        result = await db.execute(select(doc_model).where(
+            doc_model.id == doc_id,
+            doc_model.user_id == current_user.id,
+            doc_model.deleted_at == None
+        ))
+        source = result.scalars().first()
+        
+        if not source:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        # 查找源版本（默认当前版本）
+        query = select(version_model).where(version_model.document_id == source.id, version_model.deleted_at == None)
+        if clone_request.version_number is not None:
+            query = query.where(version_model.version_number == clone_request.version_number)
+        else:
+            query = query.where(version_model.id == source.current_version_id)
+        result = await db.execute(query)
+        source_version = result.scalars().first()
+        
+        if not source_version:
+            raise HTTPException(status_code=404, detail="Version not found")
+        
+        # 创建新文档，第一个版本指向源版本的 blob
+        document = doc_model(
+            user_id=current_user.id,
+            title=clone_request.title if clone_request.title is not None else source.title
+        )
+        db.add(document)
+        await db.flush()
+        
+        version = await clone_version(db, doc_model, version_model, source, source_version, document.id, current_user.id)
+        await db.commit()
+        await db.refresh(document)
+        
+        return DocumentOut(
+            id=str(document.id),
+            user_id=str(document.user_id),
+            type=doc_type,
+            title=document.title,
+            current_version_id=str(document.current_version_id),
+            created_at=document.created_at,
+            updated_at=document.updated_at,
+            versions=[DocumentVersionSummaryOut(
+                id=str(version.id),
+                version_number=version.version_number,
+                content_format=version.content_format,
+                created_at=version.created_at,
+                checksum_sha256=version.checksum_sha256,
+                byte_length=version.byte_length
+            )]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        error_str = str(e).lower()
+        if "invalid input syntax for type uuid" in error_str or "invalid uuid" in error_str:
+            raise HTTPException(status_code=404, detail="Document not found")
+        raise HTTPException(status_code=500, detail=f"Clone document failed: {str(e)}")
+
+@doc_router.delete("/{doc_type}/{doc_id}")
+async def delete_document(
+    doc_type: str,
+    doc_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """删除文档（软删除）"""
+    try:
+        models = get_document_model(doc_type)
+        if not models:
+            raise HTTPException(status_code=400, detail="Invalid document type")
+        doc_model, version_model = models
+        
+        try:
+            doc_uuid = uuid.UUID(doc_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        # 校验归属与标记删除一条 UPDATE ... RETURNING 完成
+        result = await db.execute(
+            update(doc_model)
+            .where(
+                doc_model.id == doc_uuid,
+                doc_model.user_id == current_user.id,
+                doc_model.deleted_at == None
+            )
+            .values(deleted_at=func.now())
+            .returning(doc_model.current_version_id)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = result.first()
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        await db.commit()
+        invalidate_document_cache(doc_type, doc_uuid, deleted.current_version_id)
+        
+        return {"message": "Document deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Delete document failed: {str(e)}")
+
+@doc_router.get("/{doc_type}/{doc_id}/versions", response_model=Union[List[DocumentVersionOut], List[DocumentVersionSummaryOut]])
 async def list_versions(
     doc_type: str,
     doc_id: str,
-    db: Session = Depends(get_db),
+    response: Response,
+    fields: str = Query("full", pattern="^(full|summary)$", description="summary: version metadata only, without content"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
-    """获取文档版本历史"""
+    """获取文档版本历史（支持 If-None-Match 条件请求）"""
     try:
         doc_model, version_model = get_document_model(doc_type)
         if not doc_model:
             raise HTTPException(status_code=400, detail="Invalid document type")
         
         # 验证文档存在且属于当前用户
-        document = db.query(doc_model).filter(
+        result = await db.execute(select(doc_model).where(
             doc_model.id == doc_id,
             doc_model.user_id == current_user.id,
             doc_model.deleted_at == None
-        ).first()
+        ))
+        document = result.scalars().first()
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
+        etag = document_etag(document, f"versions:{fields}")
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, DOCUMENT_CACHE_CONTROL)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = DOCUMENT_CACHE_CONTROL
+        
+        # fields=summary：只返回版本元数据
+        if fields == "summary":
+            return await load_version_summaries(db, version_model, document.id)
+        
         # 获取版本历史
-        versions = db.query(version_model).filter(
+        result = await db.execute(select(version_model).where(
             version_model.document_id == doc_id,
             version_model.deleted_at == None
-        ).order_by(version_model.created_at.desc()).all()
+        ).order_by(version_model.created_at.desc()))
+        versions = result.scalars().all()
+        contents = await load_contents(db, version_model, versions)
         
         return [DocumentVersionOut(
             id=str(v.id),
             version_number=v.version_number,
-            content=v.content,
+            content=contents[v.id],
             content_format=v.content_format,
             created_at=v.created_at,
-            checksum_sha256=v.checksum_sha256
+            checksum_sha256=v.checksum_sha256,
+            byte_length=v.byte_length
         ) for v in versions]
     except HTTPException:
         raise
@@ -384,64 +1147,154 @@ async def get_version(
     doc_type: str,
     doc_id: str,
     version_number: int,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
-    """获取指定版本详情"""
+    """获取指定版本详情（版本不可变，可长期缓存）"""
     try:
         doc_model, version_model = get_document_model(doc_type)
         if not doc_model:
             raise HTTPException(status_code=400, detail="Invalid document type")
         
         # 验证文档存在且属于当前用户
-        document = db.query(doc_model).filter(
+        result = await db.execute(select(doc_model).where(
             doc_model.id == doc_id,
             doc_model.user_id == current_user.id,
             doc_model.deleted_at == None
-        ).first()
+        ))
+        document = result.scalars().first()
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
         # 获取指定版本
-        version = db.query(version_model).filter(
+        result = await db.execute(select(version_model).where(
             version_model.document_id == doc_id,
             version_model.version_number == version_number,
             version_model.deleted_at == None
-        ).first()
+        ))
+        version = result.scalars().first()
         
         if not version:
             raise HTTPException(status_code=404, detail="Version not found")
         
+        etag = version_etag(version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, settings.document_version_cache_control)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = settings.document_version_cache_control
+        
+        contents = await load_contents(db, version_model, [version])
+        
         return DocumentVersionOut(
             id=str(version.id),
             version_number=version.version_number,
-            content=version.content,
+            content=contents[version.id],
             content_format=version.content_format,
             created_at=version.created_at,
-            checksum_sha256=version.checksum_sha256
+            checksum_sha256=version.checksum_sha256,
+            byte_length=version.byte_length
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Get version failed: {str(e)}")
 
+@doc_router.get("/{doc_type}/{doc_id}/diff", response_model=DocumentDiffOut)
+async def diff_versions(
+    doc_type: str,
+    doc_id: str,
+    response: Response,
+    from_version: int = Query(..., alias="from", ge=1, description="Base version number"),
+    to_version: int = Query(..., alias="to", ge=1, description="Target version number"),
+    granularity: str = Query("line", pattern="^(line|word)$", description="word: diff replaced lines word by word"),
+    context: int = Query(3, ge=0, le=20, description="Unchanged lines around each hunk"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user_from_cookie)
+):
+    """对比两个版本，返回带上下文的差异块（按两个版本的校验和缓存，可长期缓存）"""
+    try:
+        doc_model, version_model = get_document_model(doc_type)
+        if not doc_model:
+            raise HTTPException(status_code=400, detail="Invalid document type")
+        
+        # 验证文档存在且属于当前用户
+        result = await db.execute(select(doc_model.id).where(
+            doc_model.id == doc_id,
+            doc_model.user_id == current_user.id,
+            doc_model.deleted_at == None
+        ))
+        if result.first() is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        result = await db.execute(select(version_model).where(
+            version_model.document_id == doc_id,
+            version_model.version_number.in_([from_version, to_version]),
+            version_model.deleted_at == None
+        ))
+        versions = {version.version_number: version for version in result.scalars().all()}
+        if from_version not in versions or to_version not in versions:
+            raise HTTPException(status_code=404, detail="Version not found")
+        base, target = versions[from_version], versions[to_version]
+        
+        # 两个版本都不可变，ETag 由双方校验和与对比参数决定
+        diff_key = f"{version_etag(base)}:{version_etag(target)}:{granularity}:{context}"
+        etag = f'"{calculate_checksum(diff_key)}"'
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, settings.document_version_cache_control)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = settings.document_version_cache_control
+        
+        # 旧格式版本可能没有校验和，不缓存
+        cache_key = (base.checksum_sha256, target.checksum_sha256, granularity, context)
+        cacheable = base.checksum_sha256 is not None and target.checksum_sha256 is not None
+        hunks = diff_cache.get(cache_key) if cacheable else None
+        if hunks is None:
+            contents = await load_contents(db, version_model, [base, target])
+            hunks = diff_hunks(contents[base.id], contents[target.id], granularity, context)
+            if cacheable:
+                diff_cache.set(cache_key, hunks)
+        
+        return DocumentDiffOut(
+            from_version=from_version,
+            to_version=to_version,
+            from_checksum=base.checksum_sha256,
+            to_checksum=target.checksum_sha256,
+            granularity=granularity,
+            hunks=[DiffHunkOut(**hunk) for hunk in hunks]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Diff versions failed: {str(e)}")
+
 @doc_router.get("/{doc_type}", response_model=List[DocumentOut])
 async def list_documents(
     doc_type: str,
-    db: Session = Depends(get_db),
+    include: Optional[str] = Query(None, pattern="^current_version_preview$", description="current_version_preview: join each document's current version preview"),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
-    """获取用户的所有文档"""
+    """获取用户的所有文档（include=current_version_preview 时同一查询连接当前版本预览）"""
     try:
         doc_model, version_model = get_document_model(doc_type)
         if not doc_model:
             raise HTTPException(status_code=400, detail="Invalid document type")
         
-        documents = db.query(doc_model).filter(
+        query = select(doc_model).where(
             doc_model.user_id == current_user.id,
             doc_model.deleted_at == None
-        ).order_by(doc_model.updated_at.desc()).all()
+        ).order_by(doc_model.updated_at.desc())
+        if include:
+            query = with_current_version_preview(query, doc_model, version_model, settings.document_preview_chars)
+        rows = (await db.execute(query)).all()
+        documents = [row[0] for row in rows]
+        previews = await load_current_version_previews(
+            db, [(doc_type, row) for row in rows], settings.document_preview_chars
+        ) if include else {}
         
         return [DocumentOut(
             id=str(doc.id),
@@ -451,35 +1304,66 @@ async def list_documents(
             current_version_id=str(doc.current_version_id) if doc.current_version_id else None,
             created_at=doc.created_at,
             updated_at=doc.updated_at,
-            versions=[]
+            versions=[],
+            current_version_preview=previews.get(doc.current_version_id)
         ) for doc in documents]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"List documents failed: {str(e)}")
 
-# 异步队列接口（预留）
-@doc_router.post("/{doc_type}/{doc_id}/versions/async")
+# 异步版本创建
+@doc_router.post("/{doc_type}/{doc_id}/versions/async", response_model=DocumentVersionJobOut, status_code=status.HTTP_202_ACCEPTED)
 async def add_version_async(
     doc_type: str,
     doc_id: str,
     content: str = Form(...),
     content_format: str = Form("markdown"),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user_from_cookie)
 ):
-    """异步添加新版本（预留接口）"""
+    """异步添加新版本：任务入队后立即返回，通过 GET /documents/jobs/{job_id} 查询进度"""
     try:
-        # 验证文档类型
-        doc_model, version_model = get_document_model(doc_type)
-        if not doc_model:
+        models = get_document_model(doc_type)
+        if not models:
             raise HTTPException(status_code=400, detail="Invalid document type")
+        doc_model, version_model = models
+        
+        if len(content) > CONTENT_MAX_CHARS:
+            raise HTTPException(status_code=400, detail=f"Content exceeds {CONTENT_MAX_CHARS} characters")
+        
+        # 验证文档存在且属于当前用户
+        result = await db.execute(select(doc_model.id).where(
+            doc_model.id == doc_id,
+            doc_model.user_id == current_user.id,
+            doc_model.deleted_at == None
+        ))
+        document_id = result.scalar()
+        
+        if not document_id:
+            raise HTTPException(status_code=404, detail="Document not found")
         
         # 将任务加入异步队列
-        await AsyncQueueService.enqueue_version_creation(
+        job = await version_queue.enqueue_version_creation(
+            db,
             doc_type=doc_type,
-            doc_id=doc_id,
+            doc_id=document_id,
             content=content,
-            user_id=str(current_user.id)
+            user_id=current_user.id,
+            content_format=content_format
         )
         
-        return {"status": "queued", "message": "Version creation queued successfully"}
+        return DocumentVersionJobOut(
+            id=str(job.id),
+            doc_type=job.doc_type,
+            document_id=str(job.document_id),
+            status=job.status,
+            created_at=job.created_at,
+            updated_at=job.updated_at
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Queue version creation failed: {str(e)}")
\ No newline at end of file
+        await db.rollback()
+        error_str = str(e).lower()
+        if "invalid input syntax for type uuid" in error_str or "invalid uuid" in error_str:
+            raise HTTPException(status_code=404, detail="Document not found")
+        raise HTTPException(status_code=500, detail=f"Queue version creation failed: {str(e)}")
@@ -0,0 +1,143 @@
+"""
+文档归档导出
+服务端游标按 document_export_fetch_size 分批读取文档与版本行，每批一次还原内容后立即写出，
+内存占用与归档大小无关；支持 NDJSON（每行一条文档或版本记录）与 zip（每个版本一个文件）
+"""
+import json
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Tuple
+
+from sqlalchemy import select, and_
+
+from api.routers import SessionLocal, settings
+from api.documents.version_store import load_contents
+
+# 内容格式（与 *_document_versions.content_format 的 CHECK 约束一致）对应的文件扩展名
+FORMAT_EXTENSIONS = {'markdown': 'md', 'html': 'html', 'plain': 'txt'}
+
+def document_export_query(user_id, doc_model, version_model, versions: str):
+    """文档及其版本（versions=current 只取当前版本），按文档、版本号排序；无版本的文档也返回一行"""
+    if versions == "current":
+        join_on = version_model.id == doc_model.current_version_id
+    else:
+        join_on = and_(version_model.document_id == doc_model.id, version_model.deleted_at == None)
+    return (
+        select(
+            doc_model.id.label("document_id"),
+            doc_model.title,
+            doc_model.current_version_id,
+            doc_model.created_at.label("document_created_at"),
+            doc_model.updated_at.label("document_updated_at"),
+            version_model.id,
+            version_model.version_number,
+            version_model.content_format,
+            version_model.created_at,
+            version_model.checksum_sha256,
+            version_model.byte_length,
+            version_model.content,
+            version_model.diff_from
+        )
+        .outerjoin(version_model, join_on)
+        .where(doc_model.user_id == user_id, doc_model.deleted_at == None)
+        .order_by(doc_model.id, version_model.version_number)
+    )
+
+async def export_rows(user_id, models: Iterable[Tuple[str, object, object]], versions: str) -> AsyncIterator:
+    """逐行产出 (doc_type, row, content)；无版本的文档 content 为 None"""
+    async with SessionLocal() as db:
+        for doc_type, doc_model, version_model in models:
+            query = document_export_query(user_id, doc_model, version_model, versions)
+            result = await db.stream(query.execution_options(yield_per=settings.document_export_fetch_size))
+            async for partition in result.partitions():
+                contents = await load_contents(db, version_model, [row for row in partition if row.id is not None])
+                for row in partition:
+                    yield doc_type, row, contents.get(row.id)
+
+def document_record(doc_type: str, row) -> dict:
+    return {
+        "id": str(row.document_id),
+        "type": doc_type,
+        "title": row.title,
+        "current_version_id": str(row.current_version_id) if row.current_version_id else None,
+        "created_at": row.document_created_at.isoformat(),
+        "updated_at": row.document_updated_at.isoformat()
+    }
+
+def version_record(row) -> dict:
+    return {
+        "id": str(row.id),
+        "version_number": row.version_number,
+        "content_format": row.content_format,
+        "created_at": row.created_at.isoformat(),
+        "checksum_sha256": row.checksum_sha256,
+        "byte_length": row.byte_length
+    }
+
+async def export_ndjson(user_id, models, versions: str) -> AsyncIterator[bytes]:
+    """NDJSON：每个文档一行 record=document，其后每个版本一行 record=version（含 content）"""
+    current = None
+    async for doc_type, row, content in export_rows(user_id, models, versions):
+        lines = []
+        if row.document_id != current:
+            current = row.document_id
+            lines.append({"record": "document", **document_record(doc_type, row)})
+        if row.id is not None:
+            lines.append({"record": "version", "document_id": str(row.document_id), **version_record(row), "content": content})
+        yield "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+
+class _ZipStream:
+    """只写、不可 seek 的缓冲区：zipfile 写入后由调用方取走已生成的字节"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+async def export_zip(user_id, models, versions: str) -> AsyncIterator[bytes]:
+    """
+    zip：每个文档一个目录 {type}/{document_id}/，版本内容为 v{version_number}.{ext}，
+    document.json 在该文档的全部版本之后写入（含版本元数据）
+    """
+    stream = _ZipStream()
+    archive = zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_DEFLATED)
+    document = None
+
+    def write_document():
+        archive.writestr(
+            f"{document['type']}/{document['id']}/document.json",
+            json.dumps(document, ensure_ascii=False, indent=2)
+        )
+
+    async for doc_type, row, content in export_rows(user_id, models, versions):
+        if document is None or document["id"] != str(row.document_id):
+            if document is not None:
+                write_document()
+            document = {**document_record(doc_type, row), "versions": []}
+        if row.id is not None:
+            extension = FORMAT_EXTENSIONS.get(row.content_format, 'txt')
+            info = zipfile.ZipInfo(
+                f"{doc_type}/{row.document_id}/v{row.version_number}.{extension}",
+                date_time=row.created_at.timetuple()[:6]
+            )
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, content)
+            document["versions"].append(version_record(row))
+        yield stream.drain()
+    if document is not None:
+        write_document()
+    archive.close()
+    yield stream.drain()
+
+def export_filename(export_format: str) -> str:
+    return f"documents-{datetime.utcnow():%Y%m%d%H%M%S}.{'zip' if export_format == 'zip' else 'ndjson'}"
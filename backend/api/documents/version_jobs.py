@@ -0,0 +1,229 @@
+"""
+异步版本创建队列
+任务持久化在 document_version_jobs 表中，进程内 asyncio 队列只负责调度；
+同一文档在合并窗口内的多次自动保存只写入最新一次，较早的任务标记为 superseded；
+合并窗口由事件循环定时器计时，窗口结束的文档才进入队列，等待合并的文档不占用工作协程。
+领取任务时记录 claimed_at，多进程部署下只有租约过期的 running 任务才会被重新排队，不会抢走其他存活进程正在处理的任务
+"""
+import asyncio
+import logging
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import select, update, or_
+
+from models.models import DocumentVersionJob
+from api.background import PeriodicTask
+from api.documents.version_store import append_version
+
+logger = logging.getLogger("diftagent")
+
+DocKey = Tuple[str, uuid.UUID]
+
+class AsyncQueueService:
+    """版本创建任务队列：持久化任务表 + 工作协程池，按文档合并待写入的自动保存"""
+
+    def __init__(self, session_factory, get_document_model: Callable, workers: int = 4, coalesce_window: float = 2.0, lease_seconds: float = 300):
+        self.session_factory = session_factory
+        self.get_document_model = get_document_model
+        self.workers = workers
+        self.coalesce_window = coalesce_window
+        self.lease_seconds = lease_seconds
+        # 定期回收其他进程退出后遗留的任务
+        self._recovery = PeriodicTask("document-version-job-recovery", lease_seconds, self.recover)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        # 已调度（合并窗口中或已在队列中）等待处理的文档，避免重复调度
+        self._scheduled = set()
+        # 合并窗口中的文档的定时器，窗口结束时放入队列
+        self._timers: Dict[DocKey, asyncio.TimerHandle] = {}
+        # 同一文档的任务串行执行，保证最后写入的是最新内容
+        self._locks: Dict[DocKey, asyncio.Lock] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"document-version-worker-{i}")
+            for i in range(self.workers)
+        ]
+        # 上次退出时未完成的任务重新排队
+        pending = await self.recover(all_queued=True)
+        self._recovery.start()
+        logger.info(f"Document version queue started with {self.workers} workers, {pending} documents pending")
+
+    async def recover(self, all_queued: bool = False) -> int:
+        """
+        将租约过期的 running 任务重新排队，并调度有待处理任务的文档，返回调度的文档数
+        周期回收只调度租约期之前创建的 queued 任务（较新的任务仍由写入它们的进程调度）；启动时 all_queued=True 调度全部
+        """
+        job = DocumentVersionJob
+        expired = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(job)
+                .where(job.status == "running", or_(job.claimed_at == None, job.claimed_at < expired))
+                .values(status="queued", claimed_at=None)
+                .returning(job.id)
+                .execution_options(synchronize_session=False)
+            )
+            requeued = len(result.all())
+            query = select(job.doc_type, job.document_id).where(job.status == "queued")
+            if not all_queued:
+                query = query.where(job.created_at < expired)
+            pending = (await db.execute(query.distinct())).all()
+            await db.commit()
+        if requeued:
+            logger.warning(f"Requeued {requeued} document version jobs with expired leases")
+        for doc_type, document_id in pending:
+            self.schedule(doc_type, document_id, delay=0)
+        return len(pending)
+
+    async def stop(self):
+        """停止工作协程；未处理的任务保留在任务表中，下次启动（或其他进程在租约过期后）继续"""
+        await self._recovery.stop()
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._scheduled.clear()
+        logger.info("Document version queue stopped")
+
+    def schedule(self, doc_type: str, document_id: uuid.UUID, delay: Optional[float] = None):
+        """调度文档在合并窗口结束后处理（delay=0 立即放入队列）"""
+        key = (doc_type, document_id)
+        if self._queue is None or key in self._scheduled:
+            return
+        self._scheduled.add(key)
+        delay = self.coalesce_window if delay is None else delay
+        if delay > 0:
+            self._timers[key] = asyncio.get_running_loop().call_later(delay, self._ready, key)
+        else:
+            self._queue.put_nowait(key)
+
+    def _ready(self, key: DocKey):
+        self._timers.pop(key, None)
+        self._queue.put_nowait(key)
+
+    async def enqueue_version_creation(self, db, doc_type: str, doc_id: uuid.UUID, content: str, user_id: uuid.UUID, content_format: str = "markdown") -> DocumentVersionJob:
+        """写入任务表并调度处理，返回任务"""
+        job = DocumentVersionJob(
+            doc_type=doc_type,
+            document_id=doc_id,
+            user_id=user_id,
+            content=content,
+            content_format=content_format
+        )
+        db.add(job)
+        await db.commit()
+        self.schedule(doc_type, doc_id)
+        return job
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            # 从这里开始到达的任务会重新调度
+            self._scheduled.discard(key)
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            try:
+                async with lock:
+                    await self.process_version_creation(*key)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error(f"Processing version jobs for {key} failed: {traceback.format_exc()}")
+            finally:
+                if not lock.locked() and key not in self._scheduled:
+                    self._locks.pop(key, None)
+
+    async def _claim_latest(self, doc_type: str, doc_id: uuid.UUID):
+        """领取文档最新的待处理任务，同时将更早的待处理任务标记为 superseded"""
+        job = DocumentVersionJob
+        async with self.session_factory() as db:
+            latest = (
+                select(job.id)
+                .where(job.doc_type == doc_type, job.document_id == doc_id, job.status == "queued")
+                .order_by(job.created_at.desc(), job.id.desc())
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(job)
+                .where(job.id == latest)
+                .values(status="running", claimed_at=datetime.utcnow())
+                .returning(job.id, job.user_id, job.content, job.content_format, job.created_at)
+                .execution_options(synchronize_session=False)
+            )
+            claimed = result.first()
+            if claimed is not None:
+                await db.execute(
+                    update(job)
+                    .where(
+                        job.doc_type == doc_type,
+                        job.document_id == doc_id,
+                        job.status == "queued",
+                        job.created_at <= claimed.created_at
+                    )
+                    .values(status="superseded", superseded_by=claimed.id, content=None)
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+            return claimed
+
+    async def process_version_creation(self, doc_type: str, doc_id: uuid.UUID):
+        """处理文档最新的待处理任务：创建版本并在同一事务中记录任务结果"""
+        claimed = await self._claim_latest(doc_type, doc_id)
+        if claimed is None:
+            return
+        doc_model, version_model = self.get_document_model(doc_type)
+        job = DocumentVersionJob
+        async with self.session_factory() as db:
+            try:
+                result = await db.execute(select(doc_model).where(
+                    doc_model.id == doc_id,
+                    doc_model.user_id == claimed.user_id,
+                    doc_model.deleted_at == None
+                ))
+                document = result.scalars().first()
+                if not document:
+                    await self._fail(db, claimed.id, "Document not found")
+                    return
+                version, _ = await append_version(
+                    db, doc_model, version_model, document, claimed.content, claimed.content_format, claimed.user_id
+                )
+                await db.execute(
+                    update(job)
+                    .where(job.id == claimed.id)
+                    .values(status="succeeded", version_id=version.id, version_number=version.version_number, content=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                await self._fail(db, claimed.id, str(e))
+                raise
+
+    async def _fail(self, db, job_id: uuid.UUID, error: str):
+        """将任务标记为 failed 并提交"""
+        await db.execute(
+            update(DocumentVersionJob)
+            .where(DocumentVersionJob.id == job_id)
+            .values(status="failed", error=error, content=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
@@ -0,0 +1,311 @@
+"""
+文档版本存储
+版本内容按 SHA-256 存入内容寻址的 document_blobs 表，跨版本、跨文档共享，版本行只保存 checksum_sha256 指针。
+blob 以“快照 + 行级差分链”保存：diff_from 为空的 blob 存完整内容，其余只存相对 diff_from blob 的差分，
+链长达到 document_version_snapshot_interval 时重新存一次完整快照；读取时透明还原并按校验和缓存。
+blob 可选以 zstd 压缩存储（document_blob_compression，见 compression.py），读取时先解压再还原差分。
+旧格式版本（内容仍在版本行中，可能为版本级差分）保持可读，迁移见 scripts/migrate_versions_to_blobs.py
+"""
+import hashlib
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, insert, literal, func, cast
+from sqlalchemy.dialects.postgresql import insert as pg_insert, REGCONFIG
+
+from api.cache import TTLCache
+from api.routers import settings
+from api.documents.delta import encode_delta, apply_delta
+from api.documents.compression import compression_enabled, compress, decompress
+from models.models import DocumentBlob
+
+# 与 *_document_versions 上的 content_size_limit 约束一致
+CONTENT_MAX_CHARS = 5000
+
+# 已还原的内容；内容寻址，按校验和缓存无需失效
+version_content_cache = TTLCache(
+    "document_version_content",
+    maxsize=settings.document_version_cache_size,
+    ttl=settings.document_version_cache_ttl_seconds
+)
+
+# 补丁保存产生的 SHA-256 中间状态，追加写补丁在其上继续计算
+checksum_state_cache = TTLCache(
+    "document_checksum_state",
+    maxsize=settings.document_version_cache_size,
+    ttl=settings.document_version_cache_ttl_seconds
+)
+
+def calculate_checksum(content: str) -> str:
+    """计算内容的SHA256校验和"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def patch_checksum(content: str, base_checksum: Optional[str] = None, appended: Optional[str] = None) -> str:
+    """
+    计算补丁结果的校验和
+    补丁只在末尾追加（appended 不为空）且缓存中有基准内容的哈希状态时，只对追加部分继续哈希，否则整篇计算
+    """
+    state = checksum_state_cache.get(base_checksum) if appended is not None and base_checksum else None
+    if state is not None:
+        state = state.copy()
+        state.update(appended.encode('utf-8'))
+    else:
+        state = hashlib.sha256(content.encode('utf-8'))
+    checksum = state.hexdigest()
+    checksum_state_cache.set(checksum, state)
+    return checksum
+
+# 解压后的差分链条目
+ChainRow = namedtuple("ChainRow", ["key", "diff_from", "content"])
+
+def search_config():
+    """全文检索使用的 regconfig"""
+    return cast(literal(settings.document_search_config), REGCONFIG)
+
+def search_vector(content: str):
+    """内容的全文检索向量（SQL 表达式），写入文档行的 content_tsv"""
+    return func.to_tsvector(search_config(), content)
+
+async def _load_chains(db, key_column, diff_column, content_column, keys, extra_columns=()):
+    """递归 CTE 一次取回若干条目及其差分链上的全部祖先（直到快照），返回 {key: row}"""
+    table = key_column.table
+    columns = (key_column.label("key"), diff_column.label("diff_from"), content_column.label("content"), *extra_columns)
+    chain = select(*columns).where(key_column.in_(keys)).cte("content_chain", recursive=True)
+    chain = chain.union(
+        select(*columns).select_from(table).join(chain, key_column == chain.c.diff_from)
+    )
+    result = await db.execute(select(*chain.c))
+    return {row.key: row for row in result.all()}
+
+def _resolve(key, rows, resolved: Dict) -> str:
+    """沿差分链回溯到已知内容（快照或已还原条目），再依次应用差分"""
+    path = []
+    current = key
+    while current not in resolved:
+        row = rows[current]
+        if row.diff_from is None:
+            resolved[current] = row.content
+            break
+        path.append(row)
+        current = row.diff_from
+    for row in reversed(path):
+        resolved[row.key] = apply_delta(resolved[row.diff_from], row.content)
+    return resolved[key]
+
+async def load_blob_contents(db, checksums: Iterable[str]) -> Dict[str, str]:
+    """返回 {校验和: 明文内容}，未命中缓存的 blob 一次查询取回差分链还原"""
+    contents = {}
+    missing = []
+    for checksum in set(checksums):
+        cached = version_content_cache.get(checksum)
+        if cached is not None:
+            contents[checksum] = cached
+        else:
+            missing.append(checksum)
+    if missing:
+        rows = await _load_chains(
+            db, DocumentBlob.checksum_sha256, DocumentBlob.diff_from, DocumentBlob.content, missing,
+            extra_columns=(DocumentBlob.content_zstd, DocumentBlob.dictionary_id)
+        )
+        # 压缩存储的 blob 先解压
+        for checksum, row in rows.items():
+            if row.content is None:
+                content = await decompress(db, row.content_zstd, row.dictionary_id)
+                rows[checksum] = ChainRow(row.key, row.diff_from, content)
+        resolved = dict(contents)
+        for checksum in missing:
+            _resolve(checksum, rows, resolved)
+        for checksum, content in resolved.items():
+            version_content_cache.set(checksum, content)
+        contents.update({checksum: resolved[checksum] for checksum in missing})
+    return contents
+
+async def load_contents(db, version_model, versions: Iterable) -> Dict:
+    """返回 {版本 id: 明文内容}"""
+    contents = {}
+    blob_versions = {}
+    legacy_versions = []
+    for version in versions:
+        cached = version_content_cache.get(version.checksum_sha256) if version.checksum_sha256 else None
+        if cached is not None:
+            contents[version.id] = cached
+        elif version.content is None:
+            blob_versions[version.id] = version.checksum_sha256
+        elif version.diff_from is None:
+            contents[version.id] = version.content
+        else:
+            legacy_versions.append(version)
+    if blob_versions:
+        blobs = await load_blob_contents(db, blob_versions.values())
+        contents.update({version_id: blobs[checksum] for version_id, checksum in blob_versions.items()})
+    if legacy_versions:
+        # 旧格式：版本行内的版本级差分链
+        rows = await _load_chains(
+            db, version_model.id, version_model.diff_from, version_model.content,
+            [version.id for version in legacy_versions]
+        )
+        resolved = {}
+        for version in legacy_versions:
+            contents[version.id] = _resolve(version.id, rows, resolved)
+            if version.checksum_sha256:
+                version_content_cache.set(version.checksum_sha256, contents[version.id])
+    return contents
+
+async def store_blob(db, content: str, base_checksum: str = None, checksum: str = None) -> str:
+    """
+    保存内容 blob 并返回校验和；内容已存在时不写入
+    相对 base_checksum 对应的 blob 存差分，链长达到快照间隔或差分不比原文短时存完整快照
+    """
+    checksum = checksum or calculate_checksum(content)
+    keys = [checksum] if base_checksum is None else [checksum, base_checksum]
+    result = await db.execute(
+        select(DocumentBlob.checksum_sha256, DocumentBlob.chain_depth)
+        .where(DocumentBlob.checksum_sha256.in_(keys))
+    )
+    existing = {row.checksum_sha256: row.chain_depth for row in result.all()}
+    if checksum in existing:
+        return checksum
+
+    diff_from = None
+    chain_depth = 0
+    stored = content
+    base_depth = existing.get(base_checksum)
+    if base_depth is not None and base_depth + 1 < settings.document_version_snapshot_interval:
+        base_content = (await load_blob_contents(db, [base_checksum]))[base_checksum]
+        delta = encode_delta(base_content, content)
+        if len(delta) < len(content):
+            diff_from = base_checksum
+            chain_depth = base_depth + 1
+            stored = delta
+
+    content_zstd = None
+    dictionary_id = None
+    if compression_enabled():
+        content_zstd, dictionary_id = await compress(db, stored)
+        stored = None
+
+    # 并发写入相同内容时以先写入者为准
+    await db.execute(
+        pg_insert(DocumentBlob)
+        .values(
+            checksum_sha256=checksum,
+            content=stored,
+            content_zstd=content_zstd,
+            dictionary_id=dictionary_id,
+            diff_from=diff_from,
+            chain_depth=chain_depth,
+            byte_length=len(content.encode("utf-8"))
+        )
+        .on_conflict_do_nothing(index_elements=[DocumentBlob.checksum_sha256])
+    )
+    version_content_cache.set(checksum, content)
+    return checksum
+
+async def append_version(db, doc_model, version_model, document, content: str, content_format: str, created_by, checksum: str = None) -> Tuple[object, bool]:
+    """
+    为文档追加新版本（不提交事务），返回 (版本, 是否新建)
+    内容与当前版本完全相同时不新建版本，直接返回当前版本；与其他已有内容相同时只插入指针行。
+    checksum 为调用方已算好的内容校验和（如补丁保存），为空时在此计算。
+    """
+    if len(content) > CONTENT_MAX_CHARS:
+        raise HTTPException(status_code=400, detail=f"Content exceeds {CONTENT_MAX_CHARS} characters")
+
+    checksum = checksum or calculate_checksum(content)
+    current = None
+    if document.current_version_id is not None:
+        result = await db.execute(select(version_model).where(version_model.id == document.current_version_id))
+        current = result.scalars().first()
+        if current is not None and current.checksum_sha256 == checksum and current.content_format == content_format:
+            return current, False
+
+    await store_blob(db, content, current.checksum_sha256 if current is not None else None, checksum)
+    version = await insert_version(
+        db, doc_model, version_model, document.id, checksum, len(content.encode("utf-8")), content_format, created_by,
+        search_vector(content)
+    )
+    return version, True
+
+async def insert_version(db, doc_model, version_model, document_id, checksum: str, byte_length: int, content_format: str, created_by, content_tsv=None):
+    """
+    插入指向已有 blob 的版本行并设为当前版本（不提交事务），返回版本；文档不存在时返回 404
+    content_tsv 为新当前版本的全文检索向量（SQL 表达式），同时写入文档行
+    版本号由文档行上的 next_version_number 分配：UPDATE ... RETURNING 与版本 INSERT 在同一条语句中完成，
+    并发写入者在文档行锁上排队，不会产生重复版本号
+    """
+    # 分配版本号并切换当前版本；current_version_id 外键为 DEFERRABLE INITIALLY DEFERRED，提交时才检查
+    version_id = uuid.uuid4()
+    now = datetime.utcnow()
+    allocation = (
+        update(doc_model)
+        .where(doc_model.id == document_id, doc_model.deleted_at == None)
+        .values(
+            next_version_number=doc_model.next_version_number + 1,
+            current_version_id=version_id,
+            updated_at=now,
+            content_tsv=content_tsv
+        )
+        .returning(doc_model.id.label("document_id"), (doc_model.next_version_number - 1).label("version_number"))
+        .cte("version_allocation")
+    )
+    columns = version_model.__table__.c
+    result = await db.execute(
+        insert(version_model)
+        .from_select(
+            ["id", "document_id", "version_number", "content_format", "created_by",
+             "checksum_sha256", "byte_length", "chain_depth", "created_at", "updated_at"],
+            select(
+                literal(version_id, columns.id.type),
+                allocation.c.document_id,
+                allocation.c.version_number,
+                literal(content_format, columns.content_format.type),
+                literal(created_by, columns.created_by.type),
+                literal(checksum, columns.checksum_sha256.type),
+                literal(byte_length, columns.byte_length.type),
+                literal(0, columns.chain_depth.type),
+                literal(now, columns.created_at.type),
+                literal(now, columns.updated_at.type)
+            ),
+            include_defaults=False
+        )
+        .add_cte(allocation)
+        .returning(
+            version_model.id, version_model.version_number, version_model.content_format,
+            version_model.created_at, version_model.checksum_sha256, version_model.byte_length
+        )
+    )
+    version = result.first()
+    if version is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return version
+
+async def clone_version(db, doc_model, version_model, source_document, source_version, document_id, created_by):
+    """
+    以源版本内容作为文档 document_id 的新版本（不提交事务），返回版本
+    新版本与源版本指向同一个 blob，不复制内容；旧格式版本先还原内容存入 blob（仅一次）。
+    源版本是当前版本时直接复制源文档的检索向量，否则按内容重新计算
+    """
+    content = None
+    if source_version.content is not None or source_version.id != source_document.current_version_id:
+        content = (await load_contents(db, version_model, [source_version]))[source_version.id]
+    if source_version.id == source_document.current_version_id:
+        source = doc_model.__table__.alias("source_document")
+        content_tsv = select(source.c.content_tsv).where(source.c.id == source_document.id).scalar_subquery()
+    else:
+        content_tsv = search_vector(content)
+
+    if source_version.content is not None:
+        checksum = await store_blob(db, content)
+        byte_length = len(content.encode("utf-8"))
+    else:
+        checksum = source_version.checksum_sha256
+        byte_length = source_version.byte_length
+        if byte_length is None:
+            result = await db.execute(select(DocumentBlob.byte_length).where(DocumentBlob.checksum_sha256 == checksum))
+            byte_length = result.scalar()
+    return await insert_version(
+        db, doc_model, version_model, document_id, checksum, byte_length, source_version.content_format, created_by,
+        content_tsv
+    )
@@ -0,0 +1,65 @@
+"""
+游标（keyset）分页工具
+游标为 (排序列值, id) 的不透明编码，翻页成本与页码无关
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+PREV_CURSOR_HEADER = "X-Prev-Cursor"
+
+def encode_cursor(sort_value: datetime, row_id: Any) -> str:
+    """将 (排序值, id) 编码为 URL 安全的不透明游标"""
+    raw = json.dumps({"v": sort_value.isoformat(), "id": str(row_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """解码游标，格式错误时返回 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(data["v"]), uuid.UUID(data["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def apply_keyset(query, sort_column, id_column, cursor: Optional[str], direction: str, descending: bool, limit: int):
+    """
+    为查询追加游标条件与排序，多取一行用于判断是否还有数据
+    direction=next 沿排序方向向后翻页，prev 反向翻页（结果需用 finalize_keyset_page 还原顺序）
+    """
+    backward = direction == "prev"
+    # 反向翻页时按相反顺序扫描索引
+    scan_descending = descending != backward
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        key = tuple_(sort_column, id_column)
+        query = query.where(key < tuple_(sort_value, row_id) if scan_descending else key > tuple_(sort_value, row_id))
+    if scan_descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    return query.limit(limit + 1)
+
+def finalize_keyset_page(rows: List[Any], sort_attr: str, cursor: Optional[str], direction: str, limit: int, response: Response) -> List[Any]:
+    """截取本页数据、恢复正常顺序，并通过响应头返回前后页游标"""
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+    backward = direction == "prev"
+    if backward:
+        rows.reverse()
+    if rows:
+        first, last = rows[0], rows[-1]
+        # 沿翻页方向看是否还有数据；反方向只要带了游标就说明之前有数据
+        has_next = has_more if not backward else cursor is not None
+        has_prev = has_more if backward else cursor is not None
+        if has_next:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, sort_attr), last.id)
+        if has_prev:
+            response.headers[PREV_CURSOR_HEADER] = encode_cursor(getattr(first, sort_attr), first.id)
+    return rows
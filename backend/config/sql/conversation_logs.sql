@@ -10,9 +10,15 @@ CREATE TABLE IF NOT EXISTS conversation_sessions (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     deleted_at TIMESTAMP WITH TIME ZONE NULL,
-    session_metadata JSONB DEFAULT '{}'::jsonb -- 存储会话的元数据信息
+    session_metadata JSONB DEFAULT '{}'::jsonb, -- 存储会话的元数据信息
+    message_count INTEGER NOT NULL DEFAULT 0, -- 未删除消息数，由应用在写入/删除消息时维护
+    last_message_at TIMESTAMP WITH TIME ZONE NULL -- 最后一条未删除消息的时间
 );
 
+-- 已有部署补充统计列（回填见 scripts/backfill_session_stats.py）
+ALTER TABLE conversation_sessions ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE conversation_sessions ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP WITH TIME ZONE NULL;
+
 -- 创建对话消息表
 CREATE TABLE IF NOT EXISTS conversation_messages (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -32,9 +38,16 @@ CREATE TABLE IF NOT EXISTS conversation_messages (
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_conversation_sessions_user_id ON conversation_sessions(user_id) WHERE deleted_at IS NULL;
 CREATE INDEX IF NOT EXISTS idx_conversation_sessions_created_at ON conversation_sessions(created_at DESC) WHERE deleted_at IS NULL;
+-- 游标分页：会话按 (updated_at, id) 倒序，消息按 (created_at, id) 正序
+DROP INDEX IF EXISTS idx_conversation_sessions_user_updated;
+CREATE INDEX IF NOT EXISTS idx_conversation_sessions_user_keyset ON conversation_sessions(user_id, updated_at DESC, id DESC) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_conversation_messages_session_keyset ON conversation_messages(session_id, created_at, id) WHERE deleted_at IS NULL;
 CREATE INDEX IF NOT EXISTS idx_conversation_messages_session_id ON conversation_messages(session_id) WHERE deleted_at IS NULL;
 CREATE INDEX IF NOT EXISTS idx_conversation_messages_created_at ON conversation_messages(created_at ASC) WHERE deleted_at IS NULL;
 CREATE INDEX IF NOT EXISTS idx_conversation_messages_user_id ON conversation_messages(user_id) WHERE deleted_at IS NULL;
+-- 后台清理：按 deleted_at 扫描已软删除的行
+CREATE INDEX IF NOT EXISTS idx_conversation_sessions_purge ON conversation_sessions(deleted_at) WHERE deleted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_conversation_messages_purge ON conversation_messages(deleted_at) WHERE deleted_at IS NOT NULL;
 
 -- 创建唯一约束
 CREATE UNIQUE INDEX IF NOT EXISTS ux_conversation_sessions_user_name ON conversation_sessions(user_id, session_name) WHERE deleted_at IS NULL;
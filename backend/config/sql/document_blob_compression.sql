@@ -0,0 +1,23 @@
+-- 文档 blob 的 zstd 压缩存储（可选，document_blob_compression=zstd）
+-- 压缩的 blob content 为空，内容在 content_zstd（bytea）；校验和仍按明文计算
+-- 共享字典由 scripts/compress_document_blobs.py 训练，该脚本也负责压缩已有 blob
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS document_compression_dictionaries (
+    id SERIAL PRIMARY KEY,
+    dictionary BYTEA NOT NULL,
+    sample_count INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+ALTER TABLE document_blobs ALTER COLUMN content DROP NOT NULL;
+ALTER TABLE document_blobs ADD COLUMN IF NOT EXISTS content_zstd BYTEA;
+ALTER TABLE document_blobs ADD COLUMN IF NOT EXISTS dictionary_id INTEGER REFERENCES document_compression_dictionaries(id);
+-- 已压缩的数据无需再经 TOAST 压缩
+ALTER TABLE document_blobs ALTER COLUMN content_zstd SET STORAGE EXTERNAL;
+
+ALTER TABLE document_blobs DROP CONSTRAINT IF EXISTS check_document_blob_storage;
+ALTER TABLE document_blobs ADD CONSTRAINT check_document_blob_storage
+    CHECK ((content IS NULL) <> (content_zstd IS NULL));
+
+COMMIT;
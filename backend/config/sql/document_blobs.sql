@@ -0,0 +1,35 @@
+-- 内容寻址的文档版本内容
+-- 版本内容按明文 SHA-256 存入 document_blobs，跨版本、跨文档共享；版本行的 content 置空，仅保留 checksum_sha256 指针
+-- blob 的 content 为完整快照，或相对 diff_from 对应 blob 的行级差分（见 api/documents/delta.py）
+-- 已有版本的迁移见 scripts/migrate_versions_to_blobs.py
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS document_blobs (
+    checksum_sha256  TEXT PRIMARY KEY,
+    content          TEXT NOT NULL,
+    diff_from        TEXT REFERENCES document_blobs(checksum_sha256),
+    chain_depth      INTEGER NOT NULL DEFAULT 0,     -- 距最近完整快照的差分层数
+    byte_length      INTEGER NOT NULL,               -- 明文 UTF-8 字节数
+    created_at       TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_document_blobs_diff_from ON document_blobs(diff_from) WHERE diff_from IS NOT NULL;
+
+-- 新版本不再在版本行中保存内容
+ALTER TABLE resume_document_versions ALTER COLUMN content DROP NOT NULL;
+ALTER TABLE letter_document_versions ALTER COLUMN content DROP NOT NULL;
+ALTER TABLE sop_document_versions ALTER COLUMN content DROP NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_resume_versions_checksum ON resume_document_versions(checksum_sha256);
+CREATE INDEX IF NOT EXISTS idx_letter_versions_checksum ON letter_document_versions(checksum_sha256);
+CREATE INDEX IF NOT EXISTS idx_sop_versions_checksum ON sop_document_versions(checksum_sha256);
+
+COMMIT;
+
+-- 迁移完成后可加外键保证版本指针有效
+-- ALTER TABLE resume_document_versions ADD CONSTRAINT fk_resume_versions_blob
+--     FOREIGN KEY (checksum_sha256) REFERENCES document_blobs(checksum_sha256);
+-- ALTER TABLE letter_document_versions ADD CONSTRAINT fk_letter_versions_blob
+--     FOREIGN KEY (checksum_sha256) REFERENCES document_blobs(checksum_sha256);
+-- ALTER TABLE sop_document_versions ADD CONSTRAINT fk_sop_versions_blob
+--     FOREIGN KEY (checksum_sha256) REFERENCES document_blobs(checksum_sha256);
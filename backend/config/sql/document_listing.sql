@@ -0,0 +1,17 @@
+-- 跨类型文档列表
+-- GET /documents 对三张文档表做 UNION ALL，每个分支按 (updated_at, id) 倒序带游标条件扫描，
+-- 覆盖列表所需的全部列，可走 Index Only Scan
+-- 索引创建使用 CONCURRENTLY，需在事务外执行
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_resume_documents_user_keyset
+    ON resume_documents (user_id, updated_at DESC, id DESC)
+    INCLUDE (title, current_version_id, created_at)
+    WHERE deleted_at IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_letter_documents_user_keyset
+    ON letter_documents (user_id, updated_at DESC, id DESC)
+    INCLUDE (title, current_version_id, created_at)
+    WHERE deleted_at IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sop_documents_user_keyset
+    ON sop_documents (user_id, updated_at DESC, id DESC)
+    INCLUDE (title, current_version_id, created_at)
+    WHERE deleted_at IS NULL;
@@ -0,0 +1,19 @@
+-- 当前版本全文检索
+-- 文档行保存当前版本内容的 tsvector，随新增版本、回退、复制维护（见 api/documents/version_store.py）；
+-- 配置需与 Settings.document_search_config 一致（默认 simple）
+-- 已有文档执行本文件后运行 scripts/build_document_search_index.py 回填
+-- 索引创建使用 CONCURRENTLY，需在事务外执行
+
+ALTER TABLE resume_documents ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR;
+ALTER TABLE letter_documents ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR;
+ALTER TABLE sop_documents ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_resume_documents_search
+    ON resume_documents USING GIN (content_tsv)
+    WHERE deleted_at IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_letter_documents_search
+    ON letter_documents USING GIN (content_tsv)
+    WHERE deleted_at IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sop_documents_search
+    ON sop_documents USING GIN (content_tsv)
+    WHERE deleted_at IS NULL;
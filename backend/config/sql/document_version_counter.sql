@@ -0,0 +1,22 @@
+-- 每个文档的版本号计数器
+-- add_version 在同一条语句中执行 UPDATE ... SET next_version_number = next_version_number + 1 RETURNING 并插入版本，
+-- 并发保存在文档行锁上排队，不再因 ux_*_versions_num 冲突失败
+-- 依赖 fk_*_documents_current_version 为 DEFERRABLE INITIALLY DEFERRED（见 documents_new_structure.sql）
+BEGIN;
+
+ALTER TABLE resume_documents ADD COLUMN IF NOT EXISTS next_version_number INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE letter_documents ADD COLUMN IF NOT EXISTS next_version_number INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE sop_documents ADD COLUMN IF NOT EXISTS next_version_number INTEGER NOT NULL DEFAULT 1;
+
+-- 回填：从已有最大版本号（含软删除版本）之后继续分配
+UPDATE resume_documents d SET next_version_number = v.max_number + 1
+    FROM (SELECT document_id, MAX(version_number) AS max_number FROM resume_document_versions GROUP BY document_id) v
+    WHERE v.document_id = d.id;
+UPDATE letter_documents d SET next_version_number = v.max_number + 1
+    FROM (SELECT document_id, MAX(version_number) AS max_number FROM letter_document_versions GROUP BY document_id) v
+    WHERE v.document_id = d.id;
+UPDATE sop_documents d SET next_version_number = v.max_number + 1
+    FROM (SELECT document_id, MAX(version_number) AS max_number FROM sop_document_versions GROUP BY document_id) v
+    WHERE v.document_id = d.id;
+
+COMMIT;
@@ -0,0 +1,23 @@
+-- 文档版本差分存储
+-- diff_from 为空：content 为完整快照；非空：content 为相对 diff_from 版本的行级差分（见 api/documents/delta.py）
+-- 已有数据的重新编码见 scripts/migrate_versions_to_blobs.py
+BEGIN;
+
+ALTER TABLE resume_document_versions
+    ADD COLUMN IF NOT EXISTS diff_from UUID REFERENCES resume_document_versions(id),
+    ADD COLUMN IF NOT EXISTS chain_depth INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE letter_document_versions
+    ADD COLUMN IF NOT EXISTS diff_from UUID REFERENCES letter_document_versions(id),
+    ADD COLUMN IF NOT EXISTS chain_depth INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE sop_document_versions
+    ADD COLUMN IF NOT EXISTS diff_from UUID REFERENCES sop_document_versions(id),
+    ADD COLUMN IF NOT EXISTS chain_depth INTEGER NOT NULL DEFAULT 0;
+
+-- 外键列需要索引，否则删除被引用版本时需全表扫描
+CREATE INDEX IF NOT EXISTS idx_resume_versions_diff_from ON resume_document_versions(diff_from) WHERE diff_from IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_letter_versions_diff_from ON letter_document_versions(diff_from) WHERE diff_from IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_sop_versions_diff_from ON sop_document_versions(diff_from) WHERE diff_from IS NOT NULL;
+
+COMMIT;
@@ -0,0 +1,33 @@
+-- 异步版本创建任务表
+-- POST /documents/{doc_type}/{doc_id}/versions/async 写入任务并立即返回 202，后台工作协程按文档合并处理：
+-- 合并窗口内同一文档的多次自动保存只为最新一次创建版本，其余标记为 superseded
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS document_version_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    doc_type VARCHAR(20) NOT NULL,
+    document_id UUID NOT NULL,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    content TEXT,                      -- 待写入内容，任务结束后清空
+    content_format VARCHAR NOT NULL DEFAULT 'markdown',
+    version_id UUID,
+    version_number INTEGER,
+    superseded_by UUID,
+    error TEXT,
+    claimed_at TIMESTAMP,              -- 领取时间，running 超过租约后由其他进程重新排队
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP NOT NULL DEFAULT now(),
+    CONSTRAINT check_document_version_job_status
+        CHECK (status IN ('queued', 'running', 'succeeded', 'failed', 'superseded'))
+);
+
+-- 已建表的部署补充领取时间列
+ALTER TABLE document_version_jobs ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+
+-- 按文档查找待处理任务
+CREATE INDEX IF NOT EXISTS idx_document_version_jobs_pending
+    ON document_version_jobs (doc_type, document_id, created_at)
+    WHERE status IN ('queued', 'running');
+
+COMMIT;
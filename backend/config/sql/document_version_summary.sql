@@ -0,0 +1,46 @@
+-- 版本历史摘要（fields=summary）
+-- 版本行冗余明文字节数，并让历史索引覆盖摘要所需的全部列，列表查询可走 Index Only Scan，不读堆表与 TOAST
+-- 索引重建使用 CONCURRENTLY，需在事务外执行
+
+ALTER TABLE resume_document_versions ADD COLUMN IF NOT EXISTS byte_length INTEGER;
+ALTER TABLE letter_document_versions ADD COLUMN IF NOT EXISTS byte_length INTEGER;
+ALTER TABLE sop_document_versions ADD COLUMN IF NOT EXISTS byte_length INTEGER;
+
+-- 回填：内容已在 document_blobs 中的版本取 blob 的字节数，旧格式快照直接计算
+UPDATE resume_document_versions v SET byte_length = b.byte_length
+    FROM document_blobs b WHERE v.byte_length IS NULL AND b.checksum_sha256 = v.checksum_sha256;
+UPDATE letter_document_versions v SET byte_length = b.byte_length
+    FROM document_blobs b WHERE v.byte_length IS NULL AND b.checksum_sha256 = v.checksum_sha256;
+UPDATE sop_document_versions v SET byte_length = b.byte_length
+    FROM document_blobs b WHERE v.byte_length IS NULL AND b.checksum_sha256 = v.checksum_sha256;
+
+UPDATE resume_document_versions SET byte_length = octet_length(content)
+    WHERE byte_length IS NULL AND content IS NOT NULL AND diff_from IS NULL;
+UPDATE letter_document_versions SET byte_length = octet_length(content)
+    WHERE byte_length IS NULL AND content IS NOT NULL AND diff_from IS NULL;
+UPDATE sop_document_versions SET byte_length = octet_length(content)
+    WHERE byte_length IS NULL AND content IS NOT NULL AND diff_from IS NULL;
+
+-- 扩展历史索引的 INCLUDE 列
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_resume_versions_history_v2
+    ON resume_document_versions(document_id, created_at DESC, deleted_at)
+    INCLUDE (version_number, content_format, id, checksum_sha256, byte_length);
+DROP INDEX CONCURRENTLY IF EXISTS idx_resume_versions_history;
+ALTER INDEX idx_resume_versions_history_v2 RENAME TO idx_resume_versions_history;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_letter_versions_history_v2
+    ON letter_document_versions(document_id, created_at DESC, deleted_at)
+    INCLUDE (version_number, content_format, id, checksum_sha256, byte_length);
+DROP INDEX CONCURRENTLY IF EXISTS idx_letter_versions_history;
+ALTER INDEX idx_letter_versions_history_v2 RENAME TO idx_letter_versions_history;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sop_versions_history_v2
+    ON sop_document_versions(document_id, created_at DESC, deleted_at)
+    INCLUDE (version_number, content_format, id, checksum_sha256, byte_length);
+DROP INDEX CONCURRENTLY IF EXISTS idx_sop_versions_history;
+ALTER INDEX idx_sop_versions_history_v2 RENAME TO idx_sop_versions_history;
+
+-- 让可见性映射保持最新，Index Only Scan 才能跳过堆表
+VACUUM (ANALYZE) resume_document_versions;
+VACUUM (ANALYZE) letter_document_versions;
+VACUUM (ANALYZE) sop_document_versions;
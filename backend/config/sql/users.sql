@@ -59,3 +59,10 @@ COMMIT;
 -- CREATE POLICY users_self_update ON users FOR UPDATE USING (id = current_setting('app.current_user_id', true)::uuid);
 
 ALTER TABLE users RENAME COLUMN metadata TO user_metadata;
+
+-- 无状态鉴权：访问令牌携带 token_version，停用或角色变更时递增以吊销旧令牌
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INT NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_users_revocation
+    ON users(id)
+    INCLUDE (token_version, is_active, deleted_at)
+    WHERE token_version > 0 OR is_active = FALSE OR deleted_at IS NOT NULL;
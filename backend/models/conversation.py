@@ -1,7 +1,7 @@
 """
 对话日志数据模型
 """
-from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, JSON, CheckConstraint
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, JSON, CheckConstraint, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -20,6 +20,9 @@ class ConversationSession(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     deleted_at = Column(DateTime(timezone=True), nullable=True)
     session_metadata = Column(JSONB, default={})
+    # 冗余统计列，由消息写入/删除时原子维护，避免列表查询逐个会话统计
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
     
     # 关系
     user = relationship("User", back_populates="conversation_sessions")
@@ -58,4 +61,18 @@ class ConversationMessage(Base):
     )
     
     def __repr__(self):
-        return f"<ConversationMessage(id={self.id}, type='{self.message_type}', role='{self.role}')>" 
\ No newline at end of file
+        return f"<ConversationMessage(id={self.id}, type='{self.message_type}', role='{self.role}')>" 
+
+# 游标分页索引（与 conversation_logs.sql 保持一致）
+Index('idx_conversation_sessions_user_keyset', ConversationSession.user_id,
+      ConversationSession.updated_at.desc(), ConversationSession.id.desc(),
+      postgresql_where=ConversationSession.deleted_at.is_(None))
+Index('idx_conversation_messages_session_keyset', ConversationMessage.session_id,
+      ConversationMessage.created_at, ConversationMessage.id,
+      postgresql_where=ConversationMessage.deleted_at.is_(None))
+
+# 后台清理按 deleted_at 扫描已软删除的行
+Index('idx_conversation_sessions_purge', ConversationSession.deleted_at,
+      postgresql_where=ConversationSession.deleted_at.isnot(None))
+Index('idx_conversation_messages_purge', ConversationMessage.deleted_at,
+      postgresql_where=ConversationMessage.deleted_at.isnot(None))
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Enum, Text, func, CheckConstraint, Index, SmallInteger, Boolean
-from sqlalchemy.dialects.postgresql import UUID, JSONB, CITEXT
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Enum, Text, func, CheckConstraint, Index, SmallInteger, Boolean, LargeBinary
+from sqlalchemy.dialects.postgresql import UUID, JSONB, CITEXT, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 import enum
 import uuid
 from datetime import datetime
@@ -27,12 +27,62 @@ class User(Base):
     user_metadata = Column(JSONB, nullable=False, default=dict)
     refresh_token = Column(String, nullable=True)
     is_active = Column(Boolean, nullable=False, default=True)
+    token_version = Column(Integer, nullable=False, default=0)  # 停用/角色变更时递增，使旧访问令牌失效
     
     # 反向关系
     resume_documents = relationship("ResumeDocument", back_populates="user")
     letter_documents = relationship("LetterDocument", back_populates="user")
     sop_documents = relationship("SopDocument", back_populates="user")
 
+# 内容寻址的版本内容表，按明文 SHA-256 跨版本、跨文档共享
+class DocumentBlob(Base):
+    __tablename__ = "document_blobs"
+    checksum_sha256 = Column(String, primary_key=True)
+    content = Column(Text, nullable=True)  # 完整快照，或相对 diff_from 的行级差分；压缩存储时为空
+    content_zstd = Column(LargeBinary, nullable=True)  # zstd 压缩后的 content（document_blob_compression=zstd）
+    dictionary_id = Column(Integer, ForeignKey("document_compression_dictionaries.id"), nullable=True)  # 压缩使用的共享字典
+    diff_from = Column(String, ForeignKey("document_blobs.checksum_sha256"), nullable=True)
+    chain_depth = Column(Integer, nullable=False, default=0, server_default="0")  # 距最近完整快照的差分层数
+    byte_length = Column(Integer, nullable=False)  # 明文 UTF-8 字节数
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        CheckConstraint("(content IS NULL) <> (content_zstd IS NULL)", name="check_document_blob_storage"),
+    )
+
+# zstd 共享字典（scripts/compress_document_blobs.py 训练），不可变，按 id 引用
+class DocumentCompressionDictionary(Base):
+    __tablename__ = "document_compression_dictionaries"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    dictionary = Column(LargeBinary, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+# 异步版本创建任务（/documents/{type}/{id}/versions/async）
+class DocumentVersionJob(Base):
+    __tablename__ = "document_version_jobs"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    doc_type = Column(String(20), nullable=False)
+    document_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed, superseded
+    content = Column(Text, nullable=True)  # 待写入内容，任务结束后清空
+    content_format = Column(String, nullable=False, default="markdown")
+    version_id = Column(UUID(as_uuid=True), nullable=True)
+    version_number = Column(Integer, nullable=True)
+    superseded_by = Column(UUID(as_uuid=True), nullable=True)  # 被同一文档更新的自动保存取代
+    error = Column(Text, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)  # 领取时间；running 超过租约仍未完成视为领取进程已退出
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('queued', 'running', 'succeeded', 'failed', 'superseded')",
+            name="check_document_version_job_status"
+        ),
+    )
+
 class DocType(enum.Enum):
     resume = "resume"
     letter = "letter"
@@ -44,7 +94,9 @@ class ResumeDocument(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False, default="")
-    current_version_id = Column(UUID(as_uuid=True), ForeignKey("resume_document_versions.id"), nullable=True)
+    current_version_id = Column(UUID(as_uuid=True), ForeignKey("resume_document_versions.id", ondelete="SET NULL", deferrable=True, initially="DEFERRED"), nullable=True)
+    next_version_number = Column(Integer, nullable=False, default=1, server_default="1")  # 下一个可分配的版本号，与版本插入在同一语句中原子递增
+    content_tsv = deferred(Column(TSVECTOR, nullable=True))  # 当前版本内容的全文检索向量，随当前版本切换维护
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
@@ -57,9 +109,12 @@ class ResumeDocumentVersion(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(UUID(as_uuid=True), ForeignKey("resume_documents.id", deferrable=True, initially="DEFERRED"), nullable=False)
     version_number = Column(Integer, nullable=False)
-    content = Column(Text, nullable=False)
+    content = Column(Text, nullable=True)  # 新版本为空，内容在 document_blobs 中（按 checksum_sha256 关联）
     content_format = Column(String, nullable=False, default="markdown")
     checksum_sha256 = Column(String, nullable=True)
+    byte_length = Column(Integer, nullable=True)  # 明文 UTF-8 字节数，随历史索引覆盖，列表无需读取内容
+    diff_from = Column(UUID(as_uuid=True), ForeignKey("resume_document_versions.id"), nullable=True)  # 旧格式：非空时 content 为相对该版本的差分
+    chain_depth = Column(Integer, nullable=False, default=0, server_default="0")  # 旧格式：距最近完整快照的差分层数
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -79,7 +134,9 @@ class LetterDocument(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False, default="")
-    current_version_id = Column(UUID(as_uuid=True), ForeignKey("letter_document_versions.id"), nullable=True)
+    current_version_id = Column(UUID(as_uuid=True), ForeignKey("letter_document_versions.id", ondelete="SET NULL", deferrable=True, initially="DEFERRED"), nullable=True)
+    next_version_number = Column(Integer, nullable=False, default=1, server_default="1")  # 下一个可分配的版本号，与版本插入在同一语句中原子递增
+    content_tsv = deferred(Column(TSVECTOR, nullable=True))  # 当前版本内容的全文检索向量，随当前版本切换维护
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
@@ -92,9 +149,12 @@ class LetterDocumentVersion(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(UUID(as_uuid=True), ForeignKey("letter_documents.id", deferrable=True, initially="DEFERRED"), nullable=False)
     version_number = Column(Integer, nullable=False)
-    content = Column(Text, nullable=False)
+    content = Column(Text, nullable=True)  # 新版本为空，内容在 document_blobs 中（按 checksum_sha256 关联）
     content_format = Column(String, nullable=False, default="markdown")
     checksum_sha256 = Column(String, nullable=True)
+    byte_length = Column(Integer, nullable=True)  # 明文 UTF-8 字节数，随历史索引覆盖，列表无需读取内容
+    diff_from = Column(UUID(as_uuid=True), ForeignKey("letter_document_versions.id"), nullable=True)  # 旧格式：非空时 content 为相对该版本的差分
+    chain_depth = Column(Integer, nullable=False, default=0, server_default="0")  # 旧格式：距最近完整快照的差分层数
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -113,7 +173,9 @@ class SopDocument(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=False, default="")
-    current_version_id = Column(UUID(as_uuid=True), ForeignKey("sop_document_versions.id"), nullable=True)
+    current_version_id = Column(UUID(as_uuid=True), ForeignKey("sop_document_versions.id", ondelete="SET NULL", deferrable=True, initially="DEFERRED"), nullable=True)
+    next_version_number = Column(Integer, nullable=False, default=1, server_default="1")  # 下一个可分配的版本号，与版本插入在同一语句中原子递增
+    content_tsv = deferred(Column(TSVECTOR, nullable=True))  # 当前版本内容的全文检索向量，随当前版本切换维护
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = Column(DateTime, nullable=True)
@@ -126,9 +188,12 @@ class SopDocumentVersion(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(UUID(as_uuid=True), ForeignKey("sop_documents.id", deferrable=True, initially="DEFERRED"), nullable=False)
     version_number = Column(Integer, nullable=False)
-    content = Column(Text, nullable=False)
+    content = Column(Text, nullable=True)  # 新版本为空，内容在 document_blobs 中（按 checksum_sha256 关联）
     content_format = Column(String, nullable=False, default="markdown")
     checksum_sha256 = Column(String, nullable=True)
+    byte_length = Column(Integer, nullable=True)  # 明文 UTF-8 字节数，随历史索引覆盖，列表无需读取内容
+    diff_from = Column(UUID(as_uuid=True), ForeignKey("sop_document_versions.id"), nullable=True)  # 旧格式：非空时 content 为相对该版本的差分
+    chain_depth = Column(Integer, nullable=False, default=0, server_default="0")  # 旧格式：距最近完整快照的差分层数
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -147,13 +212,50 @@ User.letter_documents = relationship("LetterDocument", back_populates="user")
 User.sop_documents = relationship("SopDocument", back_populates="user")
 User.conversation_sessions = relationship("ConversationSession", back_populates="user")
 
-# 创建索引
+# 创建索引（历史索引覆盖 fields=summary 所需的全部列，可走 Index Only Scan）
 Index('idx_resume_versions_history', ResumeDocumentVersion.document_id, ResumeDocumentVersion.created_at.desc(), 
-      ResumeDocumentVersion.deleted_at, postgresql_include=[ResumeDocumentVersion.version_number, ResumeDocumentVersion.content_format])
+      ResumeDocumentVersion.deleted_at, postgresql_include=[ResumeDocumentVersion.version_number, ResumeDocumentVersion.content_format,
+                                        ResumeDocumentVersion.id, ResumeDocumentVersion.checksum_sha256, ResumeDocumentVersion.byte_length])
 Index('idx_letter_versions_history', LetterDocumentVersion.document_id, LetterDocumentVersion.created_at.desc(), 
-      LetterDocumentVersion.deleted_at, postgresql_include=[LetterDocumentVersion.version_number, LetterDocumentVersion.content_format])
+      LetterDocumentVersion.deleted_at, postgresql_include=[LetterDocumentVersion.version_number, LetterDocumentVersion.content_format,
+                                        LetterDocumentVersion.id, LetterDocumentVersion.checksum_sha256, LetterDocumentVersion.byte_length])
 Index('idx_sop_versions_history', SopDocumentVersion.document_id, SopDocumentVersion.created_at.desc(), 
-      SopDocumentVersion.deleted_at, postgresql_include=[SopDocumentVersion.version_number, SopDocumentVersion.content_format])
+      SopDocumentVersion.deleted_at, postgresql_include=[SopDocumentVersion.version_number, SopDocumentVersion.content_format,
+                                        SopDocumentVersion.id, SopDocumentVersion.checksum_sha256, SopDocumentVersion.byte_length])
+
+# 差分链外键索引（与 document_version_deltas.sql 保持一致）
+Index('idx_resume_versions_diff_from', ResumeDocumentVersion.diff_from, postgresql_where=ResumeDocumentVersion.diff_from.isnot(None))
+Index('idx_letter_versions_diff_from', LetterDocumentVersion.diff_from, postgresql_where=LetterDocumentVersion.diff_from.isnot(None))
+Index('idx_sop_versions_diff_from', SopDocumentVersion.diff_from, postgresql_where=SopDocumentVersion.diff_from.isnot(None))
+
+# 版本按校验和关联 blob
+Index('idx_resume_versions_checksum', ResumeDocumentVersion.checksum_sha256)
+Index('idx_letter_versions_checksum', LetterDocumentVersion.checksum_sha256)
+Index('idx_sop_versions_checksum', SopDocumentVersion.checksum_sha256)
+Index('idx_document_blobs_diff_from', DocumentBlob.diff_from, postgresql_where=DocumentBlob.diff_from.isnot(None))
+
+# 跨类型文档列表的游标分页（GET /documents 每个分支按 (updated_at, id) 倒序扫描）
+Index('idx_resume_documents_user_keyset', ResumeDocument.user_id, ResumeDocument.updated_at.desc(), ResumeDocument.id.desc(),
+      postgresql_where=ResumeDocument.deleted_at.is_(None),
+      postgresql_include=[ResumeDocument.title, ResumeDocument.current_version_id, ResumeDocument.created_at])
+Index('idx_letter_documents_user_keyset', LetterDocument.user_id, LetterDocument.updated_at.desc(), LetterDocument.id.desc(),
+      postgresql_where=LetterDocument.deleted_at.is_(None),
+      postgresql_include=[LetterDocument.title, LetterDocument.current_version_id, LetterDocument.created_at])
+Index('idx_sop_documents_user_keyset', SopDocument.user_id, SopDocument.updated_at.desc(), SopDocument.id.desc(),
+      postgresql_where=SopDocument.deleted_at.is_(None),
+      postgresql_include=[SopDocument.title, SopDocument.current_version_id, SopDocument.created_at])
+
+# 当前版本全文检索（GET /documents/search）
+Index('idx_resume_documents_search', ResumeDocument.content_tsv, postgresql_using='gin',
+      postgresql_where=ResumeDocument.deleted_at.is_(None))
+Index('idx_letter_documents_search', LetterDocument.content_tsv, postgresql_using='gin',
+      postgresql_where=LetterDocument.deleted_at.is_(None))
+Index('idx_sop_documents_search', SopDocument.content_tsv, postgresql_using='gin',
+      postgresql_where=SopDocument.deleted_at.is_(None))
+
+# 按文档查找待处理任务
+Index('idx_document_version_jobs_pending', DocumentVersionJob.doc_type, DocumentVersionJob.document_id,
+      DocumentVersionJob.created_at, postgresql_where=DocumentVersionJob.status.in_(['queued', 'running']))
 
 # 导入对话日志模型
 from .conversation import ConversationSession, ConversationMessage 
\ No newline at end of file
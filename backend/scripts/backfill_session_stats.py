@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+会话统计列回填脚本
+根据 conversation_messages 重新计算 conversation_sessions.message_count / last_message_at
+"""
+import os
+import sys
+import psycopg2
+
+# 添加项目根目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+# 每批回填的会话数量，避免长事务锁住大量行
+BATCH_SIZE = 1000
+
+# conversation_logs.sql 中定义的 updated_at 触发器
+UPDATED_AT_TRIGGER = "trigger_set_updated_at_conversation_sessions"
+
+BACKFILL_SQL = """
+    WITH batch AS (
+        SELECT id FROM conversation_sessions
+        WHERE id > %(last_id)s
+        ORDER BY id
+        LIMIT %(batch_size)s
+    ), stats AS (
+        SELECT b.id AS session_id,
+               COUNT(m.id) AS message_count,
+               MAX(m.created_at) AS last_message_at
+        FROM batch b
+        LEFT JOIN conversation_messages m
+            ON m.session_id = b.id AND m.deleted_at IS NULL
+        GROUP BY b.id
+    )
+    UPDATE conversation_sessions s
+    SET message_count = stats.message_count,
+        last_message_at = stats.last_message_at,
+        updated_at = s.updated_at
+    FROM stats
+    WHERE s.id = stats.session_id
+    RETURNING s.id
+"""
+
+def backfill_session_stats():
+    """分批回填会话统计列"""
+    # 数据库配置
+    DB_CONFIG = {
+        'host': '127.0.0.1',
+        'port': 5400,
+        'user': 'postgres',
+        'password': '010921',
+        'database': 'aiagent'
+    }
+
+    conn = None
+    has_trigger = False
+    try:
+        print("连接到数据库...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+
+        # 回填期间不更新 updated_at，避免打乱会话列表排序
+        cursor.execute("SELECT 1 FROM pg_trigger WHERE tgname = %s", (UPDATED_AT_TRIGGER,))
+        has_trigger = cursor.fetchone() is not None
+        if has_trigger:
+            cursor.execute(f"ALTER TABLE conversation_sessions DISABLE TRIGGER {UPDATED_AT_TRIGGER}")
+            conn.commit()
+
+        last_id = '00000000-0000-0000-0000-000000000000'
+        total = 0
+        while True:
+            cursor.execute(BACKFILL_SQL, {'last_id': last_id, 'batch_size': BATCH_SIZE})
+            ids = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+            if not ids:
+                break
+            total += len(ids)
+            last_id = max(ids)
+            print(f"已回填 {total} 个会话")
+
+        print(f"回填完成，共 {total} 个会话")
+    except Exception as e:
+        print(f"回填失败: {e}")
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            if has_trigger:
+                cursor = conn.cursor()
+                cursor.execute(f"ALTER TABLE conversation_sessions ENABLE TRIGGER {UPDATED_AT_TRIGGER}")
+                conn.commit()
+            conn.close()
+
+if __name__ == "__main__":
+    print("=== 会话统计列回填 ===")
+    backfill_session_stats()
+    print("=== 回填结束 ===")
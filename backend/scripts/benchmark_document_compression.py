@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+文档 blob 压缩基准
+在临时表中分别以 TEXT（Postgres 默认 TOAST/pglz）、zstd、zstd + 共享字典三种方式存储同一批文档内容，
+对比表占用空间与读取传输字节数/耗时（含 API 层解压）。
+样本取自 document_blobs 的完整快照，不足时用合成的 markdown 简历/SOP 补足；字典只用一半样本训练，另一半用于评测
+"""
+import os
+import sys
+import time
+import random
+import psycopg2
+import zstandard
+
+# 添加项目根目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+# 与 Settings.document_blob_compression_level / compress_document_blobs.py 保持一致
+COMPRESSION_LEVEL = 3
+DICTIONARY_SIZE = 16 * 1024
+
+SAMPLE_SIZE = 4000
+READ_ROUNDS = 5
+
+SECTIONS = {
+    'resume': ['Education', 'Experience', 'Projects', 'Skills', 'Awards', 'Publications'],
+    'sop': ['Introduction', 'Academic Background', 'Research Experience', 'Why This Program', 'Career Goals']
+}
+PHRASES = [
+    'Designed and implemented', 'Led a team of', 'Collaborated with', 'Published a paper on',
+    'Improved performance by', 'Developed a prototype for', 'My interest in', 'During my internship at',
+    'I am particularly drawn to', 'This experience taught me'
+]
+TOPICS = [
+    'distributed systems', 'machine learning', 'computer vision', 'natural language processing',
+    'data visualization', 'robotics', 'bioinformatics', 'financial modeling', 'human-computer interaction'
+]
+
+def synthetic_document(rng, doc_type):
+    """生成一篇合成的 markdown 简历或 SOP（5000 字符以内）"""
+    lines = [f"# {doc_type.upper()} {rng.randint(1, 99999)}", ""]
+    for section in SECTIONS[doc_type]:
+        lines += [f"## {section}", ""]
+        for _ in range(rng.randint(2, 5)):
+            lines.append(f"- {rng.choice(PHRASES)} {rng.choice(TOPICS)} ({rng.randint(2015, 2025)}), "
+                         f"{rng.choice(PHRASES).lower()} {rng.choice(TOPICS)} with {rng.randint(2, 40)} collaborators.")
+        lines.append("")
+    return "\n".join(lines)[:5000]
+
+def load_samples(cursor):
+    """取完整快照作为样本，不足时补充合成文档"""
+    cursor.execute("""
+        SELECT content FROM document_blobs
+        WHERE content IS NOT NULL AND diff_from IS NULL
+        ORDER BY random()
+        LIMIT %s
+    """, (SAMPLE_SIZE,))
+    samples = [row[0] for row in cursor.fetchall()]
+    real = len(samples)
+    rng = random.Random(42)
+    while len(samples) < SAMPLE_SIZE:
+        samples.append(synthetic_document(rng, rng.choice(['resume', 'sop'])))
+    rng.shuffle(samples)
+    return samples, real
+
+def store(cursor, table, column_type, values):
+    """写入临时表并返回表总大小（含 TOAST）"""
+    cursor.execute(f"CREATE TEMP TABLE {table} (id SERIAL PRIMARY KEY, content {column_type})")
+    if column_type == 'BYTEA':
+        # 已压缩的数据不再经 pglz 压缩，与 document_blob_compression.sql 一致
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN content SET STORAGE EXTERNAL")
+    cursor.executemany(f"INSERT INTO {table} (content) VALUES (%s)", [(value,) for value in values])
+    cursor.execute(f"SELECT pg_total_relation_size('{table}')")
+    return cursor.fetchone()[0]
+
+def read(cursor, table, decode):
+    """全表读取 READ_ROUNDS 次，返回 (单次传输字节数, 单次平均耗时毫秒)"""
+    cursor.execute(f"SELECT SUM(octet_length(content)) FROM {table}")
+    transferred = cursor.fetchone()[0]
+    start = time.perf_counter()
+    for _ in range(READ_ROUNDS):
+        cursor.execute(f"SELECT content FROM {table}")
+        for (content,) in cursor.fetchall():
+            decode(content)
+    elapsed = (time.perf_counter() - start) / READ_ROUNDS * 1000
+    return transferred, elapsed
+
+def benchmark_document_compression():
+    """运行基准并打印结果"""
+    # 数据库配置
+    DB_CONFIG = {
+        'host': '127.0.0.1',
+        'port': 5400,
+        'user': 'postgres',
+        'password': '010921',
+        'database': 'aiagent'
+    }
+
+    conn = None
+    try:
+        print("连接到数据库...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        cursor = conn.cursor()
+        samples, real = load_samples(cursor)
+        training, evaluation = samples[:len(samples) // 2], samples[len(samples) // 2:]
+        print(f"样本: {real} 篇来自 document_blobs，{len(samples) - real} 篇合成；训练 {len(training)} 篇，评测 {len(evaluation)} 篇")
+
+        dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, [text.encode('utf-8') for text in training])
+        plain_compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+        dict_compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dictionary)
+        plain_decompressor = zstandard.ZstdDecompressor()
+        dict_decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+
+        raw_bytes = sum(len(text.encode('utf-8')) for text in evaluation)
+        modes = [
+            ("text (pglz/TOAST)", "TEXT", evaluation, lambda value: value),
+            ("zstd", "BYTEA", [plain_compressor.compress(text.encode('utf-8')) for text in evaluation],
+             lambda value: plain_decompressor.decompress(bytes(value)).decode('utf-8')),
+            ("zstd + dictionary", "BYTEA", [dict_compressor.compress(text.encode('utf-8')) for text in evaluation],
+             lambda value: dict_decompressor.decompress(bytes(value)).decode('utf-8')),
+        ]
+
+        print(f"明文总量: {raw_bytes} 字节，{len(evaluation)} 篇，平均 {raw_bytes // len(evaluation)} 字节")
+        print(f"{'存储方式':<20}{'表大小(字节)':>14}{'相对 text':>10}{'读取传输(字节)':>16}{'读取+解压(ms)':>16}")
+        baseline = None
+        for index, (name, column_type, values, decode) in enumerate(modes):
+            size = store(cursor, f"bench_blobs_{index}", column_type, [
+                psycopg2.Binary(value) if column_type == 'BYTEA' else value for value in values
+            ])
+            transferred, elapsed = read(cursor, f"bench_blobs_{index}", decode)
+            baseline = baseline or size
+            print(f"{name:<20}{size:>14}{size / baseline:>10.1%}{transferred:>16}{elapsed:>16.1f}")
+        conn.rollback()
+    except Exception as e:
+        print(f"基准测试失败: {e}")
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    print("=== 文档 blob 压缩基准 ===")
+    benchmark_document_compression()
+    print("=== 基准结束 ===")
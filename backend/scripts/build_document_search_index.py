@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+文档全文检索回填脚本
+为 content_tsv 为空的文档按当前版本内容生成检索向量（需先执行 config/sql/document_search.sql），可重复执行
+"""
+import os
+import sys
+import psycopg2
+
+# 添加项目根目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from api.documents.delta import apply_delta
+
+try:
+    import zstandard
+except ImportError:  # 仅读取压缩存储的 blob 时需要
+    zstandard = None
+
+# 与 Settings.document_search_config 保持一致
+SEARCH_CONFIG = 'simple'
+
+# 每批处理的文档数量
+BATCH_SIZE = 500
+
+DOC_TYPES = ['resume', 'letter', 'sop']
+
+def decompress(cursor, data, dictionary_id, dictionaries):
+    """解压 zstd 压缩的 blob 内容"""
+    if zstandard is None:
+        raise RuntimeError("读取压缩存储的 blob 需要安装 zstandard")
+    if dictionary_id is None:
+        return zstandard.ZstdDecompressor().decompress(bytes(data)).decode('utf-8')
+    if dictionary_id not in dictionaries:
+        cursor.execute("SELECT dictionary FROM document_compression_dictionaries WHERE id = %s", (dictionary_id,))
+        dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(bytes(cursor.fetchone()[0]))
+    decompressor = zstandard.ZstdDecompressor(dict_data=dictionaries[dictionary_id])
+    return decompressor.decompress(bytes(data)).decode('utf-8')
+
+def resolve_chain(cursor, table, key_column, key, dictionaries):
+    """递归查询差分链并还原内容"""
+    # 只有 document_blobs 有压缩存储列
+    if table == 'document_blobs':
+        compressed, joined_compressed = "content_zstd, dictionary_id", "t.content_zstd, t.dictionary_id"
+    else:
+        compressed = joined_compressed = "NULL::bytea, NULL::int"
+    cursor.execute(f"""
+        WITH RECURSIVE chain (key, diff_from, content, content_zstd, dictionary_id) AS (
+            SELECT {key_column}, diff_from, content, {compressed} FROM {table} WHERE {key_column} = %s
+            UNION
+            SELECT t.{key_column}, t.diff_from, t.content, {joined_compressed}
+            FROM {table} t JOIN chain c ON t.{key_column} = c.diff_from
+        )
+        SELECT key, diff_from, content, content_zstd, dictionary_id FROM chain
+    """, (key,))
+    rows = {}
+    for row_key, diff_from, content, content_zstd, dictionary_id in cursor.fetchall():
+        if content is None:
+            content = decompress(cursor, content_zstd, dictionary_id, dictionaries)
+        rows[row_key] = (row_key, diff_from, content)
+    path = []
+    current = key
+    while rows[current][1] is not None:
+        path.append(current)
+        current = rows[current][1]
+    content = rows[current][2]
+    for pending in reversed(path):
+        content = apply_delta(content, rows[pending][2])
+    return content
+
+def current_content(cursor, versions_table, version_id, checksum, inline_content, dictionaries):
+    """还原当前版本内容：新格式在 document_blobs，旧格式在版本行（可能为版本级差分）"""
+    if inline_content is None:
+        return resolve_chain(cursor, 'document_blobs', 'checksum_sha256', checksum, dictionaries)
+    return resolve_chain(cursor, versions_table, 'id', version_id, dictionaries)
+
+def build_table(conn, doc_type):
+    """分批回填一种文档类型，返回处理的文档数"""
+    docs_table = f"{doc_type}_documents"
+    versions_table = f"{doc_type}_document_versions"
+    cursor = conn.cursor()
+    dictionaries = {}
+    last_id = '00000000-0000-0000-0000-000000000000'
+    built = 0
+    while True:
+        cursor.execute(f"""
+            SELECT d.id, v.id, v.checksum_sha256, v.content
+            FROM {docs_table} d
+            JOIN {versions_table} v ON v.id = d.current_version_id
+            WHERE d.id > %s AND d.content_tsv IS NULL
+            ORDER BY d.id
+            LIMIT %s
+        """, (last_id, BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        try:
+            for doc_id, version_id, checksum, inline_content in rows:
+                content = current_content(cursor, versions_table, version_id, checksum, inline_content, dictionaries)
+                cursor.execute(
+                    f"UPDATE {docs_table} SET content_tsv = to_tsvector(%s::regconfig, %s) WHERE id = %s",
+                    (SEARCH_CONFIG, content, doc_id)
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        built += len(rows)
+        last_id = rows[-1][0]
+        print(f"{docs_table}: 已处理至文档 {last_id}，累计 {built} 个文档")
+    return built
+
+def build_document_search_index():
+    """回填全部文档类型的检索向量"""
+    # 数据库配置
+    DB_CONFIG = {
+        'host': '127.0.0.1',
+        'port': 5400,
+        'user': 'postgres',
+        'password': '010921',
+        'database': 'aiagent'
+    }
+
+    conn = None
+    try:
+        print("连接到数据库...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        for doc_type in DOC_TYPES:
+            built = build_table(conn, doc_type)
+            print(f"{doc_type}: 共回填 {built} 个文档")
+    except Exception as e:
+        print(f"回填失败: {e}")
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    print("=== 文档全文检索回填 ===")
+    build_document_search_index()
+    print("=== 回填结束 ===")
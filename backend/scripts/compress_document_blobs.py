@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+文档 blob 压缩脚本
+1. 从现有完整快照中抽样训练 zstd 共享字典，写入 document_compression_dictionaries（已有字典时跳过，--retrain 强制重新训练）
+2. 将仍以明文存储的 blob 压缩为 content_zstd
+需先执行 config/sql/document_blob_compression.sql 并安装 zstandard，可重复执行
+"""
+import os
+import sys
+import psycopg2
+import zstandard
+
+# 添加项目根目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+# 与 Settings.document_blob_compression_level 保持一致
+COMPRESSION_LEVEL = 3
+
+# 字典大小与训练样本数量
+DICTIONARY_SIZE = 16 * 1024
+SAMPLE_LIMIT = 5000
+MIN_SAMPLES = 100
+
+# 每批压缩的 blob 数量
+BATCH_SIZE = 500
+
+def train_dictionary(conn, retrain=False):
+    """训练共享字典，返回 (字典 id, 字典)；样本不足时返回 (None, None)"""
+    cursor = conn.cursor()
+    if not retrain:
+        cursor.execute("SELECT id, dictionary FROM document_compression_dictionaries ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+        if row:
+            print(f"使用已有字典 {row[0]}")
+            return row[0], zstandard.ZstdCompressionDict(bytes(row[1]))
+
+    cursor.execute("""
+        SELECT content FROM document_blobs
+        WHERE content IS NOT NULL AND diff_from IS NULL
+        ORDER BY random()
+        LIMIT %s
+    """, (SAMPLE_LIMIT,))
+    samples = [row[0].encode('utf-8') for row in cursor.fetchall()]
+    if len(samples) < MIN_SAMPLES:
+        print(f"样本不足（{len(samples)} < {MIN_SAMPLES}），不训练字典")
+        return None, None
+
+    dictionary = zstandard.train_dictionary(DICTIONARY_SIZE, samples)
+    cursor.execute(
+        "INSERT INTO document_compression_dictionaries (dictionary, sample_count) VALUES (%s, %s) RETURNING id",
+        (psycopg2.Binary(dictionary.as_bytes()), len(samples))
+    )
+    dictionary_id = cursor.fetchone()[0]
+    conn.commit()
+    print(f"已训练字典 {dictionary_id}：{len(samples)} 个样本，{len(dictionary.as_bytes())} 字节")
+    return dictionary_id, dictionary
+
+def compress_blobs(conn, dictionary_id, dictionary):
+    """分批压缩明文 blob，返回压缩的数量"""
+    if dictionary is not None:
+        compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=dictionary)
+    else:
+        compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+    cursor = conn.cursor()
+    last_checksum = ''
+    compressed = 0
+    plain_bytes = 0
+    stored_bytes = 0
+    while True:
+        cursor.execute("""
+            SELECT checksum_sha256, content FROM document_blobs
+            WHERE checksum_sha256 > %s AND content IS NOT NULL
+            ORDER BY checksum_sha256
+            LIMIT %s
+        """, (last_checksum, BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        try:
+            for checksum, content in rows:
+                data = compressor.compress(content.encode('utf-8'))
+                cursor.execute("""
+                    UPDATE document_blobs
+                    SET content = NULL, content_zstd = %s, dictionary_id = %s
+                    WHERE checksum_sha256 = %s AND content IS NOT NULL
+                """, (psycopg2.Binary(data), dictionary_id, checksum))
+                plain_bytes += len(content.encode('utf-8'))
+                stored_bytes += len(data)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        compressed += len(rows)
+        last_checksum = rows[-1][0]
+        print(f"document_blobs: 已压缩 {compressed} 个 blob")
+    if compressed:
+        print(f"压缩前 {plain_bytes} 字节，压缩后 {stored_bytes} 字节（{stored_bytes / plain_bytes:.1%}）")
+    return compressed
+
+def compress_document_blobs(retrain=False):
+    """训练字典并压缩现有 blob"""
+    # 数据库配置
+    DB_CONFIG = {
+        'host': '127.0.0.1',
+        'port': 5400,
+        'user': 'postgres',
+        'password': '010921',
+        'database': 'aiagent'
+    }
+
+    conn = None
+    try:
+        print("连接到数据库...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        dictionary_id, dictionary = train_dictionary(conn, retrain)
+        compressed = compress_blobs(conn, dictionary_id, dictionary)
+        print(f"共压缩 {compressed} 个 blob")
+    except Exception as e:
+        print(f"压缩失败: {e}")
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    print("=== 文档 blob 压缩 ===")
+    compress_document_blobs(retrain="--retrain" in sys.argv[1:])
+    print("=== 压缩结束 ===")
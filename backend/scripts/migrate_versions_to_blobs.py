@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+文档版本内容迁移脚本
+将仍保存在版本行中的内容（完整内容或版本级差分）迁移到内容寻址的 document_blobs 表
+（需先执行 config/sql/document_blobs.sql），可重复执行
+"""
+import os
+import sys
+import hashlib
+import psycopg2
+
+# 添加项目根目录到Python路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.append(project_root)
+
+from api.documents.delta import encode_delta, apply_delta
+
+# 与 Settings.document_version_snapshot_interval 保持一致
+SNAPSHOT_INTERVAL = 10
+
+# 每批处理的文档数量
+BATCH_SIZE = 200
+
+DOC_TYPES = ['resume', 'letter', 'sop']
+
+def resolve_plaintexts(rows):
+    """还原一个文档全部版本的明文；rows 为 (id, content, diff_from)"""
+    by_id = {row[0]: row for row in rows}
+    resolved = {}
+    for version_id in by_id:
+        path = []
+        current = version_id
+        while current not in resolved:
+            _, content, diff_from = by_id[current]
+            if diff_from is None:
+                resolved[current] = content
+                break
+            path.append(current)
+            current = diff_from
+        for pending in reversed(path):
+            _, content, diff_from = by_id[pending]
+            resolved[pending] = apply_delta(resolved[diff_from], content)
+    return resolved
+
+def blob_depth(cursor, checksum, known):
+    """查询 blob 的差分链深度，不存在时返回 None"""
+    if checksum not in known:
+        cursor.execute("SELECT chain_depth FROM document_blobs WHERE checksum_sha256 = %s", (checksum,))
+        row = cursor.fetchone()
+        known[checksum] = row[0] if row else None
+    return known[checksum]
+
+def migrate_document(cursor, versions_table, doc_id, known):
+    """迁移单个文档的版本，按版本号顺序相对上一版本的 blob 存差分"""
+    cursor.execute(f"""
+        SELECT id, content, diff_from FROM {versions_table}
+        WHERE document_id = %s
+        ORDER BY version_number, created_at
+    """, (doc_id,))
+    rows = cursor.fetchall()
+    legacy = [row for row in rows if row[1] is not None]
+    plaintexts = resolve_plaintexts(legacy)
+    prev_checksum, prev_content = None, None
+    migrated = 0
+    for version_id, content, _ in rows:
+        if version_id not in plaintexts:
+            # 已迁移的版本只作为后续版本的差分基准
+            cursor.execute(f"SELECT checksum_sha256 FROM {versions_table} WHERE id = %s", (version_id,))
+            prev_checksum, prev_content = cursor.fetchone()[0], None
+            continue
+        plaintext = plaintexts[version_id]
+        checksum = hashlib.sha256(plaintext.encode('utf-8')).hexdigest()
+        if blob_depth(cursor, checksum, known) is None:
+            stored, diff_from, depth = plaintext, None, 0
+            base_depth = blob_depth(cursor, prev_checksum, known) if prev_content is not None else None
+            if base_depth is not None and base_depth + 1 < SNAPSHOT_INTERVAL:
+                delta = encode_delta(prev_content, plaintext)
+                if len(delta) < len(plaintext):
+                    stored, diff_from, depth = delta, prev_checksum, base_depth + 1
+            cursor.execute("""
+                INSERT INTO document_blobs (checksum_sha256, content, diff_from, chain_depth, byte_length)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (checksum_sha256) DO NOTHING
+            """, (checksum, stored, diff_from, depth, len(plaintext.encode('utf-8'))))
+            known[checksum] = depth
+        prev_checksum, prev_content = checksum, plaintext
+        migrated += 1
+    # 内容已进入 blob，清空版本行内容与旧差分指针
+    cursor.execute(f"""
+        UPDATE {versions_table} v
+        SET checksum_sha256 = data.checksum, byte_length = data.byte_length,
+            content = NULL, diff_from = NULL, chain_depth = 0
+        FROM (
+            SELECT unnest(%s::uuid[]) AS id, unnest(%s::text[]) AS checksum, unnest(%s::int[]) AS byte_length
+        ) data
+        WHERE v.id = data.id
+    """, (
+        [str(version_id) for version_id in plaintexts],
+        [hashlib.sha256(text.encode('utf-8')).hexdigest() for text in plaintexts.values()],
+        [len(text.encode('utf-8')) for text in plaintexts.values()]
+    ))
+    return migrated
+
+def migrate_table(conn, doc_type):
+    """分批迁移一种文档类型，返回迁移的版本数"""
+    versions_table = f"{doc_type}_document_versions"
+    cursor = conn.cursor()
+    known = {}
+    last_id = '00000000-0000-0000-0000-000000000000'
+    migrated = 0
+    while True:
+        cursor.execute(f"""
+            SELECT d.id FROM {doc_type}_documents d
+            WHERE d.id > %s
+              AND EXISTS (
+                  SELECT 1 FROM {versions_table} v
+                  WHERE v.document_id = d.id AND v.content IS NOT NULL
+              )
+            ORDER BY d.id
+            LIMIT %s
+        """, (last_id, BATCH_SIZE))
+        doc_ids = [row[0] for row in cursor.fetchall()]
+        if not doc_ids:
+            break
+        try:
+            for doc_id in doc_ids:
+                migrated += migrate_document(cursor, versions_table, doc_id, known)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        last_id = doc_ids[-1]
+        print(f"{versions_table}: 已处理至文档 {last_id}，累计迁移 {migrated} 个版本")
+    return migrated
+
+def migrate_versions_to_blobs():
+    """迁移全部文档类型的版本内容"""
+    # 数据库配置
+    DB_CONFIG = {
+        'host': '127.0.0.1',
+        'port': 5400,
+        'user': 'postgres',
+        'password': '010921',
+        'database': 'aiagent'
+    }
+
+    conn = None
+    try:
+        print("连接到数据库...")
+        conn = psycopg2.connect(**DB_CONFIG)
+        for doc_type in DOC_TYPES:
+            migrated = migrate_table(conn, doc_type)
+            print(f"{doc_type}: 共迁移 {migrated} 个版本")
+    except Exception as e:
+        print(f"迁移失败: {e}")
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    print("=== 文档版本内容迁移到 document_blobs ===")
+    migrate_versions_to_blobs()
+    print("=== 迁移结束 ===")
@@ -146,6 +146,30 @@ def test_conversation_api():
         print(f"   ❌ 工具消息添加异常: {e}")
         return False
     
+    # 批量添加一轮对话的消息
+    batch_messages = {
+        "messages": [
+            {"message_type": "user", "content": "申请材料需要准备哪些？", "role": "user", "tokens_used": 12},
+            {"message_type": "assistant", "content": "通常需要简历、推荐信和个人陈述。", "role": "assistant", "tokens_used": 20}
+        ]
+    }
+    
+    try:
+        response = requests.post(f"{BASE_URL}/conversations/sessions/{session_id}/messages:batch", json=batch_messages, cookies=cookies)
+        if response.status_code == 200:
+            messages = response.json()
+            if [m['content'] for m in messages] != [m['content'] for m in batch_messages['messages']]:
+                print("   ❌ 批量消息返回顺序不正确")
+                return False
+            print("   ✅ 批量消息添加成功")
+            print(f"   消息数量: {len(messages)}")
+        else:
+            print(f"   ❌ 批量消息添加失败: {response.text}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 批量消息添加异常: {e}")
+        return False
+    
     # 4. 获取会话详情和消息
     print("\n4. 测试获取会话详情...")
     
@@ -275,10 +299,94 @@ def test_conversation_api():
     print("\n🎉 对话日志API测试完成！")
     return True
 
+def fetch_pages(url, cookies, params):
+    """沿 X-Next-Cursor 翻到最后一页，返回每页的响应"""
+    pages = []
+    cursor = None
+    while True:
+        response = requests.get(url, params={**params, **({"cursor": cursor} if cursor else {})}, cookies=cookies)
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.status_code} {response.text}")
+        pages.append(response)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor or len(pages) > 20:
+            return pages
+
+def test_conversation_paging():
+    """测试消息列表与会话列表的游标分页"""
+    print("\n🚀 对话游标分页测试")
+    response = requests.post(f"{BASE_URL}/auth/login", data={"username": "testuser", "password": "123456"})
+    if response.status_code != 200:
+        print(f"   ❌ 登录失败: {response.text}")
+        return False
+    cookies = {"access_token": response.json().get('access_token')}
+    
+    # 1. 消息列表：向后翻页覆盖全部消息且不重复，向前翻页回到上一页
+    print("\n1. 测试消息列表游标分页...")
+    try:
+        session_id = requests.post(f"{BASE_URL}/conversations/sessions", json={"session_name": "分页测试"}, cookies=cookies).json()["id"]
+        messages = [{"message_type": "user", "content": f"消息 {i}"} for i in range(7)]
+        response = requests.post(f"{BASE_URL}/conversations/sessions/{session_id}/messages:batch", json={"messages": messages}, cookies=cookies)
+        if response.status_code != 200:
+            print(f"   ❌ 批量添加消息失败: {response.text}")
+            return False
+        time.sleep(1)  # 开启写后缓冲时等待刷写
+        url = f"{BASE_URL}/conversations/sessions/{session_id}/messages"
+        pages = fetch_pages(url, cookies, {"limit": 3})
+        contents = [message["content"] for page in pages for message in page.json()]
+        if [len(page.json()) for page in pages] == [3, 3, 1] and contents == [message["content"] for message in messages] \
+                and "X-Prev-Cursor" not in pages[0].headers:
+            print("   ✅ 向后翻页正确")
+        else:
+            print(f"   ❌ 向后翻页不符合预期: {contents}")
+            return False
+        
+        response = requests.get(url, params={"limit": 3, "cursor": pages[-1].headers["X-Prev-Cursor"], "direction": "prev"}, cookies=cookies)
+        if response.status_code == 200 and response.json() == pages[1].json():
+            print("   ✅ 向前翻页正确")
+        else:
+            print(f"   ❌ 向前翻页不符合预期: {response.status_code} {response.text}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 消息列表分页测试异常: {e}")
+        return False
+    
+    # 2. 会话列表：按 updated_at 倒序翻页不重复
+    print("\n2. 测试会话列表游标分页...")
+    try:
+        for i in range(3):
+            requests.post(f"{BASE_URL}/conversations/sessions", json={"session_name": f"分页会话 {i}"}, cookies=cookies)
+        total = len(requests.get(f"{BASE_URL}/conversations/sessions", params={"limit": 100}, cookies=cookies).json())
+        pages = fetch_pages(f"{BASE_URL}/conversations/sessions", cookies, {"limit": 2})
+        ids = [session["id"] for page in pages for session in page.json()]
+        if len(ids) == total and len(set(ids)) == total:
+            print(f"   ✅ 会话列表分 {len(pages)} 页返回全部 {total} 个会话")
+        else:
+            print(f"   ❌ 会话列表分页不符合预期: {len(ids)} / {total}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 会话列表分页测试异常: {e}")
+        return False
+    
+    # 3. 无效游标返回 400
+    print("\n3. 测试无效游标...")
+    try:
+        response = requests.get(f"{BASE_URL}/conversations/sessions", params={"cursor": "not-a-cursor"}, cookies=cookies)
+        if response.status_code == 400:
+            print("   ✅ 无效游标返回 400")
+        else:
+            print(f"   ❌ 无效游标处理失败: {response.status_code}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 无效游标测试异常: {e}")
+        return False
+    
+    return True
+
 def main():
     """主函数"""
     print("=== 对话日志API测试 ===")
-    success = test_conversation_api()
+    success = test_conversation_api() and test_conversation_paging()
     if success:
         print("\n✅ 所有测试通过")
     else:
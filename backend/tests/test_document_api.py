@@ -2,9 +2,12 @@
 """
 文档API测试脚本
 """
+import hashlib
+import io
 import requests
 import json
 import time
+import zipfile
 
 # 配置
 BASE_URL = "http://localhost:8000"
@@ -237,9 +240,501 @@ def test_document_api():
     
     return True
 
+def login_cookies():
+    response = requests.post(f"{BASE_URL}/auth/login", data={"username": "testuser", "password": "123456"})
+    if response.status_code != 200:
+        print(f"   ❌ 登录失败: {response.text}")
+        return None
+    return {"access_token": response.json().get('access_token')}
+
+def test_document_import():
+    """测试批量导入：逐行错误、整批失败与导出往返"""
+    print("\n🚀 文档批量导入测试")
+    cookies = login_cookies()
+    if cookies is None:
+        return False
+    
+    # 1. 逐行错误：无效行跳过，同批其他文档正常导入
+    print("\n1. 测试逐行错误...")
+    rows = [
+        {"record": "document", "type": "sop", "title": "导入测试", "updated_at": "2021-05-06T07:08:09"},
+        {"record": "version", "content": "导入内容 v1", "content_format": "plain"},
+        {"record": "version", "content": "格式无效", "content_format": "text"},
+        {"record": "version", "content": "x" * 5001},
+        {"record": "document", "type": "invalid", "title": "类型无效"},
+        {"record": "version", "content": "随无效文档跳过"},
+    ]
+    archive = "\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n{not json\n"
+    try:
+        response = requests.post(f"{BASE_URL}/documents/import", files={"file": ("import.ndjson", archive.encode("utf-8"))}, cookies=cookies)
+        result = response.json()
+        locations = [error["location"] for error in result.get("errors", [])]
+        if response.status_code == 200 and result["imported_documents"] == 1 and locations == ["line 3", "line 4", "line 5", "line 6", "line 7"]:
+            imported_id = result["documents"][0]["id"]
+            print("   ✅ 逐行错误报告正确")
+        else:
+            print(f"   ❌ 逐行错误报告不符合预期: {response.status_code} {response.text}")
+            return False
+        
+        # 归档中的 updated_at 保留
+        response = requests.get(f"{BASE_URL}/documents/sop/{imported_id}", cookies=cookies)
+        if response.status_code == 200 and response.json()["updated_at"].startswith("2021-05-06T07:08:09"):
+            print("   ✅ 导入文档保留原 updated_at")
+        else:
+            print(f"   ❌ 导入文档 updated_at 被覆盖: {response.text}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 逐行错误测试异常: {e}")
+        return False
+    
+    # 2. 整批失败：数据库拒绝的行（标题含 NUL）使该批全部记为错误，不影响响应
+    print("\n2. 测试整批失败...")
+    rows = [
+        {"record": "document", "type": "resume", "title": "同批文档"},
+        {"record": "version", "content": "内容"},
+        {"record": "document", "type": "resume", "title": "含\u0000的标题"},
+        {"record": "version", "content": "内容"},
+    ]
+    archive = "\n".join(json.dumps(row) for row in rows)
+    try:
+        response = requests.post(f"{BASE_URL}/documents/import", files={"file": ("import.ndjson", archive.encode("utf-8"))}, cookies=cookies)
+        result = response.json()
+        if response.status_code == 200 and result["imported_documents"] == 0 and [error["location"] for error in result["errors"]] == ["line 1", "line 3"]:
+            print("   ✅ 整批失败逐文档报告")
+        else:
+            print(f"   ❌ 整批失败处理不符合预期: {response.status_code} {response.text}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 整批失败测试异常: {e}")
+        return False
+    
+    # 3. 导出后重新导入（NDJSON 与 zip）
+    print("\n3. 测试导出往返...")
+    try:
+        for export_format in ["ndjson", "zip"]:
+            response = requests.get(f"{BASE_URL}/documents/export", params={"format": export_format, "versions": "all", "type": "sop"}, cookies=cookies)
+            exported = response.content
+            expected = sum(1 for line in exported.splitlines() if b'"record": "document"' in line) if export_format == "ndjson" else None
+            response = requests.post(f"{BASE_URL}/documents/import", files={"file": (f"export.{export_format}", exported)}, cookies=cookies)
+            result = response.json()
+            if response.status_code == 200 and not result["errors"] and (expected is None or result["imported_documents"] == expected):
+                print(f"   ✅ {export_format} 往返导入 {result['imported_documents']} 个文档")
+            else:
+                print(f"   ❌ {export_format} 往返导入失败: {response.status_code} {response.text}")
+                return False
+    except Exception as e:
+        print(f"   ❌ 导出往返测试异常: {e}")
+        return False
+    
+    # 4. zip 条目损坏（CRC 校验失败）只记为该条目的错误，其余文档照常导入
+    print("\n4. 测试损坏的 zip 条目...")
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr("sop/a/document.json", json.dumps({"title": "完好文档"}))
+        archive.writestr("sop/a/v1.md", "完好内容")
+        archive.writestr("sop/b/document.json", json.dumps({"title": "损坏文档"}))
+        archive.writestr("sop/b/v1.md", "CORRUPTED-ENTRY")
+    data = buffer.getvalue().replace(b"CORRUPTED-ENTRY", b"corrupted-entry")
+    try:
+        response = requests.post(f"{BASE_URL}/documents/import", files={"file": ("import.zip", data)}, cookies=cookies)
+        result = response.json()
+        if response.status_code == 200 and result["imported_documents"] == 1 \
+                and [error["location"] for error in result["errors"]] == ["sop/b/v1.md", "sop/b/document.json"]:
+            print("   ✅ 损坏条目逐条报告")
+        else:
+            print(f"   ❌ 损坏条目处理不符合预期: {response.status_code} {response.text}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 损坏条目测试异常: {e}")
+        return False
+    
+    return True
+
+def test_document_patch():
+    """测试行级补丁保存：正常追加、内容未变化、基准版本过期与无效补丁"""
+    print("\n🚀 文档补丁保存测试")
+    cookies = login_cookies()
+    if cookies is None:
+        return False
+    response = requests.post(f"{BASE_URL}/documents/upload", data={"doc_type": "sop", "title": "补丁测试", "content": "第一行\n第二行\n"}, cookies=cookies)
+    if response.status_code != 200:
+        print(f"   ❌ 上传失败: {response.text}")
+        return False
+    patch_url = f"{BASE_URL}/documents/sop/{response.json()['id']}/versions/patch"
+    
+    # 1. 末尾追加：新版本内容与校验和正确
+    print("\n1. 测试补丁保存...")
+    try:
+        response = requests.post(patch_url, json={"base_version_number": 1, "patch": [2, "第三行\n"]}, cookies=cookies)
+        version = response.json()["versions"][0] if response.status_code == 200 else {}
+        if version.get("version_number") == 2 and version.get("checksum_sha256") == hashlib.sha256("第一行\n第二行\n第三行\n".encode("utf-8")).hexdigest():
+            print("   ✅ 补丁保存成功，校验和正确")
+        else:
+            print(f"   ❌ 补丁保存失败: {response.status_code} {response.text}")
+            return False
+        
+        # 内容未变化时不新增版本
+        response = requests.post(patch_url, json={"base_version_number": 2, "patch": [3]}, cookies=cookies)
+        if response.status_code == 200 and response.headers.get("X-Version-Unchanged") == "2":
+            print("   ✅ 内容未变化不新增版本")
+        else:
+            print(f"   ❌ 内容未变化处理失败: {response.status_code} {response.headers.get('X-Version-Unchanged')}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 补丁保存测试异常: {e}")
+        return False
+    
+    # 2. 基准版本不是当前版本：409 并返回当前版本号
+    print("\n2. 测试基准版本冲突...")
+    try:
+        response = requests.post(patch_url, json={"base_version_number": 1, "patch": [2, "冲突\n"]}, cookies=cookies)
+        if response.status_code == 409 and response.headers.get("X-Current-Version") == "2":
+            print("   ✅ 基准版本冲突返回 409")
+        else:
+            print(f"   ❌ 基准版本冲突处理失败: {response.status_code} {response.headers.get('X-Current-Version')}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 基准版本冲突测试异常: {e}")
+        return False
+    
+    # 3. 无效补丁：400 / 422
+    print("\n3. 测试无效补丁...")
+    try:
+        for patch, expected in [([5], 400), ([3, 0], 400), ([2], 400), ([1.5], 422)]:
+            response = requests.post(patch_url, json={"base_version_number": 2, "patch": patch}, cookies=cookies)
+            if response.status_code != expected:
+                print(f"   ❌ 无效补丁 {patch} 返回 {response.status_code}，应为 {expected}")
+                return False
+        print("   ✅ 无效补丁被拒绝")
+    except Exception as e:
+        print(f"   ❌ 无效补丁测试异常: {e}")
+        return False
+    
+    return True
+
+def test_document_conditional_get():
+    """测试文档详情、版本列表与版本详情的 ETag / 304"""
+    print("\n🚀 文档条件请求测试")
+    cookies = login_cookies()
+    if cookies is None:
+        return False
+    response = requests.post(f"{BASE_URL}/documents/upload", data={"doc_type": "letter", "title": "条件请求测试", "content": "v1"}, cookies=cookies)
+    if response.status_code != 200:
+        print(f"   ❌ 上传失败: {response.text}")
+        return False
+    document_url = f"{BASE_URL}/documents/letter/{response.json()['id']}"
+    
+    # 1. 未变化时返回 304，新增版本后 ETag 变化
+    print("\n1. 测试文档详情 304...")
+    try:
+        for url in [document_url, f"{document_url}?fields=summary", f"{document_url}/versions", f"{document_url}/versions/1"]:
+            response = requests.get(url, cookies=cookies)
+            etag = response.headers.get("ETag")
+            cached = requests.get(url, headers={"If-None-Match": etag}, cookies=cookies)
+            if response.status_code != 200 or not etag or cached.status_code != 304 or cached.headers.get("ETag") != etag or cached.content:
+                print(f"   ❌ {url} 条件请求不符合预期: {response.status_code} {cached.status_code}")
+                return False
+        print("   ✅ 未变化时返回 304")
+        
+        stale_etag = requests.get(document_url, cookies=cookies).headers.get("ETag")
+        requests.post(f"{document_url}/versions", data={"content": "v2"}, cookies=cookies)
+        response = requests.get(document_url, headers={"If-None-Match": stale_etag}, cookies=cookies)
+        fresh = requests.get(document_url, headers={"If-None-Match": f'W/"stale", {response.headers.get("ETag")}'}, cookies=cookies)
+        if response.status_code == 200 and response.headers.get("ETag") != stale_etag and len(response.json()["versions"]) == 2 \
+                and fresh.status_code == 304:
+            print("   ✅ 新增版本后 ETag 变化")
+        else:
+            print(f"   ❌ 新增版本后 ETag 处理不符合预期: {response.status_code}")
+            return False
+        
+        # 版本不可变，可长期缓存
+        response = requests.get(f"{document_url}/versions/1", cookies=cookies)
+        if "immutable" in response.headers.get("Cache-Control", "") and requests.get(document_url, cookies=cookies).headers.get("Cache-Control") == "private, no-cache":
+            print("   ✅ Cache-Control 正确")
+        else:
+            print(f"   ❌ Cache-Control 不符合预期: {response.headers.get('Cache-Control')}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 条件请求测试异常: {e}")
+        return False
+    
+    return True
+
+def test_document_diff():
+    """测试版本对比接口"""
+    print("\n🚀 版本对比测试")
+    cookies = login_cookies()
+    if cookies is None:
+        return False
+    response = requests.post(f"{BASE_URL}/documents/upload", data={"doc_type": "sop", "title": "对比测试", "content": "第一段\n旧的第二段\n第三段\n"}, cookies=cookies)
+    if response.status_code != 200:
+        print(f"   ❌ 上传失败: {response.text}")
+        return False
+    document_url = f"{BASE_URL}/documents/sop/{response.json()['id']}"
+    requests.post(f"{document_url}/versions", data={"content": "第一段\n新的第二段\n第三段\n"}, cookies=cookies)
+    
+    # 1. 对比结果与 304
+    print("\n1. 测试版本对比...")
+    try:
+        response = requests.get(f"{document_url}/diff", params={"from": 1, "to": 2}, cookies=cookies)
+        result = response.json()
+        if response.status_code == 200 and result["hunks"][0]["ops"] == [[" ", "第一段\n"], ["-", "旧的第二段\n"], ["+", "新的第二段\n"], [" ", "第三段\n"]]:
+            print("   ✅ 行级对比正确")
+        else:
+            print(f"   ❌ 行级对比不符合预期: {response.status_code} {response.text}")
+            return False
+        
+        cached = requests.get(f"{document_url}/diff", params={"from": 1, "to": 2}, headers={"If-None-Match": response.headers.get("ETag")}, cookies=cookies)
+        if cached.status_code == 304:
+            print("   ✅ 未变化时返回 304")
+        else:
+            print(f"   ❌ 对比条件请求失败: {cached.status_code}")
+            return False
+        
+        response = requests.get(f"{document_url}/diff", params={"from": 1, "to": 2, "granularity": "word"}, cookies=cookies)
+        if response.status_code == 200 and ["-", "旧的第二段"] in response.json()["hunks"][0]["ops"] and response.headers.get("ETag") != cached.headers.get("ETag"):
+            print("   ✅ 词级对比正确")
+        else:
+            print(f"   ❌ 词级对比不符合预期: {response.status_code} {response.text}")
+            return False
+        
+        response = requests.get(f"{document_url}/diff", params={"from": 2, "to": 2}, cookies=cookies)
+        if response.status_code == 200 and response.json()["hunks"] == []:
+            print("   ✅ 相同版本无差异")
+        else:
+            print(f"   ❌ 相同版本对比不符合预期: {response.text}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 版本对比测试异常: {e}")
+        return False
+    
+    # 2. 错误情况
+    print("\n2. 测试对比错误情况...")
+    try:
+        statuses = [
+            requests.get(f"{document_url}/diff", params={"from": 1, "to": 9}, cookies=cookies).status_code,
+            requests.get(f"{document_url}/diff", params={"from": 1}, cookies=cookies).status_code,
+            requests.get(f"{document_url}/diff", params={"from": 1, "to": 2, "granularity": "char"}, cookies=cookies).status_code,
+        ]
+        if statuses == [404, 422, 422]:
+            print("   ✅ 错误情况处理正确")
+        else:
+            print(f"   ❌ 错误情况处理不符合预期: {statuses}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 对比错误情况测试异常: {e}")
+        return False
+    
+    return True
+
+def test_document_clone():
+    """测试复制文档"""
+    print("\n🚀 文档复制测试")
+    cookies = login_cookies()
+    if cookies is None:
+        return False
+    response = requests.post(f"{BASE_URL}/documents/upload", data={"doc_type": "resume", "title": "复制源", "content": "源内容 v1"}, cookies=cookies)
+    if response.status_code != 200:
+        print(f"   ❌ 上传失败: {response.text}")
+        return False
+    source_id = response.json()["id"]
+    source_url = f"{BASE_URL}/documents/resume/{source_id}"
+    requests.post(f"{source_url}/versions", data={"content": "源内容 v2"}, cookies=cookies)
+    
+    # 1. 默认复制当前版本，沿用标题；新文档只有一个版本
+    print("\n1. 测试复制当前版本...")
+    try:
+        response = requests.post(f"{source_url}/clone", cookies=cookies)
+        clone = response.json()
+        detail = requests.get(f"{BASE_URL}/documents/resume/{clone.get('id')}", cookies=cookies).json() if response.status_code == 200 else {}
+        source = requests.get(source_url, cookies=cookies).json()
+        if clone.get("id") != source_id and clone.get("title") == "复制源" and [v["content"] for v in detail.get("versions", [])] == ["源内容 v2"] \
+                and detail["versions"][0]["version_number"] == 1 and detail["versions"][0]["checksum_sha256"] == source["versions"][0]["checksum_sha256"]:
+            print("   ✅ 复制当前版本成功")
+        else:
+            print(f"   ❌ 复制当前版本不符合预期: {response.status_code} {response.text}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 复制当前版本测试异常: {e}")
+        return False
+    
+    # 2. 复制指定版本并改名；复制后的文档独立修改，不影响源文档
+    print("\n2. 测试复制指定版本...")
+    try:
+        response = requests.post(f"{source_url}/clone", json={"title": "复制 v1", "version_number": 1}, cookies=cookies)
+        clone_url = f"{BASE_URL}/documents/resume/{response.json().get('id')}"
+        requests.post(f"{clone_url}/versions", data={"content": "副本修改"}, cookies=cookies)
+        clone = requests.get(clone_url, cookies=cookies).json()
+        source = requests.get(source_url, cookies=cookies).json()
+        if response.status_code == 200 and clone["title"] == "复制 v1" and sorted(v["content"] for v in clone["versions"]) == ["副本修改", "源内容 v1"] \
+                and len(source["versions"]) == 2:
+            print("   ✅ 复制指定版本成功，副本独立修改")
+        else:
+            print(f"   ❌ 复制指定版本不符合预期: {response.status_code} {response.text}")
+            return False
+        
+        statuses = [
+            requests.post(f"{source_url}/clone", json={"version_number": 9}, cookies=cookies).status_code,
+            requests.post(f"{BASE_URL}/documents/resume/00000000-0000-0000-0000-000000000000/clone", cookies=cookies).status_code,
+        ]
+        if statuses == [404, 404]:
+            print("   ✅ 不存在的版本或文档返回 404")
+        else:
+            print(f"   ❌ 复制错误情况不符合预期: {statuses}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 复制指定版本测试异常: {e}")
+        return False
+    
+    return True
+
+def test_document_search():
+    """测试全文检索：排序、过滤、片段转义与检索向量随当前版本更新"""
+    print("\n🚀 文档检索测试")
+    cookies = login_cookies()
+    if cookies is None:
+        return False
+    # 每次运行使用不同的检索词，避免与之前的测试数据混淆
+    keyword = f"kw{int(time.time() * 1000)}"
+    documents = {}
+    for doc_type, title, content in [
+        ("sop", "检索 SOP", f"<script>alert(1)</script> research on {keyword} & more"),
+        ("letter", "检索推荐信", f"{keyword} {keyword} strong student"),
+        ("resume", "无关简历", "nothing relevant"),
+    ]:
+        response = requests.post(f"{BASE_URL}/documents/upload", data={"doc_type": doc_type, "title": title, "content": content}, cookies=cookies)
+        if response.status_code != 200:
+            print(f"   ❌ 上传失败: {response.text}")
+            return False
+        documents[title] = response.json()["id"]
+    
+    # 1. 排序与片段
+    print("\n1. 测试检索结果...")
+    try:
+        response = requests.get(f"{BASE_URL}/documents/search", params={"q": keyword}, cookies=cookies)
+        results = response.json()
+        snippets = {result["title"]: result["snippet"] for result in results}
+        if response.status_code == 200 and [result["title"] for result in results] == ["检索推荐信", "检索 SOP"] \
+                and f"<mark>{keyword}</mark>" in snippets["检索 SOP"] and "<script>" not in snippets["检索 SOP"] and "&amp;" in snippets["检索 SOP"]:
+            print("   ✅ 检索排序与片段正确，内容已转义")
+        else:
+            print(f"   ❌ 检索结果不符合预期: {response.status_code} {response.text}")
+            return False
+        
+        response = requests.get(f"{BASE_URL}/documents/search", params={"q": keyword, "type": "sop"}, cookies=cookies)
+        if [result["title"] for result in response.json()] == ["检索 SOP"]:
+            print("   ✅ 类型过滤正确")
+        else:
+            print(f"   ❌ 类型过滤不符合预期: {response.text}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 检索测试异常: {e}")
+        return False
+    
+    # 2. 新增版本与回退后检索向量随当前版本更新
+    print("\n2. 测试检索随当前版本更新...")
+    try:
+        letter_url = f"{BASE_URL}/documents/letter/{documents['检索推荐信']}"
+        requests.post(f"{letter_url}/versions", data={"content": "rewritten letter"}, cookies=cookies)
+        after_edit = [result["title"] for result in requests.get(f"{BASE_URL}/documents/search", params={"q": keyword}, cookies=cookies).json()]
+        requests.post(f"{letter_url}/revert", json={"version_number": 1}, cookies=cookies)
+        after_revert = [result["title"] for result in requests.get(f"{BASE_URL}/documents/search", params={"q": keyword}, cookies=cookies).json()]
+        if after_edit == ["检索 SOP"] and after_revert == ["检索推荐信", "检索 SOP"]:
+            print("   ✅ 检索向量随当前版本更新")
+        else:
+            print(f"   ❌ 检索向量更新不符合预期: {after_edit} {after_revert}")
+            return False
+        
+        statuses = [
+            requests.get(f"{BASE_URL}/documents/search", cookies=cookies).status_code,
+            requests.get(f"{BASE_URL}/documents/search", params={"q": keyword, "type": "invalid"}, cookies=cookies).status_code,
+        ]
+        if statuses == [422, 400]:
+            print("   ✅ 错误情况处理正确")
+        else:
+            print(f"   ❌ 检索错误情况不符合预期: {statuses}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 检索更新测试异常: {e}")
+        return False
+    
+    return True
+
+def wait_for_job(job_id, cookies, timeout=15):
+    """轮询任务状态直到结束（succeeded / failed / superseded）"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(f"{BASE_URL}/documents/jobs/{job_id}", cookies=cookies).json()
+        if job.get("status") in ("succeeded", "failed", "superseded"):
+            return job
+        time.sleep(0.2)
+    return job
+
+def test_document_version_jobs():
+    """测试异步版本创建：合并窗口内只写入最新一次，任务状态可查询"""
+    print("\n🚀 异步版本创建测试")
+    cookies = login_cookies()
+    if cookies is None:
+        return False
+    response = requests.post(f"{BASE_URL}/documents/upload", data={"doc_type": "sop", "title": "自动保存测试", "content": "初稿"}, cookies=cookies)
+    if response.status_code != 200:
+        print(f"   ❌ 上传失败: {response.text}")
+        return False
+    document_url = f"{BASE_URL}/documents/sop/{response.json()['id']}"
+    
+    # 1. 合并窗口内连续保存三次，只有最后一次创建版本
+    print("\n1. 测试自动保存合并...")
+    try:
+        jobs = []
+        for i in range(3):
+            response = requests.post(f"{document_url}/versions/async", data={"content": f"自动保存 {i}"}, cookies=cookies)
+            if response.status_code != 202 or response.json()["status"] != "queued":
+                print(f"   ❌ 任务入队失败: {response.status_code} {response.text}")
+                return False
+            jobs.append(response.json())
+        results = [wait_for_job(job["id"], cookies) for job in jobs]
+        if [job["status"] for job in results] == ["superseded", "superseded", "succeeded"] \
+                and all(job["superseded_by"] == jobs[2]["id"] for job in results[:2]) and results[2]["version_number"] == 2:
+            print("   ✅ 合并窗口内只写入最新内容")
+        else:
+            print(f"   ❌ 自动保存合并不符合预期: {results}")
+            return False
+        
+        versions = requests.get(f"{document_url}/versions", cookies=cookies).json()
+        if [version["content"] for version in versions] == ["自动保存 2", "初稿"]:
+            print("   ✅ 版本内容正确")
+        else:
+            print(f"   ❌ 版本内容不符合预期: {versions}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 自动保存合并测试异常: {e}")
+        return False
+    
+    # 2. 文档已删除时任务失败；不存在的任务返回 404
+    print("\n2. 测试任务失败与查询...")
+    try:
+        job = requests.post(f"{document_url}/versions/async", data={"content": "删除前保存"}, cookies=cookies).json()
+        requests.delete(document_url, cookies=cookies)
+        job = wait_for_job(job["id"], cookies)
+        statuses = [
+            requests.get(f"{BASE_URL}/documents/jobs/00000000-0000-0000-0000-000000000000", cookies=cookies).status_code,
+            requests.get(f"{BASE_URL}/documents/jobs/not-a-uuid", cookies=cookies).status_code,
+        ]
+        if job["status"] == "failed" and job["error"] == "Document not found" and statuses == [404, 404]:
+            print("   ✅ 任务失败与查询正确")
+        else:
+            print(f"   ❌ 任务失败与查询不符合预期: {job} {statuses}")
+            return False
+    except Exception as e:
+        print(f"   ❌ 任务失败测试异常: {e}")
+        return False
+    
+    return True
+
 def main():
     """主函数"""
-    success = test_document_api()
+    success = test_document_api() and test_document_import() and test_document_patch() and test_document_conditional_get() \
+        and test_document_diff() and test_document_clone() and test_document_search() and test_document_version_jobs()
     
     if success:
         print("\n✅ 文档API测试完成，所有功能正常")
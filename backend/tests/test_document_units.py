@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+文档模块纯函数测试脚本（无需启动服务器，在 backend 目录下运行）
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.documents.delta import apply_patch, appended_text
+from api.documents.diff import diff_hunks
+from api.documents.version_store import calculate_checksum, patch_checksum
+from api.documents.doc_api import etag_matches, render_snippet, SEARCH_MARK_START, SEARCH_MARK_STOP
+
+def check(name: str, condition: bool) -> bool:
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+def test_patch_functions():
+    """测试行级补丁与增量校验和"""
+    print("🚀 补丁函数测试")
+    base = "line1\nline2\nline3\n"
+    results = []
+
+    print("\n1. 测试 apply_patch...")
+    results.append(check("保留、删除与插入", apply_patch(base, [1, -1, "new\n", 1]) == "line1\nnew\nline3\n"))
+    results.append(check("空补丁作用于空内容", apply_patch("", []) == ""))
+    results.append(check("末尾无换行的行", apply_patch("a\nb", [1, -1, "c"]) == "a\nc"))
+    for name, ops in [("行数为 0", [0, 3]), ("超出基准行数", [4]), ("未覆盖全部基准行", [2]), ("空补丁作用于非空内容", [])]:
+        try:
+            apply_patch(base, ops)
+            results.append(check(f"拒绝无效补丁：{name}", False))
+        except ValueError:
+            results.append(check(f"拒绝无效补丁：{name}", True))
+
+    print("\n2. 测试 appended_text...")
+    results.append(check("末尾追加返回追加文本", appended_text(base, [3, "line4\n", "line5\n"]) == "line4\nline5\n"))
+    results.append(check("分段复制后追加", appended_text(base, [1, 2, "x"]) == "x"))
+    results.append(check("无追加返回空串", appended_text(base, [3]) == ""))
+    results.append(check("中间插入返回 None", appended_text(base, [1, "x\n", 2]) is None))
+    results.append(check("删除行返回 None", appended_text(base, [2, -1, "x\n"]) is None))
+    results.append(check("未复制全部行返回 None", appended_text(base, [2, "x\n"]) is None))
+
+    print("\n3. 测试 patch_checksum...")
+    base_checksum = patch_checksum(base)
+    results.append(check("整篇计算与 calculate_checksum 一致", base_checksum == calculate_checksum(base)))
+    ops = [3, "line4\n"]
+    content = apply_patch(base, ops)
+    incremental = patch_checksum(content, base_checksum, appended_text(base, ops))
+    results.append(check("增量哈希与 calculate_checksum 一致", incremental == calculate_checksum(content)))
+    # 链式追加：在增量结果的哈希状态上继续追加
+    ops = [4, "line5\n", "末尾\n"]
+    chained = apply_patch(content, ops)
+    results.append(check("连续追加与 calculate_checksum 一致", patch_checksum(chained, incremental, appended_text(content, ops)) == calculate_checksum(chained)))
+    results.append(check("无缓存状态时整篇计算", patch_checksum(chained, "0" * 64, "line5\n末尾\n") == calculate_checksum(chained)))
+    results.append(check("非追加补丁整篇计算", patch_checksum("line1\n", base_checksum, None) == calculate_checksum("line1\n")))
+
+    return all(results)
+
+def test_etag_matches():
+    """测试 If-None-Match 匹配"""
+    print("\n🚀 条件请求匹配测试")
+    etag = '"abc"'
+    results = [
+        check("完全匹配", etag_matches('"abc"', etag)),
+        check("弱比较忽略 W/ 前缀", etag_matches('W/"abc"', etag)),
+        check("列表中任一匹配", etag_matches('"x", "abc"', etag)),
+        check("* 匹配任意", etag_matches("*", etag)),
+        check("不匹配", not etag_matches('"x"', etag)),
+        check("缺少引号不匹配", not etag_matches("abc", etag)),
+        check("请求头为空", not etag_matches(None, etag) and not etag_matches("", etag)),
+    ]
+    return all(results)
+
+def test_diff_hunks():
+    """测试版本对比的分块与词级对比"""
+    print("\n🚀 版本对比测试")
+    results = []
+    results.append(check("内容相同返回空列表", diff_hunks("a\nb\n", "a\nb\n") == []))
+    results.append(check("行级替换", diff_hunks("a\nb\nc\n", "a\nB\nc\n") == [{
+        "from_start": 1, "from_count": 3, "to_start": 1, "to_count": 3,
+        "ops": [[" ", "a\n"], ["-", "b\n"], ["+", "B\n"], [" ", "c\n"]]
+    }]))
+    results.append(check("末尾追加", diff_hunks("a\n", "a\nb\n") == [{
+        "from_start": 1, "from_count": 1, "to_start": 1, "to_count": 2, "ops": [[" ", "a\n"], ["+", "b\n"]]
+    }]))
+    results.append(check("词级对比", diff_hunks("hello world\n", "hello there\n", "word")[0]["ops"] == [
+        [" ", "hello "], ["-", "world"], ["+", "there"], [" ", "\n"]
+    ]))
+
+    # 首尾两处修改之间隔 8 行：context=3 时分为两块，context=4 时合并为一块
+    base = "".join(f"line {i}\n" for i in range(10))
+    target = base.replace("line 0", "LINE 0").replace("line 9", "LINE 9")
+    hunks = diff_hunks(base, target, context=3)
+    results.append(check("上下文不足时分块", len(hunks) == 2 and hunks[1]["from_start"] == 7 and hunks[1]["from_count"] == 4))
+    results.append(check("上下文重叠时合并", len(diff_hunks(base, target, context=4)) == 1))
+
+    # 片段拼接还原两个版本
+    for granularity in ["line", "word"]:
+        hunks = diff_hunks(base, target, granularity, context=10)
+        ops = [op for hunk in hunks for op in hunk["ops"]]
+        restored = ("".join(text for tag, text in ops if tag != "+"), "".join(text for tag, text in ops if tag != "-"))
+        results.append(check(f"{granularity} 片段还原两个版本", restored == (base, target)))
+    return all(results)
+
+def test_render_snippet():
+    """测试检索片段先转义再加 <mark> 标记"""
+    print("\n🚀 检索片段测试")
+    marked = f"{SEARCH_MARK_START}robotics{SEARCH_MARK_STOP}"
+    results = [
+        check("标记替换为 <mark>", render_snippet(f"study {marked} now") == "study <mark>robotics</mark> now"),
+        check("内容中的 HTML 被转义", render_snippet(f"<script>alert(1)</script> {marked}") == "&lt;script&gt;alert(1)&lt;/script&gt; <mark>robotics</mark>"),
+        check("内容中的 <mark> 不被保留", render_snippet("<mark>x</mark> & \"y\"") == "&lt;mark&gt;x&lt;/mark&gt; &amp; &quot;y&quot;"),
+        check("无命中时原样转义", render_snippet("a < b") == "a &lt; b"),
+    ]
+    return all(results)
+
+def main():
+    """主函数"""
+    success = all([test_patch_functions(), test_etag_matches(), test_diff_hunks(), test_render_snippet()])
+
+    if success:
+        print("\n✅ 文档纯函数测试完成，全部通过")
+    else:
+        print("\n❌ 文档纯函数测试失败")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
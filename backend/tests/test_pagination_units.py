@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+游标分页纯函数测试脚本（无需启动服务器，在 backend 目录下运行）
+"""
+import os
+import sys
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException, Response
+
+from api.pagination import (
+    encode_cursor, decode_cursor, finalize_keyset_page, NEXT_CURSOR_HEADER, PREV_CURSOR_HEADER
+)
+
+Row = namedtuple("Row", ["id", "created_at"])
+
+def check(name: str, condition: bool) -> bool:
+    print(f"   {'✅' if condition else '❌'} {name}")
+    return condition
+
+def test_cursor_encoding():
+    """测试游标编码、解码与无效游标"""
+    print("🚀 游标编码测试")
+    results = []
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    row_id = uuid.uuid4()
+    cursor = encode_cursor(created_at, row_id)
+    results.append(check("编解码往返一致", decode_cursor(cursor) == (created_at, row_id)))
+    results.append(check("游标为 URL 安全字符且无填充", "=" not in cursor and "+" not in cursor and "/" not in cursor))
+    for name, value in [("非 base64", "!!!"), ("非 JSON", "bm90LWpzb24"), ("缺少字段", encode_cursor(created_at, row_id)[:-6]), ("无效 id", "eyJ2IjoiMjAyNC0wMS0wMSIsImlkIjoieCJ9")]:
+        try:
+            decode_cursor(value)
+            results.append(check(f"无效游标返回 400：{name}", False))
+        except HTTPException as e:
+            results.append(check(f"无效游标返回 400：{name}", e.status_code == 400))
+    return all(results)
+
+def test_finalize_keyset_page():
+    """测试截取本页、恢复顺序与前后页游标"""
+    print("\n🚀 游标翻页测试")
+    results = []
+    start = datetime(2024, 1, 1)
+    rows = [Row(uuid.uuid4(), start + timedelta(minutes=i)) for i in range(10)]
+
+    print("\n1. 测试第一页...")
+    response = Response()
+    page = finalize_keyset_page(rows[0:4], "created_at", None, "next", 3, response)
+    results.append(check("返回 limit 行", page == rows[0:3]))
+    results.append(check("有下一页游标", response.headers.get(NEXT_CURSOR_HEADER) == encode_cursor(rows[2].created_at, rows[2].id)))
+    results.append(check("第一页无上一页游标", PREV_CURSOR_HEADER not in response.headers))
+
+    print("\n2. 测试向后翻页...")
+    cursor = response.headers[NEXT_CURSOR_HEADER]
+    response = Response()
+    page = finalize_keyset_page(rows[3:6], "created_at", cursor, "next", 3, response)
+    results.append(check("最后一页返回剩余行", page == rows[3:6]))
+    results.append(check("最后一页无下一页游标", NEXT_CURSOR_HEADER not in response.headers))
+    results.append(check("带游标时有上一页游标", response.headers.get(PREV_CURSOR_HEADER) == encode_cursor(rows[3].created_at, rows[3].id)))
+
+    print("\n3. 测试向前翻页...")
+    # prev 方向按相反顺序扫描，查询结果为倒序
+    response = Response()
+    page = finalize_keyset_page(list(reversed(rows[2:6])), "created_at", encode_cursor(rows[6].created_at, rows[6].id), "prev", 3, response)
+    results.append(check("恢复正常顺序", page == rows[3:6]))
+    results.append(check("前面还有数据时有上一页游标", response.headers.get(PREV_CURSOR_HEADER) == encode_cursor(rows[3].created_at, rows[3].id)))
+    results.append(check("有下一页游标", response.headers.get(NEXT_CURSOR_HEADER) == encode_cursor(rows[5].created_at, rows[5].id)))
+    response = Response()
+    page = finalize_keyset_page(list(reversed(rows[0:2])), "created_at", encode_cursor(rows[2].created_at, rows[2].id), "prev", 3, response)
+    results.append(check("翻到开头无上一页游标", page == rows[0:2] and PREV_CURSOR_HEADER not in response.headers))
+
+    print("\n4. 测试空页...")
+    response = Response()
+    page = finalize_keyset_page([], "created_at", cursor, "next", 3, response)
+    results.append(check("空页无游标", page == [] and NEXT_CURSOR_HEADER not in response.headers and PREV_CURSOR_HEADER not in response.headers))
+    return all(results)
+
+def main():
+    """主函数"""
+    success = all([test_cursor_encoding(), test_finalize_keyset_page()])
+
+    if success:
+        print("\n✅ 游标分页测试完成，全部通过")
+    else:
+        print("\n❌ 游标分页测试失败")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,11 @@ type Document = {
   title: string
   type: string
   updated_at: string
+  current_version_preview?: {
+    version_number: number
+    preview: string
+    truncated: boolean
+  } | null
 }
 
 export default function DocumentsPage() {
@@ -20,7 +25,8 @@ export default function DocumentsPage() {
 
   // 获取所有文档
   useEffect(() => {
-    fetch('/documents/', { credentials: 'include' })
+    // 同一请求返回当前版本预览，无需逐个获取文档详情
+    fetch('/documents/?include=current_version_preview', { credentials: 'include' })
       .then(res => res.json())
       .then(data => setDocs(data))
       .finally(() => setLoading(false))
@@ -115,6 +121,11 @@ export default function DocumentsPage() {
               <div>
                 <div className="font-bold">{doc.title}</div>
                 <div className="text-xs text-gray-500">{doc.type}</div>
+                {doc.current_version_preview && (
+                  <div className="text-sm text-gray-600 mt-1">
+                    {doc.current_version_preview.preview}{doc.current_version_preview.truncated && '…'}
+                  </div>
+                )}
               </div>
               <div className="text-xs text-gray-400">{doc.updated_at?.slice(0, 16).replace('T', ' ')}</div>
             </li>